@@ -0,0 +1,210 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import numpy as np
+
+from app.core.metric_store import (
+    ROLLUP_RESOLUTIONS,
+    MetricStore,
+    bucket_of,
+    to_aware_utc,
+)
+
+# Quantile of the percentile aggregates
+PERCENTILES = {"p50": 0.5, "p95": 0.95}
+
+
+class Points(NamedTuple):
+    """
+    Points of one series as arrays, sorted by time. Raw samples have a weight
+    of 1, rollup buckets weigh as many samples as they aggregate.
+    """
+
+    timestamps: np.ndarray  # seconds since the epoch
+    values: np.ndarray
+    weights: np.ndarray
+    minimums: np.ndarray
+    maximums: np.ndarray
+
+
+def to_points(rows: list[tuple[float, float, int, float, float]]) -> Points:
+    if not rows:
+        return Points(*(np.empty(0) for _ in Points._fields))
+
+    columns = np.asarray(rows, dtype=np.float64)
+    columns = columns[np.argsort(columns[:, 0], kind="stable")]
+    return Points(*columns.T)
+
+
+def load_points(
+    metric_store: MetricStore,
+    job_id: str,
+    metric_type: str,
+    start: datetime,
+    end: datetime,
+) -> dict[str, Points]:
+    """
+    Points of a job metric between `start` and `end`, keyed by series, i.e.
+    `value` for cpu and memory and the `rx`/`tx` counters for network. Raw
+    samples are used where they are still kept, older history comes from the
+    1-minute and then the 1-hour rollups.
+    """
+    names = ("rx", "tx") if metric_type == "network" else ("value",)
+    rows: dict[str, list] = {name: [] for name in names}
+
+    samples = metric_store.series(job_id, metric_type, start, end, descending=False)
+    for sample in samples:
+        timestamp = to_aware_utc(sample["timestamp"]).timestamp()
+        if metric_type == "network":
+            try:
+                rx, tx = float(sample["rx_bytes"]), float(sample["tx_bytes"])
+            except ValueError:
+                continue
+            rows["rx"].append((timestamp, rx, 1, rx, rx))
+            rows["tx"].append((timestamp, tx, 1, tx, tx))
+        else:
+            try:
+                value = float(sample["value"])
+            except ValueError:
+                continue
+            rows["value"].append((timestamp, value, 1, value, value))
+
+    # Each tier covers the time before the oldest point of the finer one
+    boundary = to_aware_utc(samples[0]["timestamp"]) if samples else to_aware_utc(end)
+    for resolution, width in ROLLUP_RESOLUTIONS.items():
+        boundary = bucket_of(boundary, width)
+        if boundary <= to_aware_utc(start):
+            break
+
+        buckets = metric_store.rollups(
+            job_id, metric_type, resolution, start, boundary, descending=False
+        )
+        buckets = [
+            bucket for bucket in buckets if to_aware_utc(bucket["bucket"]) < boundary
+        ]
+        for bucket in buckets:
+            bucket_start = to_aware_utc(bucket["bucket"])
+            if metric_type == "network":
+                # Counters reach the bucket maximum at its end
+                timestamp = (bucket_start + width).timestamp()
+                for name in names:
+                    counter = float(bucket[f"{name}_max"])
+                    rows[name].append(
+                        (timestamp, counter, bucket["count"], counter, counter)
+                    )
+            else:
+                rows["value"].append(
+                    (
+                        bucket_start.timestamp(),
+                        bucket["value_avg"],
+                        bucket["count"],
+                        bucket["value_min"],
+                        bucket["value_max"],
+                    )
+                )
+
+        if buckets:
+            boundary = to_aware_utc(buckets[0]["bucket"])
+
+    return {name: to_points(series) for name, series in rows.items()}
+
+
+def counter_rates(points: Points) -> Points:
+    """Per-second rates between consecutive counter points, resets are dropped."""
+    if len(points.timestamps) < 2:
+        return to_points([])
+
+    elapsed = np.diff(points.timestamps)
+    increase = np.diff(points.values)
+    valid = (elapsed > 0) & (increase >= 0)
+
+    rates = increase[valid] / elapsed[valid]
+    return Points(
+        points.timestamps[1:][valid],
+        rates,
+        np.ones_like(rates),
+        rates,
+        rates,
+    )
+
+
+def aggregate(
+    points: Points, start: datetime, width: timedelta, count: int, agg: str
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregate the points into `count` buckets of `width` from `start`. Returns
+    the samples and the aggregated value per bucket, NaN for empty buckets.
+    """
+    seconds = width.total_seconds()
+    indexes = np.floor((points.timestamps - to_aware_utc(start).timestamp()) / seconds)
+    inside = (indexes >= 0) & (indexes < count)
+    indexes = indexes[inside].astype(np.int64)
+    values, weights = points.values[inside], points.weights[inside]
+
+    samples = np.bincount(indexes, weights=weights, minlength=count)
+    result = np.full(count, np.nan)
+
+    if agg == "avg":
+        totals = np.bincount(indexes, weights=values * weights, minlength=count)
+        np.divide(totals, samples, out=result, where=samples > 0)
+    elif agg in ("min", "max"):
+        extremes = points.minimums if agg == "min" else points.maximums
+        reduce = np.minimum if agg == "min" else np.maximum
+        result = np.full(count, np.inf if agg == "min" else -np.inf)
+        reduce.at(result, indexes, extremes[inside])
+        result[samples == 0] = np.nan
+    else:
+        # Linear interpolation between the closest ranks of every bucket
+        ordered = values[np.lexsort((values, indexes))]
+        sizes = np.bincount(indexes, minlength=count)
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        filled = sizes > 0
+
+        positions = offsets[filled] + PERCENTILES[agg] * (sizes[filled] - 1)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.ceil(positions).astype(np.int64)
+        result[filled] = ordered[lower] + (ordered[upper] - ordered[lower]) * (
+            positions - lower
+        )
+
+    return samples, result
+
+
+def aggregate_metric(
+    metric_store: MetricStore,
+    job_id: str,
+    metric_type: str,
+    start: datetime,
+    end: datetime,
+    width: timedelta,
+    agg: str,
+) -> list[dict]:
+    """
+    Buckets of a job metric between `start` and `end`, empty buckets are left
+    out. Network counters are turned into rx/tx throughput rates in bytes/s.
+    """
+    start = bucket_of(start, width)
+    count = int(np.ceil((to_aware_utc(end) - start) / width)) or 1
+    series = load_points(metric_store, job_id, metric_type, start, end)
+
+    if metric_type == "network":
+        columns = {
+            "rxRate": aggregate(counter_rates(series["rx"]), start, width, count, agg),
+            "txRate": aggregate(counter_rates(series["tx"]), start, width, count, agg),
+        }
+    else:
+        columns = {"value": aggregate(series["value"], start, width, count, agg)}
+
+    # rx and tx rates come from the same points, i.e. share their sample counts
+    samples = next(iter(columns.values()))[0]
+    return [
+        {
+            "start": (start + width * index).isoformat(),
+            "count": int(samples[index]),
+            **{
+                name: None if np.isnan(values[index]) else float(values[index])
+                for name, (_, values) in columns.items()
+            },
+        }
+        for index in np.flatnonzero(samples)
+    ]
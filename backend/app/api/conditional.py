@@ -0,0 +1,70 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*digests: str) -> str:
+    """Strong ETag of a representation built from the given content digests."""
+    digest = hashlib.blake2b("|".join(digests).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def last_modified(*timestamps: str | None) -> datetime | None:
+    """Latest of the given `pht:updatedAt` values, in UTC and whole seconds."""
+    parsed = []
+    for timestamp in timestamps:
+        try:
+            value = datetime.fromisoformat(str(timestamp))
+        except ValueError:
+            continue
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        parsed.append(value.astimezone(timezone.utc).replace(microsecond=0))
+
+    return max(parsed, default=None)
+
+
+def is_not_modified(request: Request, etag: str, modified_at: datetime | None) -> bool:
+    # If-None-Match takes precedence, If-Modified-Since is only used without it
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or modified_at is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified_at <= since
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    digests: list[str],
+    modified_at: datetime | None = None,
+) -> Response | None:
+    """
+    Set the ETag and Last-Modified validators on `response`, the ETag covers
+    the content `digests` and the request URL. Returns a bodyless 304 response
+    if the request already holds this representation, the handler returns it
+    as is without serializing anything.
+    """
+    etag = make_etag(request.url.path, request.url.query, *digests)
+    headers = {"ETag": etag}
+    if modified_at is not None:
+        headers["Last-Modified"] = format_datetime(modified_at, usegmt=True)
+
+    if is_not_modified(request, etag, modified_at):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -1,8 +1,28 @@
+from collections.abc import AsyncIterator
 from typing import Annotated
 
 from fastapi import Depends
 from rdflib import Graph
 
-from app.core.database import graph_singleton
+from app.core.database import get_read_graph, graph_singleton
+from app.core.logger import logger
+from app.core.metric_store import MetricStore, get_metric_store
+from app.core.unit_of_work import UnitOfWork
 
 GraphDep = Annotated[Graph, Depends(graph_singleton.get_graph)]
+# Read-only queries that tolerate replication lag, e.g. exports. Read model
+# lookups keep GraphDep, records cached from a lagging replica would stay stale.
+ReadGraphDep = Annotated[Graph, Depends(get_read_graph)]
+MetricStoreDep = Annotated[MetricStore, Depends(get_metric_store)]
+
+
+async def get_unit_of_work(graph: GraphDep) -> AsyncIterator[UnitOfWork]:
+    unit_of_work = UnitOfWork(graph)
+    yield unit_of_work
+    # Writes of a request that failed before its commit are dropped
+    if unit_of_work.pending:
+        logger.warning(f"Discarding {unit_of_work.pending} uncommitted graph writes")
+        unit_of_work.rollback()
+
+
+UnitOfWorkDep = Annotated[UnitOfWork, Depends(get_unit_of_work)]
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends
 
-from app.api.routes import auth, job, station, train
+from app.api.routes import auth, job, metric, station, train
+from app.read_model import read_model_scope
 
 
 api_router = APIRouter()
@@ -13,16 +14,22 @@ api_router.include_router(
     train.router,
     prefix="/trains",
     tags=["trains"],
-    dependencies=[Depends(auth.get_user_info)],
+    dependencies=[Depends(auth.get_user_info), Depends(read_model_scope)],
 )
 api_router.include_router(
     station.router,
     prefix="/stations",
     tags=["stations"],
-    dependencies=[Depends(auth.get_user_info)],
+    dependencies=[Depends(auth.get_user_info), Depends(read_model_scope)],
 )
 api_router.include_router(
     job.router,
     prefix="/jobs",
     tags=["jobs"],
+    dependencies=[Depends(read_model_scope)],
+)
+api_router.include_router(
+    metric.router,
+    tags=["metrics"],
+    dependencies=[Depends(auth.get_user_info)],
 )
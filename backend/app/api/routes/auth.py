@@ -1,14 +1,31 @@
-from typing import Annotated
+from typing import Annotated, Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from keycloak.exceptions import KeycloakAuthenticationError
+from keycloak.exceptions import KeycloakAuthenticationError, KeycloakError
 from pydantic import BaseModel
 
-from app.core.config import keycloak_openid
+from app.core.config import keycloak_openid, settings
+from app.core.instrumentation import auth_duration
+from app.core.logger import logger
+from app.core.security import InvalidTokenError, JWKSCache, TokenValidator, TTLCache
 
 router = APIRouter()
 
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+
+token_validator = TokenValidator(
+    jwks=JWKSCache(
+        keycloak_openid.a_certs,
+        ttl=settings.AUTH_JWKS_TTL,
+        min_refresh_interval=settings.AUTH_JWKS_MIN_REFRESH_INTERVAL,
+    ),
+    issuer=f"{settings.KEYCLOAK_SERVER_URL.rstrip('/')}/realms/{settings.KEYCLOAK_REALM}",
+    cache=TTLCache(
+        maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_TOKEN_CACHE_TTL
+    ),
+)
+
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -21,22 +38,87 @@ class UserInfo(BaseModel):
     full_name: str | None = None
 
 
-async def get_user_info(
-    token: Annotated[str, Depends(OAuth2PasswordBearer(tokenUrl="auth/token"))]
+def invalid_token_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def to_user_info(claims: dict[str, Any]) -> UserInfo:
+    if "preferred_username" not in claims:
+        raise invalid_token_error()
+
+    return UserInfo(
+        preferred_username=claims["preferred_username"],
+        email=claims.get("email"),
+        full_name=claims.get("name"),
+    )
+
+
+async def get_introspected_user_info(
+    token: Annotated[str, Depends(oauth2_scheme)],
 ) -> UserInfo:
+    """
+    Ask Keycloak whether the token is still active. Costs a round trip per
+    request, use it on routes that must honour revoked tokens and sessions.
+    """
     try:
-        user_info = keycloak_openid.userinfo(token)
-        return UserInfo(
-            preferred_username=user_info["preferred_username"],
-            email=user_info.get("email"),
-            full_name=user_info.get("name"),
+        with auth_duration.time("introspect"):
+            claims = await keycloak_openid.a_introspect(token)
+    except KeycloakError as error:
+        logger.error(f"Token introspection failed: {error}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Identity provider unavailable",
         )
-    except KeycloakAuthenticationError:
+
+    if not claims.get("active"):
+        raise invalid_token_error()
+
+    return to_user_info(claims)
+
+
+async def get_user_info(token: Annotated[str, Depends(oauth2_scheme)]) -> UserInfo:
+    if settings.AUTH_MODE == "introspect":
+        return await get_introspected_user_info(token)
+
+    try:
+        with auth_duration.time("local"):
+            claims = await token_validator.validate(token)
+    except InvalidTokenError:
+        raise invalid_token_error()
+    except KeycloakError as error:
+        logger.error(f"Fetching the realm JWKS failed: {error}")
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid username or password",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Identity provider unavailable",
         )
 
+    return to_user_info(claims)
+
+
+async def is_profiling_admin(token: str) -> bool:
+    """Whether the token has the PROFILING_ADMIN_ROLE as realm or client role."""
+    try:
+        if settings.AUTH_MODE == "introspect":
+            claims = await keycloak_openid.a_introspect(token)
+            if not claims.get("active"):
+                return False
+        else:
+            claims = await token_validator.validate(token)
+    except InvalidTokenError:
+        return False
+    except KeycloakError as error:
+        logger.error(f"Validating the profiling token failed: {error}")
+        return False
+
+    roles = set(claims.get("realm_access", {}).get("roles", []))
+    for access in claims.get("resource_access", {}).values():
+        roles.update(access.get("roles", []))
+    return settings.PROFILING_ADMIN_ROLE in roles
+
 
 @router.post("/token", response_model=TokenResponse)
 async def get_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
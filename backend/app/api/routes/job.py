@@ -1,132 +1,437 @@
 import asyncio
 import json
 import uuid
-from datetime import datetime
-from typing import Annotated
-
-from fastapi import APIRouter, Body, Depends, HTTPException, Request, status
-from rdflib import Literal, RDF, XSD
-from rdflib.collection import Collection
+from datetime import datetime, timezone
+from typing import Annotated, Any
+
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from pydantic import TypeAdapter, ValidationError
+from rdflib import Literal, XSD
 from sse_starlette.sse import EventSourceResponse
 
 from app import crud
-from app.api.deps import GraphDep
-from app.api.routes.auth import get_user_info
-from app.core.database import PHT, TrainNS, StationNS, JobNS, MemoryNS, CpuNS, NetworkNS
+from app.api.conditional import conditional_response, last_modified
+from app.api.deps import GraphDep, MetricStoreDep, ReadGraphDep, UnitOfWorkDep
+from app.api.routes.auth import get_introspected_user_info, get_user_info
+from app.aggregation import aggregate_metric
+from app.core.broadcast import BroadcastHub
+from app.core.config import settings
+from app.core.database import PHT, TrainNS, StationNS, JobNS
+from app.core.executor import run_read, run_write
+from app.core.instrumentation import Gauge, registry
 from app.core.logger import logger
-from app.models import JobMetadataBase, JobMetricMetadataCreate, JobMetricMetadataDelete
+from app.models import (
+    JobMetadataBase,
+    JobMetadataUpdate,
+    JobMetricBatchItem,
+    JobMetricMetadataCreate,
+    JobMetricMetadataDelete,
+    MetricBatchError,
+    MetricBatchResult,
+)
+from app.metric_formats import json_response, metric_series_response, negotiate
+from app.read_model import read_model, to_naive_utc, utc_now
+from app.triples import (
+    JOB_PATCH_CONVERTERS,
+    JOB_PATCH_FIELDS,
+    job_triples,
+    patch_objects,
+    stage_patch,
+)
 from app.utils import (
-    convert_list_to_jsonld,
+    AggregateWindow,
+    HistogramBucket,
     JobState,
     JobStateURI,
+    JobTimestamp,
+    MetricAggregate,
+    MetricResolution,
     MetricType,
-    MetricTypeURI,
-    MetricNamespace,
     ResponseType,
+    TimeWindow,
 )
 
 router = APIRouter()
 
-# Broadcast channel for communicating job and metric updates
-job_broadcast = asyncio.Queue()
-metric_broadcast = asyncio.Queue()
+# Broadcast hubs for communicating job and metric updates, topics are job ids
+job_hub = BroadcastHub(
+    "job",
+    maxsize=settings.SSE_QUEUE_SIZE,
+    policy=settings.SSE_SLOW_CONSUMER_POLICY,
+)
+metric_hub = BroadcastHub(
+    "metric",
+    maxsize=settings.SSE_QUEUE_SIZE,
+    policy=settings.SSE_SLOW_CONSUMER_POLICY,
+)
+
+registry.register(
+    Gauge(
+        "sse_subscribers",
+        "Active SSE subscriptions by broadcast hub.",
+        ("hub",),
+        lambda: {
+            (hub.name,): hub.stats()["subscribers"] for hub in (job_hub, metric_hub)
+        },
+    )
+)
+registry.register(
+    Gauge(
+        "sse_queue_depth",
+        "Events queued for the SSE subscribers of a hub, in total and max. per subscriber.",
+        ("hub", "aggregate"),
+        lambda: {
+            (hub.name, aggregate): hub.stats()[key]
+            for hub in (job_hub, metric_hub)
+            for aggregate, key in (("sum", "queueDepth"), ("max", "queueDepthMax"))
+        },
+    )
+)
+
+# Validators of metric batch items, with and without a job id of their own
+metric_adapter = TypeAdapter(JobMetricMetadataCreate)
+batch_item_adapter = TypeAdapter(JobMetricBatchItem)
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# Placeholder of an NDJSON line that is not valid JSON
+INVALID_JSON = object()
+
+
+def publish_job_update(job_payload: dict) -> None:
+    job_id = job_payload["identifier"]
+    # Encode once for all subscribers, queued updates of a job coalesce by job id
+    job_hub.publish(job_id, json.dumps(job_payload), key=job_id)
+
+
+def publish_metric_delta(job_id: str, sample) -> None:
+    # The sample is committed by now, a broken delta must not fail the request
+    try:
+        metric = crud.serialize_metric(sample)
+    except Exception as error:
+        logger.error(f"Serializing a metric delta of job {job_id} failed: {error}")
+        return
+
+    delta = {
+        "seq": metric_hub.next_sequence(job_id),
+        "jobId": job_id,
+        "source": sample["metric_type"],
+        "metric": metric,
+    }
+
+    metric_hub.publish(
+        job_id,
+        (delta["seq"], json.dumps(delta)),
+        key=sample["metric_type"],
+    )
+
+
+def read_job_payload(graph, subject) -> dict | None:
+    record = read_model.jobs.get(graph, subject)
+    if record is None:
+        return None
+
+    return {"metadataUri": subject, **read_model.job_dicts(graph, [record])[0]}
+
+
+def job_validators(graph, records) -> tuple[list[str], datetime | None]:
+    """
+    Content digests and Last-Modified of jobs, their payload includes the names
+    of their current stations.
+    """
+    stations = read_model.job_stations(graph, records)
+    digests = [record.etag for record in records]
+    digests.extend(station.etag for station in stations.values())
+    return digests, last_modified(*(record.updatedAt for record in records))
+
+
+def metric_sample(job_id: str, metadata) -> dict:
+    """Arguments of `MetricStore.append` for a validated metric payload."""
+    is_network_metric = metadata.metric_type is MetricType.network
+
+    return {
+        "job_id": job_id,
+        "metric_type": metadata.metric_type.value,
+        "station_id": str(metadata.station_id),
+        "timestamp": metadata.timestamp,
+        **(
+            {"rx_bytes": metadata.rx_bytes, "tx_bytes": metadata.tx_bytes}
+            if is_network_metric
+            else {"value": metadata.value}
+        ),
+    }
+
+
+async def read_batch_items(request: Request) -> list[Any]:
+    """
+    Decode a batch body, either a JSON array or newline delimited JSON. NDJSON
+    is decoded while it streams in and a broken line only rejects that item.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if content_type in NDJSON_MEDIA_TYPES:
+        items = []
+        buffer = b""
+        async for chunk in request.stream():
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            items.extend(decode_ndjson_line(line) for line in lines if line.strip())
+            check_batch_size(items)
+
+        if buffer.strip():
+            items.append(decode_ndjson_line(buffer))
+
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Batch body is not valid JSON",
+            )
+
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Batch body must be a JSON array or NDJSON",
+            )
+
+    check_batch_size(items)
+    return items
+
+
+def decode_ndjson_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return INVALID_JSON
+
+
+def check_batch_size(items: list) -> None:
+    if len(items) > settings.METRICS_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {settings.METRICS_BATCH_MAX_SIZE} metrics",
+        )
+
+
+async def ingest_metric_batch(
+    graph,
+    metric_store,
+    items: list[Any],
+    adapter: TypeAdapter,
+    job_id: uuid.UUID | None = None,
+) -> MetricBatchResult:
+    """
+    Validate every item on its own, then append all valid samples in one
+    transaction. Items of unknown jobs are rejected, not the whole batch.
+    """
+    errors: list[MetricBatchError] = []
+    valid: list[tuple[int, str, Any]] = []
+
+    for index, item in enumerate(items):
+        if item is INVALID_JSON:
+            errors.append(MetricBatchError(index=index, detail="Invalid JSON"))
+            continue
+
+        try:
+            metadata = adapter.validate_python(item)
+        except ValidationError as error:
+            detail = error.errors(
+                include_url=False, include_context=False, include_input=False
+            )
+            errors.append(MetricBatchError(index=index, detail=detail))
+            continue
+
+        valid.append((index, str(job_id or metadata.job_id), metadata))
+
+    # One existence check per distinct job
+    job_ids = {metric_job_id for _, metric_job_id, _ in valid}
+    records = await run_read(
+        read_model.jobs.get_many,
+        graph,
+        [JobNS[metric_job_id] for metric_job_id in job_ids],
+    )
+    existing_job_ids = {
+        metric_job_id for metric_job_id in job_ids if JobNS[metric_job_id] in records
+    }
+
+    samples = []
+    for index, metric_job_id, metadata in valid:
+        if metric_job_id not in existing_job_ids:
+            errors.append(
+                MetricBatchError(
+                    index=index, detail=f"Job ({metric_job_id}) metadata not found"
+                )
+            )
+            continue
+
+        samples.append(metric_sample(metric_job_id, metadata))
 
-METRICS_BUFFER_SIZE = 1000
+    samples = await run_write(metric_store.append_many, samples)
+
+    # Broadcast only the new samples to all connected clients
+    for sample in samples:
+        publish_metric_delta(sample["job_id"], sample)
+
+    errors.sort(key=lambda error: error.index)
+    return MetricBatchResult(accepted=len(samples), rejected=len(errors), errors=errors)
+
+
+async def ensure_job_exists(graph, job_id: uuid.UUID) -> None:
+    record = await run_read(read_model.jobs.get, graph, JobNS[str(job_id)])
+
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job ({job_id}) metadata not found",
+        )
 
 
 @router.get("/", dependencies=[Depends(get_user_info)])
 async def get_jobs(
     graph: GraphDep,
+    read_graph: ReadGraphDep,
+    request: Request,
+    response: Response,
     response_type: ResponseType = ResponseType.default,
-    offset: int = 0,
-    limit: int = 10,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=0)] = 10,
+    cursor: str | None = None,
 ):
     if response_type is not ResponseType.default:
-        return crud.get_resources(
-            graph=graph,
+        return await run_read(
+            crud.get_resources,
+            graph=read_graph,
+            response=response,
             response_type=response_type,
             subject=PHT.TrainExecution,
             namespace=JobNS,
             prefix="job",
             offset=offset,
             limit=limit,
+            cursor=cursor,
             extra_context={"station": StationNS, "train": TrainNS},
         )
 
-    jobs = []
-    for subject in graph.subjects(RDF.type, PHT.TrainExecution):
-        station_uri = graph.value(subject, PHT.currentStation)
-        station_name = graph.value(station_uri, PHT.title)
+    records = await run_read(
+        read_model.page, read_model.jobs, graph, response, offset, limit, cursor
+    )
 
-        job_state_uri = graph.value(subject, PHT.state)
-        job_state = JobStateURI._value2member_map_[job_state_uri].name
+    not_modified = conditional_response(
+        request, response, *await run_read(job_validators, graph, records)
+    )
+    if not_modified is not None:
+        return not_modified
 
-        jobs.append(
-            {
-                "identifier": str(graph.value(subject, PHT.identifier)),
-                "state": job_state,
-                "creator": str(graph.value(subject, PHT.creator)),
-                "currentStation": {"uri": station_uri, "name": station_name},
-                "trainId": str(graph.value(subject, PHT.trainId)),
-                "description": str(graph.value(subject, PHT.description)),
-                "createdAt": str(graph.value(subject, PHT.createdAt)),
-                "updatedAt": str(graph.value(subject, PHT.updatedAt)),
-            }
-        )
+    return await run_read(read_model.job_dicts, graph, records)
 
-    # Sort by updatedAt in DESC order
-    jobs.sort(key=lambda job: job["updatedAt"], reverse=True)
 
-    return jobs[offset : offset + limit]
+def resolve_window(
+    since: datetime | None, until: datetime | None, window: TimeWindow | None
+) -> tuple[datetime | None, datetime | None]:
+    """Naive UTC bounds of a time window, `window` counts back from `until`."""
+    since = to_naive_utc(since) if since else None
+    until = to_naive_utc(until) if until else None
+
+    if window is not None and since is None:
+        since = (until or utc_now()) - window.delta
+
+    if since is not None and until is not None and since > until:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since must be before until",
+        )
+
+    return since, until
 
 
-# TODO: Add filters i.e. last 7, 30, 90 days
 @router.get("/count", dependencies=[Depends(get_user_info)])
-async def get_job_count_by_state(graph: GraphDep, state: JobState):
-    total_subjects = len(set(graph.subjects(PHT.state, JobStateURI[state].value)))
-    return {"count": total_subjects}
+async def get_job_count_by_state(
+    graph: GraphDep,
+    state: JobState,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    window: TimeWindow | None = None,
+    timestamp: JobTimestamp = JobTimestamp.updatedAt,
+):
+    # Served from the job state counters and timestamp index of the read model
+    since, until = resolve_window(since, until, window)
+    summary = await run_read(
+        read_model.jobs.summary, graph, since, until, timestamp.value
+    )
+    return {"count": summary[state.value]}
 
 
-# TODO: Add filters i.e. last 7, 30, 90 days
 @router.get("/summary", dependencies=[Depends(get_user_info)])
-async def get_job_summary_by_state(graph: GraphDep):
-    query = """
-    SELECT ?state (COUNT(?job) AS ?job_count)
-    WHERE {
-        ?job a pht:TrainExecution .
-        ?job pht:state ?state .
-    }
-    GROUP BY ?state
-    ORDER BY DESC(?job_count)
-    """
+async def get_job_summary_by_state(
+    graph: GraphDep,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    window: TimeWindow | None = None,
+    timestamp: JobTimestamp = JobTimestamp.updatedAt,
+):
+    since, until = resolve_window(since, until, window)
+    summary = await run_read(
+        read_model.jobs.summary, graph, since, until, timestamp.value
+    )
+    return [
+        {"state": job_state, "count": count}
+        for job_state, count in summary.most_common()
+    ]
 
-    result = graph.query(query, initNs={"pht": PHT})
 
-    grouped_jobs = []
-    for row in result:
-        job_state = JobStateURI._value2member_map_[row.state].name
-        grouped_jobs.append(
-            {
-                "state": job_state,
-                "count": int(row.job_count),
-            }
+@router.get("/histogram", dependencies=[Depends(get_user_info)])
+async def get_job_histogram(
+    graph: GraphDep,
+    bucket: HistogramBucket = HistogramBucket.day,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    window: TimeWindow = TimeWindow.last_week,
+    timestamp: JobTimestamp = JobTimestamp.updatedAt,
+):
+    """
+    Job count per state for every hour or day of a time window, i.e. for charts.
+    Jobs are counted by their current state in the bucket of their `timestamp`.
+    """
+    since, until = resolve_window(since, until or utc_now(), window)
+
+    if (until - since) / bucket.delta > settings.JOB_HISTOGRAM_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Histogram exceeds {settings.JOB_HISTOGRAM_MAX_BUCKETS} buckets",
         )
 
-    return grouped_jobs
+    histogram = await run_read(
+        read_model.jobs.histogram, graph, since, until, bucket.delta, timestamp.value
+    )
+    return [
+        {"start": start.isoformat(), "counts": dict(counts)}
+        for start, counts in histogram
+    ]
 
 
 @router.get("/sse")
-async def job_sse(request: Request):
+async def job_sse(request: Request, job_id: uuid.UUID | None = None):
+    topic = str(job_id) if job_id else None
+
     async def event_generator():
         try:
-            while True:
-                if await request.is_disconnected():
-                    break
-
-                # Wait for new data from broadcast channel
-                job_payload = await job_broadcast.get()
+            async with job_hub.subscribe(topic) as subscription:
+                # Wait for new data from broadcast hub
+                async for job_payload in subscription:
+                    if await request.is_disconnected():
+                        break
 
-                yield {"event": "job_update", "data": job_payload}
+                    yield {"event": "job_update", "data": job_payload}
 
         except asyncio.CancelledError:
             pass
@@ -134,49 +439,49 @@ async def job_sse(request: Request):
     return EventSourceResponse(event_generator())
 
 
+@router.get("/sse/stats", dependencies=[Depends(get_user_info)])
+async def get_sse_stats():
+    return {"jobs": job_hub.stats(), "metrics": metric_hub.stats()}
+
+
 @router.get("/{job_id}", dependencies=[Depends(get_user_info)])
 async def get_job_metadata(
     graph: GraphDep,
+    read_graph: ReadGraphDep,
+    request: Request,
+    response: Response,
     job_id: uuid.UUID,
     response_type: ResponseType = ResponseType.default,
 ):
     subject = JobNS[str(job_id)]
 
-    # Check if Job URI exists
-    if (subject, None, None) not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Job ({job_id}) metadata not found",
-        )
-
     if response_type is not ResponseType.default:
-        return crud.get_resource_metadata(
-            graph=graph,
+        return await run_read(
+            crud.get_resource_metadata,
+            graph=read_graph,
             response_type=response_type,
             subject_id=str(job_id),
             namespace=JobNS,
             prefix="job",
         )
 
-    # Get current station
-    station_uri = graph.value(subject, PHT.currentStation)
-    station_name = graph.value(station_uri, PHT.title)
+    record = await run_read(read_model.jobs.get, graph, subject)
 
-    # Get job state
-    job_state_uri = graph.value(subject, PHT.state)
-    job_state = JobStateURI._value2member_map_[job_state_uri].name
+    # Check if Job URI exists
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job ({job_id}) metadata not found",
+        )
 
-    return {
-        "metadataUri": subject,
-        "identifier": str(graph.value(subject, PHT.identifier)),
-        "state": job_state,
-        "creator": str(graph.value(subject, PHT.creator)),
-        "currentStation": {"uri": station_uri, "name": station_name},
-        "trainId": str(graph.value(subject, PHT.trainId)),
-        "description": str(graph.value(subject, PHT.description)),
-        "createdAt": str(graph.value(subject, PHT.createdAt)),
-        "updatedAt": str(graph.value(subject, PHT.updatedAt)),
-    }
+    not_modified = conditional_response(
+        request, response, *await run_read(job_validators, graph, [record])
+    )
+    if not_modified is not None:
+        return not_modified
+
+    job_dicts = await run_read(read_model.job_dicts, graph, [record])
+    return {"metadataUri": subject, **job_dicts[0]}
 
 
 @router.post(
@@ -184,13 +489,18 @@ async def get_job_metadata(
     dependencies=[Depends(get_user_info)],
     status_code=status.HTTP_201_CREATED,
 )
-async def create_job_metadata(graph: GraphDep, metadata: JobMetadataBase):
+async def create_job_metadata(
+    graph: GraphDep,
+    unit_of_work: UnitOfWorkDep,
+    metric_store: MetricStoreDep,
+    metadata: JobMetadataBase,
+):
     logger.info(f"Creating metadata for job {metadata.identifier}")
 
     job_id = str(metadata.identifier)
     triple = (JobNS[job_id], None, None)
 
-    if triple in graph:
+    if await run_read(lambda: triple in graph):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Metadata already exists for job ({job_id})",
@@ -200,68 +510,35 @@ async def create_job_metadata(graph: GraphDep, metadata: JobMetadataBase):
     TODO: Check if current station is in planned route. Throw an error if not.
     """
 
-    # Adding a zero memory consumption event to initialize the event collection in job
-    memory_event_id = str(uuid.uuid4())
-    payload = {
-        "@context": {"pht": str(PHT), "memory": str(MemoryNS)},
-        "@graph": [
-            {
-                "@id": MemoryNS[memory_event_id],
-                "@type": PHT.MemoryUsageReportEvent,
-                "pht:eventTimestamp": metadata.createdAt,
-                "pht:hasJobId": job_id,
-                "pht:hasStationId": metadata.currentStation,
-                "pht:value": "0",
-            },
-            {
-                "@id": JobNS[job_id],
-                "@type": PHT.TrainExecution,
-                "pht:identifier": job_id,
-                "pht:creator": metadata.creator,
-                "pht:description": metadata.description,
-                "pht:currentStation": {"@id": StationNS[metadata.currentStation]},
-                "pht:trainId": {"@id": TrainNS[metadata.trainId]},
-                "pht:state": {"@id": JobStateURI.waiting.value},
-                "pht:plannedRoute": {
-                    "@list": convert_list_to_jsonld(
-                        items=metadata.plannedRoute, namespace=StationNS
-                    )
-                },
-                "pht:event": {
-                    "@list": convert_list_to_jsonld(
-                        items=[memory_event_id], namespace=MemoryNS
-                    )
-                },
-                "pht:createdAt": metadata.createdAt,
-                "pht:updatedAt": metadata.updatedAt,
-            },
-        ],
-    }
+    unit_of_work.add(job_triples(metadata))
+    await unit_of_work.commit()
+    await run_write(read_model.changed, graph, read_model.jobs, JobNS[job_id])
 
-    graph.parse(data=payload, format="json-ld")
+    # Adding a zero memory consumption event to initialize the job metric series
+    await run_write(
+        metric_store.append,
+        job_id=job_id,
+        metric_type=MetricType.memory.value,
+        station_id=metadata.currentStation,
+        timestamp=metadata.createdAt,
+        value="0",
+    )
 
     # Get the entire job object
-    job_payload = await get_job_metadata(
-        graph, metadata.identifier, response_type=ResponseType.default
+    job_payload = await run_read(
+        read_job_payload, graph, JobNS[str(metadata.identifier)]
     )
     # Broadcast to all connected clients
-    await job_broadcast.put(json.dumps(job_payload))
+    publish_job_update(job_payload)
     return job_payload
 
 
 @router.get("/{job_id}/status", dependencies=[Depends(get_user_info)])
 async def get_job_status(graph: GraphDep, job_id: uuid.UUID):
-    subject = JobNS[str(job_id)]
-    triple = (subject, None, None)
-
     # Check if Job URI exists
-    if triple not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Job ({job_id}) metadata not found",
-        )
+    await ensure_job_exists(graph, job_id)
 
-    job_status = graph.value(subject, PHT.state)
+    job_status = await run_read(graph.value, JobNS[str(job_id)], PHT.state)
     return {"status": JobStateURI._value2member_map_[job_status].name}
 
 
@@ -272,34 +549,30 @@ async def get_job_status(graph: GraphDep, job_id: uuid.UUID):
 )
 async def update_job_status(
     graph: GraphDep,
+    unit_of_work: UnitOfWorkDep,
     job_id: uuid.UUID,
     state: JobState,
 ):
     """
-    TODO: If status is in [cancelled, finished, failed], empty the job metrics Collection
-    and individually delete each metric URI
+    TODO: If status is in [cancelled, finished, failed], delete the job metric series
     """
     logger.info(f"Updating job {job_id} status to {state.value}")
     subject = JobNS[str(job_id)]
-    triple = (subject, None, None)
-
-    if triple not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Job ({job_id}) metadata not found",
-        )
+    await ensure_job_exists(graph, job_id)
 
     # Update job state and timestamp
-    graph.set((subject, PHT.state, JobStateURI[state].value))
-    graph.set((subject, PHT.updatedAt, Literal(datetime.now(), datatype=XSD.dateTime)))
+    unit_of_work.set((subject, PHT.state, JobStateURI[state].value))
+    unit_of_work.set(
+        (subject, PHT.updatedAt, Literal(datetime.now(), datatype=XSD.dateTime))
+    )
+    await unit_of_work.commit()
+    await run_write(read_model.changed, graph, read_model.jobs, subject)
 
     # Get the entire job object
-    job_payload = await get_job_metadata(
-        graph, job_id, response_type=ResponseType.default
-    )
+    job_payload = await run_read(read_job_payload, graph, subject)
 
     # Broadcast to all connected clients
-    await job_broadcast.put(json.dumps(job_payload))
+    publish_job_update(job_payload)
 
 
 @router.put(
@@ -309,45 +582,112 @@ async def update_job_status(
 )
 async def update_job_current_station(
     graph: GraphDep,
+    unit_of_work: UnitOfWorkDep,
     job_id: uuid.UUID,
     station_id: Annotated[uuid.UUID, Body(embed=True)],
 ):
     logger.info(f"Updating job {job_id} station to {station_id}")
     subject = JobNS[str(job_id)]
-    triple = (subject, None, None)
 
     # TODO: Also check if the station exists in the planned route
-    if triple not in graph:
+    await ensure_job_exists(graph, job_id)
+
+    # Update current station and timestamp
+    unit_of_work.set((subject, PHT.currentStation, StationNS[str(station_id)]))
+    unit_of_work.set(
+        (subject, PHT.updatedAt, Literal(datetime.now(), datatype=XSD.dateTime))
+    )
+    await unit_of_work.commit()
+    await run_write(read_model.changed, graph, read_model.jobs, subject)
+
+    # Get the entire job object
+    job_payload = await run_read(read_job_payload, graph, subject)
+
+    # Broadcast to all connected clients
+    publish_job_update(job_payload)
+
+
+@router.patch("/{job_id}", dependencies=[Depends(get_user_info)])
+async def patch_job_metadata(
+    graph: GraphDep,
+    unit_of_work: UnitOfWorkDep,
+    job_id: uuid.UUID,
+    metadata: JobMetadataUpdate,
+):
+    logger.info(f"Patching job {job_id} metadata")
+    subject = JobNS[str(job_id)]
+
+    # Only the fields sent in the request are updated
+    objects = patch_objects(
+        metadata.model_dump(exclude_unset=True, exclude_none=True),
+        JOB_PATCH_FIELDS,
+        JOB_PATCH_CONVERTERS,
+    )
+    changed = await run_read(stage_patch, unit_of_work, subject, objects)
+
+    if changed is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Job ({job_id}) metadata not found",
         )
 
-    # Update current station and timestamp
-    graph.set((subject, PHT.currentStation, StationNS[str(station_id)]))
-    graph.set((subject, PHT.updatedAt, Literal(datetime.now(), datatype=XSD.dateTime)))
+    if changed:
+        await unit_of_work.commit()
+        await run_write(read_model.changed, graph, read_model.jobs, subject)
 
     # Get the entire job object
-    job_payload = await get_job_metadata(
-        graph, job_id, response_type=ResponseType.default
-    )
+    job_payload = await run_read(read_job_payload, graph, subject)
 
     # Broadcast to all connected clients
-    await job_broadcast.put(json.dumps(job_payload))
+    if changed:
+        publish_job_update(job_payload)
+    return job_payload
 
 
 @router.get("/{job_id}/metrics/sse")
-async def job_metrics_sse(request: Request):
+async def job_metrics_sse(
+    request: Request,
+    graph: GraphDep,
+    metric_store: MetricStoreDep,
+    job_id: uuid.UUID,
+):
+    """
+    Stream the metrics of a job. Each metric type is sent once as a full
+    `metric_snapshot`, followed by one `metric_delta` event per new sample.
+    Every event carries the per-job sequence number, a client that sees a gap
+    should reconnect to get a fresh snapshot.
+    """
+    await ensure_job_exists(graph, job_id)
+
     async def event_generator():
         try:
-            while True:
-                if await request.is_disconnected():
-                    break
+            async with metric_hub.subscribe(str(job_id)) as subscription:
+                # Subscribe before reading the snapshot so that no delta is lost.
+                # Deltas that are already part of the snapshot are skipped below,
+                # clients may still dedupe by metric id.
+                snapshot_seq = metric_hub.sequence(str(job_id))
+                for metric in MetricType:
+                    samples = await run_read(
+                        metric_store.series,
+                        str(job_id),
+                        metric.value,
+                        descending=metric is not MetricType.network,
+                    )
+                    snapshot = crud.serialize_metric_series(metric, samples)
+                    yield {
+                        "event": "metric_snapshot",
+                        "data": json.dumps({"seq": snapshot_seq, **snapshot}),
+                    }
 
-                # Wait for new data from broadcast channel
-                metric_payload = await metric_broadcast.get()
+                # Wait for new data from broadcast hub
+                async for seq, delta in subscription:
+                    if await request.is_disconnected():
+                        break
 
-                yield {"event": "metric_update", "data": metric_payload}
+                    if seq <= snapshot_seq:
+                        continue
+
+                    yield {"event": "metric_delta", "data": delta}
 
         except asyncio.CancelledError:
             pass
@@ -357,49 +697,120 @@ async def job_metrics_sse(request: Request):
 
 @router.get("/{job_id}/metrics", dependencies=[Depends(get_user_info)])
 async def get_job_metrics(
+    request: Request,
     graph: GraphDep,
+    metric_store: MetricStoreDep,
     metric: MetricType,
     job_id: uuid.UUID,
     sort_desc: bool = True,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    resolution: MetricResolution = MetricResolution.raw,
+    response_type: ResponseType = ResponseType.default,
 ):
-    subject = JobNS[str(job_id)]
-    triple = (subject, None, None)
-
-    if triple not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Job ({job_id}) metadata not found",
+    """
+    Raw samples or rollups of a job metric. Raw samples are negotiated by the
+    Accept header: JSON, MessagePack or columnar Arrow IPC.
+    """
+    await ensure_job_exists(graph, job_id)
+
+    # Older history is only kept as 1-minute and 1-hour rollups
+    if resolution is not MetricResolution.raw:
+        if response_type is not ResponseType.default:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Metric rollups are only available as JSON",
+            )
+
+        buckets = await run_read(
+            metric_store.rollups,
+            str(job_id),
+            metric.value,
+            resolution.value,
+            start=start,
+            end=end,
+            descending=sort_desc,
+        )
+        return json_response(
+            {
+                "source": metric,
+                "resolution": resolution,
+                "metrics": [crud.serialize_rollup(bucket) for bucket in buckets],
+            }
         )
 
-    collection = graph.value(subject, PHT.event)
-    event_uris = Collection(graph, collection)
-    ns_manager = graph.namespace_manager
+    samples = await run_read(
+        metric_store.series,
+        str(job_id),
+        metric.value,
+        start=start,
+        end=end,
+        descending=sort_desc,
+    )
 
-    metrics = {"source": metric, "metrics": []}
-    for uri in event_uris:
-        # * Filter only the required event type: memory | cpu | network
-        if (uri, RDF.type, MetricTypeURI[metric].value) not in graph:
-            continue
+    if response_type is not ResponseType.default:
+        return crud.get_metric_resources(samples, response_type)
 
-        metric_payload = {
-            "id": uri.n3(ns_manager),
-            "jobId": graph.value(uri, PHT.hasJobId),
-            "stationId": graph.value(uri, PHT.hasStationId),
-            "timestamp": graph.value(uri, PHT.eventTimestamp),
-            **(
-                {
-                    "rxBytes": int(graph.value(uri, PHT.hasRxBytes)),
-                    "txBytes": int(graph.value(uri, PHT.hasTxBytes)),
-                }
-                if metric is MetricType.network
-                else {"value": graph.value(uri, PHT.value)}
-            ),
-        }
+    media_type = negotiate(request.headers.get("accept"))
+    return await run_read(
+        metric_series_response, metric, str(job_id), samples, media_type
+    )
 
-        metrics["metrics"].append(metric_payload)
 
-    metrics["metrics"].sort(key=lambda job: job["timestamp"], reverse=sort_desc)
-    return metrics
+@router.get("/{job_id}/metrics/aggregate", dependencies=[Depends(get_user_info)])
+async def get_job_metrics_aggregate(
+    graph: GraphDep,
+    metric_store: MetricStoreDep,
+    metric: MetricType,
+    job_id: uuid.UUID,
+    agg: MetricAggregate = MetricAggregate.avg,
+    window: AggregateWindow | None = None,
+    start: Annotated[datetime | None, Query(alias="from")] = None,
+    end: Annotated[datetime | None, Query(alias="to")] = None,
+):
+    """
+    Metric series of a job aggregated into buckets of `window`, by default the
+    smallest window that stays within the bucket limit. Network metrics come
+    back as rx/tx throughput in bytes/s. The range defaults to the last 24h.
+    """
+    await ensure_job_exists(graph, job_id)
+
+    start, end = resolve_window(start, end or utc_now(), TimeWindow.last_day)
+
+    if window is None:
+        window = next(
+            (
+                window
+                for window in AggregateWindow
+                if (end - start) / window.delta
+                <= settings.METRICS_AGGREGATE_MAX_BUCKETS
+            ),
+            list(AggregateWindow)[-1],
+        )
+    elif (end - start) / window.delta > settings.METRICS_AGGREGATE_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Aggregation exceeds {settings.METRICS_AGGREGATE_MAX_BUCKETS} buckets",
+        )
+
+    buckets = await run_read(
+        aggregate_metric,
+        metric_store,
+        str(job_id),
+        metric.value,
+        start,
+        end,
+        window.delta,
+        agg.value,
+    )
+    return {
+        "source": metric,
+        "agg": agg,
+        "window": window,
+        "from": start.replace(tzinfo=timezone.utc).isoformat(),
+        "to": end.replace(tzinfo=timezone.utc).isoformat(),
+        "buckets": buckets,
+    }
 
 
 @router.post(
@@ -409,6 +820,7 @@ async def get_job_metrics(
 )
 async def create_job_metrics(
     graph: GraphDep,
+    metric_store: MetricStoreDep,
     job_id: uuid.UUID,
     metadata: JobMetricMetadataCreate,
 ):
@@ -417,113 +829,66 @@ async def create_job_metrics(
     """
     logger.info(f"Creating {metadata.metric_type.value} metrics for job {job_id}")
 
-    subject = JobNS[str(job_id)]
-    triple = (subject, None, None)
+    await ensure_job_exists(graph, job_id)
 
-    if triple not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Job ({job_id}) metadata not found",
-        )
-
-    metric_id = str(uuid.uuid4())
-    metric_namespace = MetricNamespace[metadata.metric_type].value
-    metric_uri = metric_namespace[metric_id]
-
-    is_network_metric = metadata.metric_type is MetricType.network
-    payload = {
-        "@context": {
-            "pht": str(PHT),
-            "memory": str(MemoryNS),
-            "cpu": str(CpuNS),
-            "network": str(NetworkNS),
-        },
-        "@graph": [
-            {
-                "@id": metric_uri,
-                "@type": MetricTypeURI[metadata.metric_type].value,
-                "pht:eventTimestamp": metadata.timestamp,
-                "pht:hasJobId": job_id,
-                "pht:hasStationId": metadata.station_id,
-                **(
-                    {
-                        "pht:hasRxBytes": metadata.rx_bytes,
-                        "pht:hasTxBytes": metadata.tx_bytes,
-                    }
-                    if is_network_metric
-                    else {"pht:value": metadata.value}
-                ),
-            },
-        ],
-    }
-
-    # Add event metadata to database
-    graph.parse(data=payload, format="json-ld")
-
-    # Fetch metric collection for job
-    collection = graph.value(subject, PHT.event)
-    event_uris = Collection(graph, collection)
+    # Append the sample to the job metric series
+    sample = await run_write(
+        metric_store.append, **metric_sample(str(job_id), metadata)
+    )
 
-    # Clear the event collection if buffer exceeds
-    if len(event_uris) > METRICS_BUFFER_SIZE:
-        logger.warning(
-            f"Metric buffer exceeded. Clearing previous events for job {job_id}"
-        )
-        for uri in event_uris:
-            graph.remove((uri, None, None))
+    # Broadcast only the new sample to all connected clients
+    publish_metric_delta(str(job_id), sample)
 
-        event_uris.clear()
 
-    # Add new event to the job event list
-    event_uris.append(metric_uri)
+@router.post(
+    "/{job_id}/metrics:batch",
+    dependencies=[Depends(get_user_info)],
+    response_model=MetricBatchResult,
+)
+async def create_job_metrics_batch(
+    request: Request,
+    graph: GraphDep,
+    metric_store: MetricStoreDep,
+    job_id: uuid.UUID,
+):
+    """
+    Append many metrics of mixed types to a job at once. The body is a JSON
+    array or NDJSON (`application/x-ndjson`) of `JobMetricMetadataCreate`.
+    """
+    await ensure_job_exists(graph, job_id)
 
-    # Get updated job metrics
-    metric_payload = await get_job_metrics(
-        graph,
-        metric=metadata.metric_type,
-        job_id=job_id,
-        sort_desc=not is_network_metric,
+    items = await read_batch_items(request)
+    logger.info(f"Creating a batch of {len(items)} metrics for job {job_id}")
+    return await ingest_metric_batch(
+        graph, metric_store, items, metric_adapter, job_id=job_id
     )
 
-    # Broadcast metric updates to all connected clients
-    await metric_broadcast.put(json.dumps(metric_payload))
-
 
 # TODO: Implement subscriber pattern to delete all job metrics when job is finished.
 # TODO: Maybe use Rabbitmq for message passing.
 @router.delete(
     "/{job_id}/metrics",
-    dependencies=[Depends(get_user_info)],
+    dependencies=[Depends(get_introspected_user_info)],
     status_code=status.HTTP_204_NO_CONTENT,
 )
 async def delete_job_metric(
     graph: GraphDep,
+    metric_store: MetricStoreDep,
     job_id: uuid.UUID,
     metadata: JobMetricMetadataDelete,
 ):
-    subject = JobNS[str(job_id)]
-    triple = (subject, None, None)
-
-    if triple not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Job ({job_id}) metadata not found",
-        )
-
-    metric_namespace = MetricNamespace[metadata.metric_type].value
-    metric_uri = metric_namespace[str(metadata.metric_id)]
-
-    collection = graph.value(subject, PHT.event)
-    event_uris = Collection(graph, collection)
+    await ensure_job_exists(graph, job_id)
+
+    # Remove the metric sample from the job metric series
+    is_deleted = await run_write(
+        metric_store.delete,
+        str(job_id),
+        metadata.metric_type.value,
+        str(metadata.metric_id),
+    )
 
-    if metric_uri not in event_uris:
+    if not is_deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Metric ({metric_uri.n3(graph.namespace_manager)}) metadata not found",
+            detail=f"Metric ({metadata.metric_type.value}:{metadata.metric_id}) metadata not found",
         )
-
-    # Remove the metric from the job event list
-    event_uris.__delitem__(event_uris.index(metric_uri))
-
-    # Remove the metric data from database
-    graph.remove((metric_uri, None, None))
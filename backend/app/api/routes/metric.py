@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Request
+
+from app.api.deps import GraphDep, MetricStoreDep
+from app.api.routes.job import batch_item_adapter, ingest_metric_batch, read_batch_items
+from app.core.logger import logger
+from app.models import MetricBatchResult
+
+router = APIRouter()
+
+
+@router.post("/metrics:batch", response_model=MetricBatchResult)
+async def create_metrics_batch(
+    request: Request, graph: GraphDep, metric_store: MetricStoreDep
+):
+    """
+    Append metrics of any number of jobs at once, i.e. one flush per station
+    agent interval. The body is a JSON array or NDJSON of metrics with a `job_id`.
+    """
+    items = await read_batch_items(request)
+    logger.info(f"Creating a batch of {len(items)} metrics")
+    return await ingest_metric_batch(graph, metric_store, items, batch_item_adapter)
@@ -1,15 +1,24 @@
 import uuid
+from typing import Annotated
 
-from fastapi import APIRouter, status, HTTPException
-from rdflib import RDF, Literal
+from fastapi import APIRouter, status, HTTPException, Query, Request, Response
 
 from app import crud
-from app.api.deps import GraphDep
+from app.api.conditional import conditional_response, last_modified
+from app.api.deps import GraphDep, ReadGraphDep, UnitOfWorkDep
+from app.core.executor import run_read, run_write
 from app.core.database import PHT, StationNS
 from app.models import (
     StationMetadataBase as StationMetadataCreate,
     StationMetadataUpdate,
 )
+from app.read_model import read_model
+from app.triples import (
+    STATION_PATCH_FIELDS,
+    patch_objects,
+    stage_patch,
+    station_triples,
+)
 from app.utils import get_triple_count, ResponseType
 
 router = APIRouter()
@@ -20,115 +29,100 @@ router = APIRouter()
     summary="Count all triples of type [rdf:type pht:Station]",
     status_code=status.HTTP_200_OK,
 )
-async def get_station_triple_count(graph: GraphDep) -> dict:
-    return await get_triple_count(graph, PHT.Station)
+async def get_station_triple_count(graph: GraphDep, read_graph: ReadGraphDep) -> dict:
+    # Writes of the other workers invalidate the cached count once replayed
+    await run_read(read_model.sync, graph)
+    return await get_triple_count(read_graph, PHT.Station)
 
 
 @router.get("/")
 async def get_all_stations(
     graph: GraphDep,
+    read_graph: ReadGraphDep,
+    request: Request,
+    response: Response,
     response_type: ResponseType = ResponseType.default,
-    offset: int = 0,
-    limit: int = 10,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=0)] = 10,
+    cursor: str | None = None,
 ):
     if response_type is not ResponseType.default:
-        return crud.get_resources(
-            graph=graph,
+        return await run_read(
+            crud.get_resources,
+            graph=read_graph,
+            response=response,
             response_type=response_type,
             subject=PHT.Station,
             namespace=StationNS,
             prefix="station",
             offset=offset,
             limit=limit,
+            cursor=cursor,
         )
 
     # Default JSON response
-    stations = []
-    for subject in graph.subjects(RDF.type, PHT.Station):
-        stations.append(
-            {
-                "identifier": str(graph.value(subject, PHT.identifier)),
-                "title": str(graph.value(subject, PHT.title)),
-                "stationOwner": str(graph.value(subject, PHT.stationOwner)),
-                "responsibleForStation": str(
-                    graph.value(subject, PHT.responsibleForStation)
-                ),
-                "description": str(graph.value(subject, PHT.description)),
-                "latitude": str(graph.value(subject, PHT.latitude)),
-                "longitude": str(graph.value(subject, PHT.longitude)),
-                "createdAt": str(graph.value(subject, PHT.createdAt)),
-                "updatedAt": str(graph.value(subject, PHT.updatedAt)),
-                "hasGPUSupport": bool(graph.value(subject, PHT.hasGPUSupport)),
-                "totalGPUPower": str(graph.value(subject, PHT.totalGPUPower)) or None,
-                "totalCPUCores": str(graph.value(subject, PHT.totalCPUCores)),
-                "totalRAM": str(graph.value(subject, PHT.totalRAM)),
-                "totalDiskSpace": str(graph.value(subject, PHT.totalDiskSpace)),
-                "hasInternetConnectivity": bool(
-                    graph.value(subject, PHT.hasInternetConnectivity)
-                ),
-                "networkBandwidth": str(graph.value(subject, PHT.networkBandwidth))
-                or None,
-            }
-        )
+    records = await run_read(
+        read_model.page, read_model.stations, graph, response, offset, limit, cursor
+    )
 
-    # Sort by updatedAt in DESC order
-    stations.sort(key=lambda job: job["updatedAt"], reverse=True)
-    return stations[offset : offset + limit]
+    not_modified = conditional_response(
+        request,
+        response,
+        [record.etag for record in records],
+        last_modified(*(record.updatedAt for record in records)),
+    )
+    if not_modified is not None:
+        return not_modified
+
+    return [record.to_dict() for record in records]
 
 
 @router.get("/{station_id}")
 async def get_station_metadata(
     graph: GraphDep,
+    read_graph: ReadGraphDep,
+    request: Request,
+    response: Response,
     station_id: uuid.UUID,
     response_type: ResponseType = ResponseType.default,
 ):
     subject = StationNS[str(station_id)]
 
-    # Check if Job URI exists
-    if (subject, None, None) not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Station ({station_id}) metadata not found",
-        )
-
     if response_type is not ResponseType.default:
-        return crud.get_resource_metadata(
-            graph=graph,
+        return await run_read(
+            crud.get_resource_metadata,
+            graph=read_graph,
             response_type=response_type,
             subject_id=str(station_id),
             namespace=StationNS,
             prefix="station",
         )
 
-    subject = StationNS[str(station_id)]
-    return {
-        "metadataUri": subject,
-        "identifier": str(graph.value(subject, PHT.identifier)),
-        "title": str(graph.value(subject, PHT.title)),
-        "stationOwner": str(graph.value(subject, PHT.stationOwner)),
-        "responsibleForStation": str(graph.value(subject, PHT.responsibleForStation)),
-        "description": str(graph.value(subject, PHT.description)),
-        "latitude": str(graph.value(subject, PHT.latitude)),
-        "longitude": str(graph.value(subject, PHT.longitude)),
-        "createdAt": str(graph.value(subject, PHT.createdAt)),
-        "updatedAt": str(graph.value(subject, PHT.updatedAt)),
-        "hasGPUSupport": bool(graph.value(subject, PHT.hasGPUSupport)),
-        "totalGPUPower": str(graph.value(subject, PHT.totalGPUPower)) or None,
-        "totalCPUCores": str(graph.value(subject, PHT.totalCPUCores)),
-        "totalRAM": str(graph.value(subject, PHT.totalRAM)),
-        "totalDiskSpace": str(graph.value(subject, PHT.totalDiskSpace)),
-        "hasInternetConnectivity": bool(
-            graph.value(subject, PHT.hasInternetConnectivity)
-        ),
-        "networkBandwidth": str(graph.value(subject, PHT.networkBandwidth)) or None,
-    }
+    record = await run_read(read_model.stations.get, graph, subject)
+
+    # Check if Station URI exists
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Station ({station_id}) metadata not found",
+        )
+
+    not_modified = conditional_response(
+        request, response, [record.etag], last_modified(record.updatedAt)
+    )
+    if not_modified is not None:
+        return not_modified
+
+    return {"metadataUri": subject, **record.to_dict()}
 
 
 # Create new station
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_station_metadata(graph: GraphDep, metadata: StationMetadataCreate):
-    rdf_triple = (StationNS[metadata.identifier], None, None)
-    if rdf_triple in graph:
+async def create_station_metadata(
+    graph: GraphDep, unit_of_work: UnitOfWorkDep, metadata: StationMetadataCreate
+):
+    rdf_triple = (StationNS[str(metadata.identifier)], None, None)
+    if await run_read(lambda: rdf_triple in graph):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Metadata already exists for Station ({metadata.identifier})",
@@ -156,9 +150,13 @@ async def create_station_metadata(graph: GraphDep, metadata: StationMetadataCrea
         "pht:updatedAt": metadata.updatedAt,
     }
 
-    graph.parse(
-        data=payload,
-        format="json-ld",
+    unit_of_work.add(station_triples(metadata))
+    await unit_of_work.commit()
+    await run_write(
+        read_model.changed,
+        graph,
+        read_model.stations,
+        StationNS[str(metadata.identifier)],
     )
     return payload
 
@@ -166,28 +164,26 @@ async def create_station_metadata(graph: GraphDep, metadata: StationMetadataCrea
 @router.put("/{station_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def update_station_metadata(
     graph: GraphDep,
+    unit_of_work: UnitOfWorkDep,
     metadata: StationMetadataUpdate,
     station_id: uuid.UUID,
 ):
     subject = StationNS[str(station_id)]
 
-    # Check if Train URI triples exists
-    if (subject, None, None) not in graph:
+    # Only the fields sent in the request are updated
+    objects = patch_objects(
+        metadata.model_dump(exclude_unset=True, exclude_none=True),
+        STATION_PATCH_FIELDS,
+    )
+    changed = await run_read(stage_patch, unit_of_work, subject, objects)
+
+    if changed is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Station ({station_id}) metadata not found",
         )
+    if not changed:
+        return
 
-    for pred, _ in graph.predicate_objects(subject):
-        predicate_name = pred.n3(graph.namespace_manager).split(":")[-1]
-
-        # Check request payload for new values
-        new_value = metadata.model_dump().get(predicate_name)
-
-        # If property does not exists in request body, skip the iteration.
-        # There can be many properties such as rdf:type etc.
-        if new_value is None:
-            continue
-
-        # Update triples one by one
-        graph.set((subject, pred, Literal(new_value)))
+    await unit_of_work.commit()
+    await run_write(read_model.changed, graph, read_model.stations, subject)
@@ -1,12 +1,15 @@
 from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, Path, status
-from rdflib import Literal, RDF
+from fastapi import APIRouter, HTTPException, Path, Query, Request, Response, status
 
 from app import crud
-from app.api.deps import GraphDep
+from app.api.conditional import conditional_response, last_modified
+from app.api.deps import GraphDep, ReadGraphDep, UnitOfWorkDep
+from app.core.executor import run_read, run_write
 from app.core.database import PHT, TrainNS
 from app.models import TrainMetadataBase as TrainMetadataCreate, TrainMetadataUpdate
+from app.read_model import read_model
+from app.triples import TRAIN_PATCH_FIELDS, patch_objects, stage_patch, train_triples
 from app.utils import get_triple_count, ResponseType
 
 router = APIRouter()
@@ -17,96 +20,101 @@ router = APIRouter()
     summary="Count all triples of type [rdf:type pht:Train]",
     status_code=status.HTTP_200_OK,
 )
-async def get_train_triple_count(graph: GraphDep) -> dict:
-    return await get_triple_count(graph, PHT.Train)
+async def get_train_triple_count(graph: GraphDep, read_graph: ReadGraphDep) -> dict:
+    # Writes of the other workers invalidate the cached count once replayed
+    await run_read(read_model.sync, graph)
+    return await get_triple_count(read_graph, PHT.Train)
 
 
 @router.get("/")
 async def get_all_trains(
     graph: GraphDep,
+    read_graph: ReadGraphDep,
+    request: Request,
+    response: Response,
     response_type: ResponseType = ResponseType.default,
-    offset: int = 0,
-    limit: int = 10,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=0)] = 10,
+    cursor: str | None = None,
 ):
     if response_type is not ResponseType.default:
-        return crud.get_resources(
-            graph=graph,
+        return await run_read(
+            crud.get_resources,
+            graph=read_graph,
+            response=response,
             response_type=response_type,
             subject=PHT.Train,
             namespace=TrainNS,
             prefix="train",
             offset=offset,
             limit=limit,
+            cursor=cursor,
         )
 
     # Default JSON response
-    trains = []
-    for subject in graph.subjects(RDF.type, PHT.Train):
-        trains.append(
-            {
-                "identifier": str(graph.value(subject, PHT.identifier)),
-                "title": str(graph.value(subject, PHT.title)),
-                "creator": str(graph.value(subject, PHT.creator)),
-                "publisher": str(graph.value(subject, PHT.publisher)),
-                "description": str(graph.value(subject, PHT.description)),
-                "createdAt": str(graph.value(subject, PHT.createdAt)),
-                "analysisPurpose": str(graph.value(subject, PHT.analysisPurpose)),
-                "model": str(graph.value(subject, PHT.model)),
-                "updatedAt": str(graph.value(subject, PHT.updatedAt)),
-                "version": str(graph.value(subject, PHT.version)),
-            }
-        )
+    records = await run_read(
+        read_model.page, read_model.trains, graph, response, offset, limit, cursor
+    )
+
+    not_modified = conditional_response(
+        request,
+        response,
+        [record.etag for record in records],
+        last_modified(*(record.updatedAt for record in records)),
+    )
+    if not_modified is not None:
+        return not_modified
 
-    # Sort by updatedAt in DESC order
-    trains.sort(key=lambda job: job["updatedAt"], reverse=True)
-    return trains[offset : offset + limit]
+    return [record.to_dict() for record in records]
 
 
 # Get Train metadata by ID
 @router.get("/{train_id}")
 async def get_train_metadata(
     graph: GraphDep,
+    read_graph: ReadGraphDep,
+    request: Request,
+    response: Response,
     train_id: Annotated[str, Path(min_length=5)],
     response_type: ResponseType = ResponseType.default,
 ):
     subject = TrainNS[train_id]
 
-    # Check if Job URI exists
-    if (subject, None, None) not in graph:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Train ({train_id}) metadata not found",
-        )
-
     if response_type is not ResponseType.default:
-        return crud.get_resource_metadata(
-            graph=graph,
+        return await run_read(
+            crud.get_resource_metadata,
+            graph=read_graph,
             response_type=response_type,
             subject_id=train_id,
             namespace=TrainNS,
             prefix="train",
         )
 
-    return {
-        "metadataUri": subject,
-        "identifier": str(graph.value(subject, PHT.identifier)),
-        "title": str(graph.value(subject, PHT.title)),
-        "creator": str(graph.value(subject, PHT.creator)),
-        "publisher": str(graph.value(subject, PHT.publisher)),
-        "description": str(graph.value(subject, PHT.description)),
-        "analysisPurpose": str(graph.value(subject, PHT.analysisPurpose)),
-        "model": str(graph.value(subject, PHT.model)),
-        "createdAt": str(graph.value(subject, PHT.createdAt)),
-        "updatedAt": str(graph.value(subject, PHT.updatedAt)),
-        "version": str(graph.value(subject, PHT.version)),
-    }
+    record = await run_read(read_model.trains.get, graph, subject)
+
+    # Check if Train URI exists
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Train ({train_id}) metadata not found",
+        )
+
+    not_modified = conditional_response(
+        request, response, [record.etag], last_modified(record.updatedAt)
+    )
+    if not_modified is not None:
+        return not_modified
+
+    return {"metadataUri": subject, **record.to_dict()}
 
 
 # Create new Train
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_train_metadata(graph: GraphDep, metadata: TrainMetadataCreate):
+async def create_train_metadata(
+    graph: GraphDep, unit_of_work: UnitOfWorkDep, metadata: TrainMetadataCreate
+):
     rdf_triple = (TrainNS[metadata.identifier], None, None)
-    if rdf_triple in graph:
+    if await run_read(lambda: rdf_triple in graph):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Metadata already exists for Train ({metadata.identifier})",
@@ -128,9 +136,10 @@ async def create_train_metadata(graph: GraphDep, metadata: TrainMetadataCreate):
         "pht:updatedAt": metadata.updatedAt,
     }
 
-    graph.parse(
-        data=payload,
-        format="json-ld",
+    unit_of_work.add(train_triples(metadata))
+    await unit_of_work.commit()
+    await run_write(
+        read_model.changed, graph, read_model.trains, TrainNS[metadata.identifier]
     )
     return payload
 
@@ -138,28 +147,26 @@ async def create_train_metadata(graph: GraphDep, metadata: TrainMetadataCreate):
 @router.put("/{train_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def update_train_metadata(
     graph: GraphDep,
+    unit_of_work: UnitOfWorkDep,
     metadata: TrainMetadataUpdate,
     train_id: Annotated[str, Path(min_length=5)],
 ):
     subject = TrainNS[train_id]
 
-    # Check if Train URI triples exists
-    if (subject, None, None) not in graph:
+    # Only the fields sent in the request are updated
+    objects = patch_objects(
+        metadata.model_dump(exclude_unset=True, exclude_none=True),
+        TRAIN_PATCH_FIELDS,
+    )
+    changed = await run_read(stage_patch, unit_of_work, subject, objects)
+
+    if changed is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Train ({train_id}) metadata not found",
         )
+    if not changed:
+        return
 
-    for pred, _ in graph.predicate_objects(subject):
-        predicate_name = pred.n3(graph.namespace_manager).split(":")[-1]
-
-        # Check if updated property exists in request payload
-        new_value = metadata.model_dump().get(predicate_name)
-
-        # If property does not exist in request body, skip the iteration.
-        # There can be many properties such as rdf:type etc.
-        if new_value is None:
-            continue
-
-        # Update triples one by one
-        graph.set((subject, pred, Literal(new_value)))
+    await unit_of_work.commit()
+    await run_write(read_model.changed, graph, read_model.trains, subject)
@@ -0,0 +1,163 @@
+import asyncio
+from collections import Counter, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any
+
+
+class SlowConsumerPolicy(str, Enum):
+    # Drop the oldest queued event to make room for the new one
+    drop_oldest = "drop_oldest"
+    # Replace queued events with the same key by the new one, then drop the oldest
+    coalesce = "coalesce"
+    # Close the subscription, the client is expected to reconnect
+    disconnect = "disconnect"
+
+
+class SubscriptionClosed(Exception):
+    pass
+
+
+class Subscription:
+    """A bounded per-subscriber event queue of a `BroadcastHub`."""
+
+    def __init__(
+        self,
+        hub: "BroadcastHub",
+        topic: str | None,
+        maxsize: int,
+        policy: SlowConsumerPolicy,
+    ):
+        self.hub = hub
+        self.topic = topic
+        self.maxsize = maxsize
+        self.policy = policy
+        self.closed = False
+        self._queue: deque[tuple[str | None, Any]] = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def offer(self, payload: Any, key: str | None = None) -> None:
+        if self.closed:
+            return
+
+        if len(self._queue) >= self.maxsize:
+            if self.policy is SlowConsumerPolicy.disconnect:
+                self.hub.disconnected += 1
+                self.close()
+                return
+
+            if self.policy is SlowConsumerPolicy.coalesce and key is not None:
+                pending = len(self._queue)
+                self._queue = deque(item for item in self._queue if item[0] != key)
+                self.hub.dropped += pending - len(self._queue)
+
+            if len(self._queue) >= self.maxsize:
+                self._queue.popleft()
+                self.hub.dropped += 1
+
+        self._queue.append((key, payload))
+        self._ready.set()
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self) -> Any:
+        while not self._queue:
+            if self.closed:
+                raise SubscriptionClosed()
+
+            self._ready.clear()
+            await self._ready.wait()
+
+        _, payload = self._queue.popleft()
+        return payload
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self.get()
+        except SubscriptionClosed:
+            raise StopAsyncIteration
+
+
+class BroadcastHub:
+    """
+    In-process fan-out pub/sub. Every subscriber gets its own bounded queue, so a
+    slow or absent consumer never blocks publishers or steals events from others.
+    Subscribers can filter on a topic i.e. a job id, `None` receives every topic.
+    Events of a topic can be numbered with `next_sequence`. Only topics with
+    subscribers of their own are numbered, their numbers start over once the
+    last one leaves, so no state is kept for topics nobody listens to.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 100,
+        policy: SlowConsumerPolicy = SlowConsumerPolicy.drop_oldest,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self._subscriptions: set[Subscription] = set()
+        # Subscribers of each topic and the sequence number of its last event
+        self._topic_subscribers: Counter[str] = Counter()
+        self._sequences: dict[str, int] = {}
+
+        # Counters
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    @asynccontextmanager
+    async def subscribe(self, topic: str | None = None):
+        subscription = Subscription(self, topic, self.maxsize, self.policy)
+        self._subscriptions.add(subscription)
+        if topic is not None:
+            self._topic_subscribers[topic] += 1
+
+        try:
+            yield subscription
+        finally:
+            subscription.close()
+            self._subscriptions.discard(subscription)
+            if topic is not None:
+                self._topic_subscribers[topic] -= 1
+                if self._topic_subscribers[topic] <= 0:
+                    del self._topic_subscribers[topic]
+                    self._sequences.pop(topic, None)
+
+    def sequence(self, topic: str) -> int:
+        """Sequence number of the last event of a topic, 0 before the first."""
+        return self._sequences.get(topic, 0)
+
+    def next_sequence(self, topic: str) -> int:
+        """Number the next event of a topic, 0 while it has no subscribers."""
+        if topic not in self._topic_subscribers:
+            return 0
+        self._sequences[topic] = self._sequences.get(topic, 0) + 1
+        return self._sequences[topic]
+
+    def publish(self, topic: str, payload: Any, key: str | None = None) -> None:
+        self.published += 1
+        for subscription in tuple(self._subscriptions):
+            if subscription.topic is None or subscription.topic == topic:
+                subscription.offer(payload, key)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "queueDepth": sum(len(sub) for sub in self._subscriptions),
+            "queueDepthMax": max(map(len, self._subscriptions), default=0),
+            "published": self.published,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+            "policy": self.policy.value,
+        }
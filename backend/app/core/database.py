@@ -1,18 +1,189 @@
-from rdflib import Graph, Namespace
+import os
+import threading
+import time
+from collections.abc import Callable
+
+from rdflib import Graph, Namespace, plugin
+from rdflib.plugin import PluginException
+from rdflib.plugins.stores.memory import Memory
+from rdflib.store import Store
 from rdflib_sqlalchemy.store import SQLAlchemy
-from sqlalchemy.engine.url import URL
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import URL, make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
 
 from app.core.config import settings
-from app.core.logger import logger
-
-DATABASE_URL = URL.create(
-    drivername="postgresql+psycopg2",
-    username=settings.DB_USERNAME,
-    password=settings.DB_PASSWORD,
-    host=settings.DB_URL_HOST,
-    port=settings.DB_URL_PORT,
-    database=settings.DB_URL_DATABASE,
+from app.core.instrumentation import (
+    CollectedCounter,
+    Gauge,
+    InstrumentedGraph,
+    registry,
 )
+from app.core.logger import log_slow_operation, logger
+from app.core.unit_of_work import ScopedEngine
+
+
+def database_url() -> URL:
+    """Database of the SQL graph stores, the metric store and the read model."""
+    if settings.GRAPH_STORE == "postgres":
+        return URL.create(
+            drivername="postgresql+psycopg2",
+            username=settings.DB_USERNAME,
+            password=settings.DB_PASSWORD,
+            host=settings.DB_URL_HOST,
+            port=settings.DB_URL_PORT,
+            database=settings.DB_URL_DATABASE,
+        )
+
+    return URL.create(drivername="sqlite", database=settings.SQLITE_PATH)
+
+
+DATABASE_URL = database_url()
+
+
+class PoolStats:
+    """Checkout latency of a connection pool of the worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "waitSecondsTotal": round(self.wait_seconds_total, 6),
+                "waitSecondsMax": round(self.wait_seconds_max, 6),
+                "waitSecondsAvg": round(self.wait_seconds_total / self.checkouts, 6)
+                if self.checkouts
+                else 0.0,
+            }
+
+
+class MonitoredQueuePool(QueuePool):
+    """QueuePool that records how long every checkout waits for a connection."""
+
+    # Set on the subclass of each database, it outlives `Pool.recreate`
+    stats: PoolStats
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+
+class Database:
+    """
+    SQLAlchemy engine shared by the SQL graph stores, the metric store and the
+    read model. It is created on first use, i.e. in the lifespan of each worker
+    process, so no pooled connection is ever inherited across a fork.
+    """
+
+    def __init__(self, name: str, url: URL):
+        self.name = name
+        self.url = url
+        self.pool_stats = PoolStats()
+        self._lock = threading.Lock()
+        self._engine: Engine | None = None
+        self._pid: int | None = None
+
+    @property
+    def engine(self) -> Engine:
+        with self._lock:
+            if self._engine is None or self._pid != os.getpid():
+                self._engine = self._create_engine()
+                self._pid = os.getpid()
+            return self._engine
+
+    def _create_engine(self) -> Engine:
+        logger.info(f"Creating the {self.name} database engine of worker {os.getpid()}")
+        connect_args: dict = {}
+        if self.url.get_backend_name() == "postgresql":
+            if settings.DB_STATEMENT_TIMEOUT:
+                connect_args["options"] = (
+                    f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT}"
+                )
+        else:
+            # Pooled SQLite connections are handed between the executor threads
+            connect_args["check_same_thread"] = False
+
+        engine = create_engine(
+            self.url,
+            poolclass=type(
+                "MonitoredQueuePool", (MonitoredQueuePool,), {"stats": self.pool_stats}
+            ),
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            connect_args=connect_args,
+        )
+        if settings.SLOW_OPERATION_THRESHOLD > 0:
+            event.listen(engine, "before_cursor_execute", self._start_statement)
+            event.listen(engine, "after_cursor_execute", self._end_statement)
+        return engine
+
+    @staticmethod
+    def _start_statement(conn, cursor, statement, parameters, context, executemany):
+        context.slow_log_started = time.perf_counter()
+
+    def _end_statement(self, conn, cursor, statement, parameters, context, executemany):
+        log_slow_operation(
+            f"sql.{self.name}",
+            time.perf_counter() - context.slow_log_started,
+            statement=statement,
+            # Bulk inserts are logged by their number of rows only
+            parameters=f"{len(parameters)} rows" if executemany else parameters,
+        )
+
+    def stats(self) -> dict:
+        stats = self.pool_stats.snapshot()
+        if self._engine is None:
+            return stats
+
+        pool: QueuePool = self._engine.pool
+        capacity = settings.DB_POOL_SIZE + max(settings.DB_POOL_MAX_OVERFLOW, 0)
+        return {
+            **stats,
+            "poolSize": pool.size(),
+            "maxOverflow": settings.DB_POOL_MAX_OVERFLOW,
+            "checkedOut": pool.checkedout(),
+            "checkedIn": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "saturation": round(pool.checkedout() / capacity, 4) if capacity else 0.0,
+        }
+
+    def dispose(self) -> None:
+        with self._lock:
+            if self._engine is not None:
+                logger.warning(f"Closing the {self.name} database connections")
+                self._engine.dispose()
+                self._engine = None
+
+
+database = Database("primary", DATABASE_URL)
 
 PHT = Namespace("https://schema.padme-analytics.de/#")
 TrainNS = Namespace(f"https://{settings.DOMAIN}/trains/")
@@ -23,29 +194,251 @@ CpuNS = Namespace(f"https://{settings.DOMAIN}/cpu/")
 NetworkNS = Namespace(f"https://{settings.DOMAIN}/network/")
 
 
+# * Graph store backends, each returns the store, the identifier of the graph
+# * in it and the configuration it is opened with, None if it needs no opening.
+# * Oxigraph only names graphs with IRIs, the other stores keep the identifier
+# * their existing data was written under.
+GRAPH_IDENTIFIER = "rdf_store"
+
+StoreFactory = Callable[[], tuple[Store, str, str | None]]
+
+
+def sql_store() -> tuple[Store, str, None]:
+    # Runs on the shared engine instead of opening one of its own
+    store = SQLAlchemy(engine=ScopedEngine(database.engine))
+    store.create_all()
+    return store, GRAPH_IDENTIFIER, None
+
+
+def memory_store() -> tuple[Store, str, None]:
+    return Memory(), GRAPH_IDENTIFIER, None
+
+
+def oxigraph_store() -> tuple[Store, str, str | None]:
+    try:
+        store = plugin.get("Oxigraph", Store)()
+    except PluginException:
+        raise RuntimeError("The oxigraph graph store requires the oxrdflib package")
+    return (
+        store,
+        f"https://{settings.DOMAIN}/{GRAPH_IDENTIFIER}",
+        settings.OXIGRAPH_PATH,
+    )
+
+
+GRAPH_STORES: dict[str, StoreFactory] = {
+    "postgres": sql_store,
+    "sqlite": sql_store,
+    "memory": memory_store,
+    "oxigraph": oxigraph_store,
+}
+
+
 class RDFGraphSingleton:
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(RDFGraphSingleton, cls).__new__(cls)
-            cls._instance._initialize()
+            cls._instance._lock = threading.Lock()
+            cls._instance.rdf_graph = None
         return cls._instance
 
+    def open(self) -> Graph:
+        """Open the graph store of this worker process, if not open yet."""
+        with self._lock:
+            if self.rdf_graph is None:
+                self._initialize()
+            return self.rdf_graph
+
     def _initialize(self):
-        logger.info("Initializing the Graph Database")
-        self.store = SQLAlchemy(configuration=DATABASE_URL)
-        self.rdf_graph = Graph(self.store, identifier="rdf_store")
-        self.rdf_graph.open(configuration=DATABASE_URL, create=True)
-        logger.info("Successfully connected to the database")
+        logger.info(f"Initializing the {settings.GRAPH_STORE} graph store")
+        self.store, identifier, configuration = GRAPH_STORES[settings.GRAPH_STORE]()
+        self.rdf_graph = InstrumentedGraph(self.store, identifier=identifier)
+        if configuration is not None:
+            self.rdf_graph.open(configuration=configuration, create=True)
+        logger.info("Successfully connected to the graph store")
 
     def get_graph(self) -> Graph:
-        return self.rdf_graph
+        return self.rdf_graph or self.open()
 
     def close_graph(self) -> None:
-        logger.warning("Closing database connection")
-        self.rdf_graph.close()
+        with self._lock:
+            if self.rdf_graph is not None:
+                logger.warning("Closing the graph store")
+                self.rdf_graph.close()
+                self.rdf_graph = None
 
 
 # Singleton instance
 graph_singleton = RDFGraphSingleton()
+
+
+class ReadReplica:
+    """
+    Graph on a read replica of the SQL graph store, for read-only queries that
+    tolerate replication lag. The primary graph is used instead while the
+    replica lags behind more than DB_READ_REPLICA_MAX_LAG seconds or can't be
+    reached, the lag is checked at most every DB_READ_REPLICA_LAG_CHECK_INTERVAL.
+    """
+
+    def __init__(self, url: URL):
+        self.database = Database("replica", url)
+        self._lock = threading.Lock()
+        self._graph: Graph | None = None
+        self._engine: Engine | None = None
+        self._lag: float | None = None
+        self._checked_at = float("-inf")
+        self.fallbacks = 0
+
+    def get_graph(self) -> Graph:
+        engine = self.database.engine
+        with self._lock:
+            # Rebuilt along with the engine, which is created per worker process
+            if self._graph is None or self._engine is not engine:
+                # The schema is created on the primary and replicated
+                store = SQLAlchemy(engine=ScopedEngine(engine))
+                self._graph = InstrumentedGraph(store, identifier=GRAPH_IDENTIFIER)
+                self._engine = engine
+            return self._graph
+
+    def lag(self) -> float | None:
+        """Replication lag in seconds, None if the replica can't be reached."""
+        now = time.monotonic()
+        if now - self._checked_at < settings.DB_READ_REPLICA_LAG_CHECK_INTERVAL:
+            return self._lag
+
+        self._checked_at = now
+        try:
+            with self.database.engine.connect() as connection:
+                if self.database.url.get_backend_name() == "postgresql":
+                    # No lag while the standby has replayed all it received
+                    self._lag = connection.exec_driver_sql(
+                        "SELECT CASE WHEN NOT pg_is_in_recovery()"
+                        " OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()"
+                        " THEN 0 ELSE EXTRACT(EPOCH FROM"
+                        " now() - pg_last_xact_replay_timestamp()) END"
+                    ).scalar()
+                else:
+                    connection.exec_driver_sql("SELECT 1")
+                    self._lag = 0.0
+        except SQLAlchemyError as error:
+            logger.warning(f"Read replica unavailable: {error}")
+            self._lag = None
+        return self._lag
+
+    def is_fresh(self) -> bool:
+        lag = self.lag()
+        fresh = lag is not None and lag <= settings.DB_READ_REPLICA_MAX_LAG
+        if not fresh:
+            self.fallbacks += 1
+        return fresh
+
+    def stats(self) -> dict:
+        return {
+            **self.database.stats(),
+            "lagSeconds": self._lag,
+            "fallbacks": self.fallbacks,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._graph = None
+            self._engine = None
+        self.database.dispose()
+
+
+# Only the SQL graph stores can have a replica
+read_replica = (
+    ReadReplica(make_url(settings.DB_READ_REPLICA_URL))
+    if settings.DB_READ_REPLICA_URL
+    else None
+)
+
+
+def database_stats() -> dict[str, dict]:
+    databases = [database]
+    if read_replica is not None:
+        databases.append(read_replica.database)
+    return {db.name: db.stats() for db in databases}
+
+
+registry.register(
+    Gauge(
+        "db_pool_connections",
+        "Open connections of the pool, checked out or idle in the pool.",
+        ("database", "state"),
+        lambda: {
+            (name, state): stats[key]
+            for name, stats in database_stats().items()
+            for state, key in (
+                ("checked_out", "checkedOut"),
+                ("checked_in", "checkedIn"),
+            )
+            # Not connected yet
+            if key in stats
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "db_pool_checkouts_total",
+        "Connections checked out of the pool.",
+        ("database",),
+        lambda: {
+            (name,): stats["checkouts"] for name, stats in database_stats().items()
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "db_pool_timeouts_total",
+        "Checkouts that timed out waiting for a connection.",
+        ("database",),
+        lambda: {
+            (name,): stats["timeouts"] for name, stats in database_stats().items()
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "db_pool_wait_seconds_total",
+        "Time checkouts waited for a connection.",
+        ("database",),
+        lambda: {
+            (name,): stats["waitSecondsTotal"]
+            for name, stats in database_stats().items()
+        },
+    )
+)
+
+
+def replica_lag() -> dict[tuple[str, ...], float]:
+    lag = read_replica.stats()["lagSeconds"] if read_replica is not None else None
+    # Unknown until checked, and while the replica can't be reached
+    return {} if lag is None else {(): lag}
+
+
+registry.register(
+    Gauge(
+        "db_replica_lag_seconds",
+        "Replication lag of the read replica at its last check.",
+        (),
+        replica_lag,
+    )
+)
+registry.register(
+    CollectedCounter(
+        "db_replica_fallbacks_total",
+        "Reads served by the primary as the replica lagged or was unreachable.",
+        (),
+        lambda: {} if read_replica is None else {(): read_replica.fallbacks},
+    )
+)
+
+
+def get_read_graph() -> Graph:
+    """Graph of read-only queries, the replica if it is configured and fresh."""
+    if read_replica is not None and read_replica.is_fresh():
+        return read_replica.get_graph()
+    return graph_singleton.get_graph()
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from app.core.config import settings
+from app.core.instrumentation import CollectedCounter, Gauge, registry
+from app.core.logger import logger
+from app.core.profiling import profiled
+
+T = TypeVar("T")
+
+
+class GraphExecutor:
+    """
+    Bounded thread pool for blocking rdflib/SQLAlchemy calls, so that a slow
+    query never stalls the event loop (and every SSE stream on the worker).
+    Tracks the number of queued calls and how long they wait for a thread.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"graph-{name}"
+        )
+        self._lock = threading.Lock()
+
+        # Counters
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        submitted_at = time.perf_counter()
+
+        with self._lock:
+            self.queued += 1
+
+        def call() -> T:
+            wait_seconds = time.perf_counter() - submitted_at
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.wait_seconds_total += wait_seconds
+                self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+            try:
+                with profiled():
+                    return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        # Like `asyncio.to_thread`, the call sees the context variables of the
+        # caller, e.g. the profile of the request
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._pool, context.run, call)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "maxWorkers": self.max_workers,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "waitSecondsTotal": round(self.wait_seconds_total, 6),
+                "waitSecondsMax": round(self.wait_seconds_max, 6),
+                "waitSecondsAvg": round(self.wait_seconds_total / self.completed, 6)
+                if self.completed
+                else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        logger.info(f"Shutting down the graph {self.name} executor")
+        self._pool.shutdown(wait=True)
+
+
+# Separate pools, so that a burst of metric writes can not starve dashboard reads
+read_executor = GraphExecutor("read", settings.GRAPH_READ_POOL_SIZE)
+write_executor = GraphExecutor("write", settings.GRAPH_WRITE_POOL_SIZE)
+
+EXECUTORS = (read_executor, write_executor)
+
+registry.register(
+    Gauge(
+        "graph_executor_calls",
+        "Graph calls waiting for a thread or running, by executor.",
+        ("executor", "state"),
+        lambda: {
+            (executor.name, state): executor.stats()[key]
+            for executor in EXECUTORS
+            for state, key in (("queued", "queued"), ("active", "active"))
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "graph_executor_completed_total",
+        "Graph calls completed by the executor.",
+        ("executor",),
+        lambda: {
+            (executor.name,): executor.stats()["completed"] for executor in EXECUTORS
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "graph_executor_wait_seconds_total",
+        "Time the completed graph calls waited for a thread.",
+        ("executor",),
+        lambda: {
+            (executor.name,): executor.stats()["waitSecondsTotal"]
+            for executor in EXECUTORS
+        },
+    )
+)
+
+
+async def run_read(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await read_executor.run(fn, *args, **kwargs)
+
+
+async def run_write(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await write_executor.run(fn, *args, **kwargs)
@@ -0,0 +1,352 @@
+import bisect
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import IO, Any
+
+from rdflib import Graph
+
+from app.core.logger import log_slow_operation
+
+# * Prometheus text exposition of the worker process. Every series carries a
+# * `worker` label with the index of the worker, so the counters of the workers
+# * behind one port stay monotonic and are summed up on the Prometheus side. A
+# * restarted worker takes over the index of the one it replaces, which keeps
+# * the number of series bounded. Recording is a dict update under a per-metric
+# * lock, cheap enough to stay on.
+
+Labels = tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process id, worker index and the open lock file holding the index
+_worker: tuple[int, int, IO[str]] | None = None
+_worker_lock = threading.Lock()
+
+
+def worker_index() -> int:
+    """
+    Lowest index not held by another live worker process of the host. The
+    index is held by a lock on its file, which the OS releases when the
+    process exits, so a restarted worker reuses it.
+    """
+    global _worker
+    with _worker_lock:
+        # Checked against the pid, a forked process takes an index of its own
+        if _worker is not None and _worker[0] == os.getpid():
+            return _worker[1]
+
+        index = 0
+        while True:
+            path = os.path.join(tempfile.gettempdir(), f"padme-worker-{index}.lock")
+            handle = open(path, "w")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                index += 1
+                continue
+            _worker = (os.getpid(), index, handle)
+            return index
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [
+        f'{name}="{escape(str(value))}"'
+        for name, value in zip(names, values, strict=True)
+    ]
+    pairs.append(f'worker="{worker_index()}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label set, the count of each bucket (+Inf last) and the sum
+        self._counts: dict[Labels, list[int]] = {}
+        self._sums: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._sums[labels] = self._sums.get(labels, 0.0) + value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [
+                (labels, list(counts), self._sums[labels])
+                for labels, counts in self._counts.items()
+            ]
+
+        names = (*self.labelnames, "le")
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                cumulative += count
+                bucket_labels = format_labels(names, (*labels, bound))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            plain = format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{plain} {total}"
+            yield f"{self.name}_count{plain} {cumulative}"
+
+
+class Gauge:
+    """Gauge read at scrape time, `collect` returns the value by label values."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels,
+        collect: Callable[[], dict[Labels, float]],
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in self.collect().items():
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {value}"
+
+
+class CollectedCounter(Gauge):
+    """Counter kept by the object it counts for, read at scrape time."""
+
+    kind = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = [line for metric in self._metrics.values() for line in metric.expose()]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time until the response headers are sent, by route template.",
+        ("method", "route", "status"),
+    )
+)
+graph_call_duration = registry.register(
+    Histogram(
+        "graph_call_duration_seconds",
+        "Duration of rdflib graph calls by operation, nested calls are not counted.",
+        ("operation",),
+    )
+)
+metric_samples_ingested = registry.register(
+    Counter(
+        "metric_samples_ingested_total",
+        "Job metric samples written to the metric store, by station and type.",
+        ("station", "metric"),
+    )
+)
+auth_duration = registry.register(
+    Histogram(
+        "auth_duration_seconds",
+        "Duration of the bearer token validation, by auth mode.",
+        ("mode",),
+    )
+)
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the matched route, with the prefixes of the routers it
+    is included in. Unmatched paths share one label, they are unbounded.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        return "unmatched"
+
+    # Routes of included routers may only know the path below their prefix.
+    # The prefix is the part of the request path in front of the segments of
+    # the template, none of the routes has a path convertor spanning segments
+    segments = scope["path"].split("/")
+    prefix = "/".join(segments[: len(segments) - template.count("/")])
+    return prefix + template
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # The router has set the matched route on the scope by now
+                http_request_duration.observe(
+                    time.perf_counter() - started,
+                    scope["method"],
+                    route_template(scope),
+                    str(message["status"]),
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class InstrumentedGraph(Graph):
+    """
+    Graph that records the duration of its `triples`, `value`, `query`,
+    `parse`, `set`, `add` and `remove` calls. Calls made by another
+    instrumented call, e.g. the `triples` of a SPARQL query, are part of it.
+    Calls above SLOW_OPERATION_THRESHOLD are logged with their arguments.
+    """
+
+    _local = threading.local()
+
+    @contextmanager
+    def _timed(self, operation: str, **details: Any) -> Iterator[None]:
+        if getattr(self._local, "active", False):
+            yield
+            return
+
+        self._local.active = True
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.active = False
+            elapsed = time.perf_counter() - started
+            graph_call_duration.observe(elapsed, operation)
+            log_slow_operation(f"graph.{operation}", elapsed, **details)
+
+    def triples(self, triple):
+        # A generator, only the time spent producing triples is counted
+        if getattr(self._local, "active", False):
+            yield from super().triples(triple)
+            return
+
+        elapsed = 0.0
+        iterator = iter(super().triples(triple))
+        try:
+            while True:
+                started = time.perf_counter()
+                self._local.active = True
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self._local.active = False
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            graph_call_duration.observe(elapsed, "triples")
+            log_slow_operation("graph.triples", elapsed, pattern=triple)
+
+    def value(self, *args, **kwargs):
+        with self._timed("value", arguments=args):
+            return super().value(*args, **kwargs)
+
+    def query(self, query_object, *args, **kwargs):
+        # Prepared queries of the registry are logged by their name
+        with self._timed(
+            "query",
+            query=getattr(query_object, "name", query_object),
+            bindings=kwargs.get("initBindings"),
+        ):
+            result = super().query(query_object, *args, **kwargs)
+            # SELECT rows are evaluated lazily, on the first iteration. Their
+            # length is taken to evaluate them while the call is timed
+            if result.type == "SELECT":
+                len(result)
+            return result
+
+    def parse(self, *args, **kwargs):
+        with self._timed("parse", arguments=args):
+            return super().parse(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        with self._timed("set", arguments=args):
+            return super().set(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with self._timed("add", arguments=args):
+            return super().add(*args, **kwargs)
+
+    def addN(self, *args, **kwargs):
+        with self._timed("add"):
+            return super().addN(*args, **kwargs)
+
+    def remove(self, *args, **kwargs):
+        with self._timed("remove", arguments=args):
+            return super().remove(*args, **kwargs)
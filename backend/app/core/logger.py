@@ -1,5 +1,7 @@
+import json
 import logging
 import sys
+from typing import Any
 
 from app.core.config import settings
 from uvicorn.logging import DefaultFormatter
@@ -7,6 +9,7 @@ from uvicorn.logging import DefaultFormatter
 
 IS_DEVELOPMENT_ENV = settings.ENVIRONMENT == "local"
 FORMAT: str = "%(levelprefix)s [%(asctime)s] - %(message)s"
+SLOW_OPERATION_DETAIL_LENGTH = 1000
 
 # Create Logger
 logger = logging.getLogger(__name__)
@@ -19,3 +22,27 @@ log_formatter = DefaultFormatter(FORMAT)
 
 stream_handler.setFormatter(log_formatter)
 logger.addHandler(stream_handler)
+
+
+def log_slow_operation(operation: str, seconds: float, **details: Any) -> None:
+    """
+    Log an operation that took longer than SLOW_OPERATION_THRESHOLD seconds,
+    as one JSON object per line. Details are logged as strings of at most
+    SLOW_OPERATION_DETAIL_LENGTH characters. The record is also attached to
+    the log record as `slow_operation`, for handlers that ship structured logs.
+    """
+    threshold = settings.SLOW_OPERATION_THRESHOLD
+    if threshold <= 0 or seconds < threshold:
+        return
+
+    record = {"operation": operation, "seconds": round(seconds, 6)}
+    for name, value in details.items():
+        text = " ".join(str(value).split())
+        if len(text) > SLOW_OPERATION_DETAIL_LENGTH:
+            text = text[:SLOW_OPERATION_DETAIL_LENGTH] + "..."
+        record[name] = text
+
+    logger.warning(
+        f"Slow operation {json.dumps(record)}",
+        extra={"slow_operation": record},
+    )
@@ -0,0 +1,490 @@
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    UniqueConstraint,
+    and_,
+    delete,
+    func,
+    insert,
+    select,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, RowMapping
+
+from app.core.config import settings
+from app.core.database import database
+from app.core.instrumentation import metric_samples_ingested
+from app.core.logger import logger
+
+# Max. number of raw samples kept per job and metric type
+METRICS_BUFFER_SIZE = 1000
+# Number of samples appended to a series between two trims of it
+METRICS_TRIM_INTERVAL = 100
+
+# Bucket width of each rollup resolution
+ROLLUP_RESOLUTIONS = {"1m": timedelta(minutes=1), "1h": timedelta(hours=1)}
+
+# Aggregates of a rollup bucket, value_* for cpu and memory, rx_*/tx_* for network
+ROLLUP_AGGREGATES = (
+    "value_min",
+    "value_max",
+    "value_sum",
+    "rx_min",
+    "rx_max",
+    "tx_min",
+    "tx_max",
+)
+
+metadata = MetaData()
+
+# * Append-only time series of job metrics, one row per sample.
+# * The (job_id, metric_type, timestamp) index serves appends and range scans.
+job_metrics = Table(
+    "job_metrics",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("metric_id", String(36), nullable=False, unique=True),
+    Column("job_id", String(36), nullable=False),
+    Column("metric_type", String(16), nullable=False),
+    Column("station_id", String(36), nullable=False),
+    Column("timestamp", DateTime(timezone=True), nullable=False),
+    Column("value", String(50)),
+    Column("rx_bytes", String(50)),
+    Column("tx_bytes", String(50)),
+    Index("ix_job_metrics_series", "job_id", "metric_type", "timestamp"),
+)
+
+# * Downsampled series, one row per job, metric type, resolution and bucket.
+# * Buckets are upserted on ingest, the unique key serves upserts and range scans.
+job_metric_rollups = Table(
+    "job_metric_rollups",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("job_id", String(36), nullable=False),
+    Column("metric_type", String(16), nullable=False),
+    Column("resolution", String(8), nullable=False),
+    Column("bucket", DateTime(timezone=True), nullable=False),
+    Column("count", Integer, nullable=False),
+    Column("value_min", Float),
+    Column("value_max", Float),
+    Column("value_sum", Float),
+    Column("rx_min", BigInteger),
+    Column("rx_max", BigInteger),
+    Column("tx_min", BigInteger),
+    Column("tx_max", BigInteger),
+    UniqueConstraint(
+        "job_id",
+        "metric_type",
+        "resolution",
+        "bucket",
+        name="uq_job_metric_rollups_bucket",
+    ),
+)
+
+
+def to_aware_utc(timestamp: datetime) -> datetime:
+    """Aware UTC timestamp, naive input is taken as UTC already."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def bucket_of(timestamp: datetime, width: timedelta) -> datetime:
+    seconds = width.total_seconds()
+    start = to_aware_utc(timestamp).timestamp() // seconds * seconds
+    return datetime.fromtimestamp(start, timezone.utc)
+
+
+def parse_number(value: str | None, cast: type = float) -> float | int | None:
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sample_aggregates(sample: dict) -> dict | None:
+    """Aggregates of a single sample, None if its values are not numeric."""
+    if sample["metric_type"] == "network":
+        rx = parse_number(sample["rx_bytes"], int)
+        tx = parse_number(sample["tx_bytes"], int)
+        if rx is None or tx is None:
+            return None
+        return {"rx_min": rx, "rx_max": rx, "tx_min": tx, "tx_max": tx}
+
+    value = parse_number(sample["value"])
+    if value is None:
+        return None
+    return {"value_min": value, "value_max": value, "value_sum": value}
+
+
+def merge_aggregates(bucket: dict, aggregates: dict) -> None:
+    bucket["count"] += 1
+    for name, value in aggregates.items():
+        current = bucket[name]
+        if current is None:
+            bucket[name] = value
+        elif name.endswith("_min"):
+            bucket[name] = min(current, value)
+        elif name.endswith("_max"):
+            bucket[name] = max(current, value)
+        else:
+            bucket[name] = current + value
+
+
+class MetricStore:
+    """
+    Tiered metric retention. Raw samples are kept for `raw_retention` (at most
+    `buffer_size` per series), 1-minute and 1-hour rollups for the durations of
+    `rollup_retention`. Rollups are maintained incrementally on ingest, so old
+    samples age out of the raw tier while their aggregates stay available.
+
+    An append is an insert and a rollup upsert. A series is trimmed once every
+    `trim_interval` appends of the worker, meanwhile reads return the newest
+    `buffer_size` samples only.
+    """
+
+    def __init__(
+        self,
+        engine: Engine | None = None,
+        buffer_size: int = METRICS_BUFFER_SIZE,
+        trim_interval: int = METRICS_TRIM_INTERVAL,
+        raw_retention: timedelta = settings.METRICS_RAW_RETENTION,
+        rollup_retention: dict[str, timedelta] | None = None,
+    ):
+        self._engine = engine
+        self.buffer_size = buffer_size
+        self.trim_interval = max(trim_interval, 1)
+        self.raw_retention = raw_retention
+        self.rollup_retention = rollup_retention or {
+            "1m": settings.METRICS_MINUTE_ROLLUP_RETENTION,
+            "1h": settings.METRICS_HOUR_ROLLUP_RETENTION,
+        }
+        # Samples appended to each series since it was last trimmed
+        self._appended: Counter[tuple[str, str]] = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        """The given engine, else the shared engine of the worker process."""
+        return self._engine or database.engine
+
+    def create_all(self) -> None:
+        logger.info("Initializing the metric store")
+        metadata.create_all(self.engine)
+
+    def append(
+        self,
+        job_id: str,
+        metric_type: str,
+        station_id: str,
+        timestamp: datetime,
+        value: str | None = None,
+        rx_bytes: str | None = None,
+        tx_bytes: str | None = None,
+    ) -> dict:
+        """Append one sample to the series of a job, see `append_many`."""
+        sample = {
+            "job_id": job_id,
+            "metric_type": metric_type,
+            "station_id": station_id,
+            "timestamp": timestamp,
+            "value": value,
+            "rx_bytes": rx_bytes,
+            "tx_bytes": tx_bytes,
+        }
+        return self.append_many([sample])[0]
+
+    def append_many(self, samples: list[dict]) -> list[dict]:
+        """
+        Append samples of any job and metric type in one transaction. The
+        rollup buckets of the samples are upserted and every touched series
+        that is due is trimmed once. Samples take the arguments of `append`.
+        """
+        rows = [
+            {
+                "metric_id": str(uuid.uuid4()),
+                "value": None,
+                "rx_bytes": None,
+                "tx_bytes": None,
+                **sample,
+            }
+            for sample in samples
+        ]
+        if not rows:
+            return rows
+
+        appended = Counter((row["job_id"], row["metric_type"]) for row in rows)
+        due = []
+        with self._lock:
+            self._appended.update(appended)
+            for series in appended:
+                if self._appended[series] >= self.trim_interval:
+                    del self._appended[series]
+                    due.append(series)
+
+        with self.engine.begin() as connection:
+            connection.execute(insert(job_metrics), rows)
+            self._upsert_rollups(connection, rows)
+            for job_id, metric_type in due:
+                self._trim(connection, job_id, metric_type)
+
+        ingested = Counter((str(row["station_id"]), row["metric_type"]) for row in rows)
+        for (station_id, metric_type), count in ingested.items():
+            metric_samples_ingested.inc(station_id, metric_type, amount=count)
+
+        return rows
+
+    def series(
+        self,
+        job_id: str,
+        metric_type: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        descending: bool = True,
+    ) -> list[RowMapping]:
+        """
+        Range scan over the samples of one job and metric type, at most the
+        newest `buffer_size` of the range, including those not yet trimmed.
+        Naive bounds are taken as UTC.
+        """
+        clause = self._series_clause(job_id, metric_type)
+        if start is not None:
+            clause = and_(clause, job_metrics.c.timestamp >= to_aware_utc(start))
+        if end is not None:
+            clause = and_(clause, job_metrics.c.timestamp <= to_aware_utc(end))
+
+        query = (
+            select(job_metrics)
+            .where(clause)
+            .order_by(job_metrics.c.timestamp.desc(), job_metrics.c.id.desc())
+            .limit(self.buffer_size)
+        )
+
+        with self.engine.connect() as connection:
+            samples = connection.execute(query).mappings().all()
+
+        return samples if descending else samples[::-1]
+
+    def rollups(
+        self,
+        job_id: str,
+        metric_type: str,
+        resolution: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        descending: bool = True,
+    ) -> list[dict]:
+        """
+        Range scan over the rollup buckets of one job, metric type and
+        resolution. Buckets get their `value_avg` and, for network metrics, the
+        `rx_delta`/`tx_delta` against the preceding bucket of the series.
+        """
+        clause = and_(
+            self._rollup_clause(job_id, metric_type),
+            job_metric_rollups.c.resolution == resolution,
+        )
+        query = select(job_metric_rollups).where(clause)
+        if start is not None:
+            start = to_aware_utc(start)
+            query = query.where(job_metric_rollups.c.bucket >= start)
+        if end is not None:
+            query = query.where(job_metric_rollups.c.bucket <= to_aware_utc(end))
+
+        with self.engine.connect() as connection:
+            buckets = [
+                dict(bucket)
+                for bucket in connection.execute(
+                    query.order_by(job_metric_rollups.c.bucket)
+                ).mappings()
+            ]
+
+            # Bucket right before the range, the base of the first delta
+            previous = None
+            if start is not None:
+                previous = (
+                    connection.execute(
+                        select(job_metric_rollups)
+                        .where(clause, job_metric_rollups.c.bucket < start)
+                        .order_by(job_metric_rollups.c.bucket.desc())
+                        .limit(1)
+                    )
+                    .mappings()
+                    .first()
+                )
+
+        for bucket in buckets:
+            bucket["value_avg"] = (
+                bucket["value_sum"] / bucket["count"]
+                if bucket["value_sum"] is not None
+                else None
+            )
+            if metric_type == "network":
+                for counter in ("rx", "tx"):
+                    bucket[f"{counter}_delta"] = self._counter_delta(
+                        bucket, previous, counter
+                    )
+            previous = bucket
+
+        if descending:
+            buckets.reverse()
+        return buckets
+
+    def delete(self, job_id: str, metric_type: str, metric_id: str) -> bool:
+        """
+        Delete one raw sample. Rollups keep its contribution, a bucket's
+        min/max cannot be taken back without the other samples.
+        """
+        query = delete(job_metrics).where(
+            self._series_clause(job_id, metric_type),
+            job_metrics.c.metric_id == metric_id,
+        )
+
+        with self.engine.begin() as connection:
+            return connection.execute(query).rowcount > 0
+
+    def _upsert_rollups(self, connection, rows: list[dict]) -> None:
+        # Aggregate the batch per bucket first, one upsert per touched bucket
+        buckets: dict[tuple, dict] = {}
+        for row in rows:
+            aggregates = sample_aggregates(row)
+            if aggregates is None:
+                continue
+
+            for resolution, width in ROLLUP_RESOLUTIONS.items():
+                key = (
+                    row["job_id"],
+                    row["metric_type"],
+                    resolution,
+                    bucket_of(row["timestamp"], width),
+                )
+                if key not in buckets:
+                    buckets[key] = dict.fromkeys(ROLLUP_AGGREGATES, None)
+                    buckets[key].update(
+                        zip(
+                            ("job_id", "metric_type", "resolution", "bucket"),
+                            key,
+                            strict=True,
+                        ),
+                        count=0,
+                    )
+                merge_aggregates(buckets[key], aggregates)
+
+        if not buckets:
+            return
+
+        # Sorted, so concurrent batches lock shared buckets in the same order
+        values = [buckets[key] for key in sorted(buckets)]
+        connection.execute(self._rollup_upsert(), values)
+
+    def _rollup_upsert(self):
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            statement = postgresql.insert(job_metric_rollups)
+            least, greatest = func.least, func.greatest
+        else:
+            statement = sqlite.insert(job_metric_rollups)
+            least, greatest = func.min, func.max
+
+        table, excluded = job_metric_rollups.c, statement.excluded
+        update = {"count": table.count + excluded.count}
+        for name in ROLLUP_AGGREGATES:
+            if name.endswith("_min"):
+                update[name] = least(table[name], excluded[name])
+            elif name.endswith("_max"):
+                update[name] = greatest(table[name], excluded[name])
+            else:
+                update[name] = table[name] + excluded[name]
+
+        return statement.on_conflict_do_update(
+            index_elements=["job_id", "metric_type", "resolution", "bucket"],
+            set_=update,
+        )
+
+    def _trim(self, connection, job_id: str, metric_type: str) -> None:
+        # Retention is relative to the newest sample of the series
+        newest = connection.execute(
+            select(func.max(job_metrics.c.timestamp)).where(
+                self._series_clause(job_id, metric_type)
+            )
+        ).scalar()
+        if newest is None:
+            return
+        newest = to_aware_utc(newest)
+
+        # Raw samples that left the retention window
+        connection.execute(
+            delete(job_metrics).where(
+                self._series_clause(job_id, metric_type),
+                job_metrics.c.timestamp < newest - self.raw_retention,
+            )
+        )
+
+        # Rollup buckets that left the retention window of their resolution
+        for resolution, retention in self.rollup_retention.items():
+            connection.execute(
+                delete(job_metric_rollups).where(
+                    self._rollup_clause(job_id, metric_type),
+                    job_metric_rollups.c.resolution == resolution,
+                    job_metric_rollups.c.bucket < newest - retention,
+                )
+            )
+
+        # Id of the oldest sample that is still inside the buffer. Samples are
+        # evicted in insertion order, many may share one timestamp
+        boundary = (
+            select(job_metrics.c.id)
+            .where(self._series_clause(job_id, metric_type))
+            .order_by(job_metrics.c.id.desc())
+            .offset(self.buffer_size - 1)
+            .limit(1)
+            .scalar_subquery()
+        )
+        connection.execute(
+            delete(job_metrics).where(
+                self._series_clause(job_id, metric_type),
+                job_metrics.c.id < boundary,
+            )
+        )
+
+    @staticmethod
+    def _series_clause(job_id: str, metric_type: str):
+        return and_(
+            job_metrics.c.job_id == job_id,
+            job_metrics.c.metric_type == metric_type,
+        )
+
+    @staticmethod
+    def _rollup_clause(job_id: str, metric_type: str):
+        return and_(
+            job_metric_rollups.c.job_id == job_id,
+            job_metric_rollups.c.metric_type == metric_type,
+        )
+
+    @staticmethod
+    def _counter_delta(bucket: dict, previous: dict | None, counter: str) -> int:
+        # Counters are cumulative, fall back to the bucket alone after a reset
+        maximum = bucket[f"{counter}_max"]
+        if previous is not None and previous[f"{counter}_max"] is not None:
+            if maximum >= previous[f"{counter}_max"]:
+                return maximum - previous[f"{counter}_max"]
+        return maximum - bucket[f"{counter}_min"]
+
+
+# Singleton instance
+metric_store = MetricStore()
+
+
+def get_metric_store() -> MetricStore:
+    return metric_store
@@ -0,0 +1,166 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from app.core.config import settings
+
+# * Opt-in cProfile report of a single request, for finding out whether its time
+# * goes to rdflib, SQLAlchemy, serialization or the identity provider. The event
+# * loop thread is profiled for the whole request, so coroutines of requests
+# * served meanwhile show up as well. Every executor call of the request is
+# * profiled in its worker thread and merged into the same report.
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_FLAG = "profile"
+FLAG_VALUES = {"1", "true", "yes"}
+
+
+class RequestProfile:
+    """cProfile profiles taken while handling one request, on any thread."""
+
+    def __init__(self):
+        self._profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def collect(self) -> Iterator[None]:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles through sys.monitoring, one profiler per
+            # process that sees every thread. It is already running for this
+            # request, or a debugger is attached
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def report(self, lines: int) -> str:
+        """Merged profiles, by cumulative time, with the `lines` top functions."""
+        with self._lock:
+            profiles = list(self._profiles)
+
+        stream = io.StringIO()
+        stats = pstats.Stats(*profiles, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(lines)
+        return stream.getvalue()
+
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar(
+    "current_profile", default=None
+)
+
+
+@contextmanager
+def profiled() -> Iterator[None]:
+    """Profile the block if it runs on behalf of a profiled request."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    with profile.collect():
+        yield
+
+
+def is_profile_requested(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value.decode("latin-1").lower() in FLAG_VALUES
+
+    query = parse_qs(scope["query_string"].decode("latin-1"))
+    return any(
+        value.lower() in FLAG_VALUES for value in query.get(PROFILE_QUERY_FLAG, [])
+    )
+
+
+def bearer_token(scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            return token.strip() or None
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware answering a request with the X-Profile header or the
+    profile query flag with the cProfile report of its handling, instead of
+    its response. Only tokens accepted by `authorize` may ask for it, and one
+    request per worker is profiled at a time. The status of the discarded
+    response is returned in the X-Profiled-Status header.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], Awaitable[bool]]):
+        self.app = app
+        self.authorize = authorize
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_profile_requested(scope):
+            return await self.app(scope, receive, send)
+
+        token = bearer_token(scope)
+        if token is None:
+            response = JSONResponse(
+                {"detail": "Not authenticated"},
+                status_code=401,
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+            return await response(scope, receive, send)
+        if not await self.authorize(token):
+            response = JSONResponse(
+                {"detail": "Profiling requires the admin role"}, status_code=403
+            )
+            return await response(scope, receive, send)
+        # Profilers of two requests would record each other's event loop work
+        if self._active:
+            response = JSONResponse(
+                {"detail": "Another request is being profiled"}, status_code=409
+            )
+            return await response(scope, receive, send)
+
+        self._active = True
+        profile = RequestProfile()
+        context_token = current_profile.set(profile)
+        response_status = None
+
+        async def discard(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+
+        started = time.perf_counter()
+        try:
+            with profile.collect():
+                await self.app(scope, receive, discard)
+        finally:
+            current_profile.reset(context_token)
+            self._active = False
+        elapsed = time.perf_counter() - started
+
+        summary = (
+            f"{scope['method']} {scope['path']} -> {response_status} "
+            f"in {elapsed:.3f} s\n"
+        )
+        response = PlainTextResponse(
+            summary + profile.report(settings.PROFILING_REPORT_LINES),
+            headers={"X-Profiled-Status": str(response_status)},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, Generic, TypeVar
+
+from jwcrypto import jwk, jwt
+from jwcrypto.common import JWException
+
+from app.core.logger import logger
+
+T = TypeVar("T")
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class JWKSCache:
+    """
+    Realm signing keys, fetched once and refreshed after `ttl` seconds or when a
+    token is signed with an unknown key id i.e. after a key rotation. Refreshes
+    triggered by unknown key ids are rate limited by `min_refresh_interval`, so
+    that forged tokens can not make us hammer the identity provider.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[dict]],
+        ttl: float = 3600,
+        min_refresh_interval: float = 30,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: jwk.JWKSet | None = None
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, kid: str | None = None) -> jwk.JWKSet:
+        is_stale = time.monotonic() - self._fetched_at > self.ttl
+        if self._keys is None or is_stale or not self._has_key(kid):
+            await self.refresh(force=is_stale)
+
+        return self._keys
+
+    async def refresh(self, force: bool = False) -> None:
+        """Fetch the keys, `force` skips the rate limit of unknown key ids."""
+        fetched_at = self._fetched_at
+        async with self._lock:
+            if self._keys is not None:
+                # Another request refreshed the keys while we were waiting
+                if self._fetched_at != fetched_at:
+                    return
+                since_fetch = time.monotonic() - self._fetched_at
+                if not force and since_fetch < self.min_refresh_interval:
+                    return
+
+            logger.info("Fetching the realm JWKS")
+            certs = await self.fetch()
+            self._keys = jwk.JWKSet.from_json(json.dumps(certs))
+            self._fetched_at = time.monotonic()
+
+    def _has_key(self, kid: str | None) -> bool:
+        if self._keys is None:
+            return False
+        return kid is None or self._keys.get_key(kid) is not None
+
+
+class TTLCache(Generic[T]):
+    """Bounded LRU cache whose entries expire at a per-entry deadline."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, T]] = OrderedDict()
+
+    def get(self, key: str) -> T | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: T, expires_at: float | None = None) -> None:
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+
+        self._entries[key] = (deadline, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TokenValidator:
+    """
+    Validates bearer tokens locally, i.e. signature, expiry and issuer, against
+    the cached realm JWKS. Validated claims are cached per token, keyed by the
+    token digest, until the cache TTL or the token expiry, whichever is first.
+    """
+
+    def __init__(
+        self,
+        jwks: JWKSCache,
+        issuer: str,
+        cache: TTLCache[dict[str, Any]],
+        leeway: int = 30,
+    ):
+        self.jwks = jwks
+        self.issuer = issuer
+        self.cache = cache
+        self.leeway = leeway
+
+    async def validate(self, token: str) -> dict[str, Any]:
+        cache_key = hashlib.sha256(token.encode()).hexdigest()
+        claims = self.cache.get(cache_key)
+        if claims is not None:
+            return claims
+
+        try:
+            kid = jwt.JWT(jwt=token).token.jose_header.get("kid")
+        except (JWException, ValueError) as error:
+            raise InvalidTokenError("Malformed token") from error
+
+        keys = await self.jwks.get(kid)
+
+        try:
+            validated = jwt.JWT(
+                check_claims={"exp": None, "iss": self.issuer},
+                expected_type="JWS",
+            )
+            validated.leeway = self.leeway
+            validated.deserialize(token, keys)
+            claims = json.loads(validated.claims)
+        except (JWException, ValueError) as error:
+            raise InvalidTokenError(str(error)) from error
+
+        self.cache.set(cache_key, claims, expires_at=claims["exp"])
+        return claims
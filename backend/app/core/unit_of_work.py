@@ -0,0 +1,110 @@
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+
+from rdflib import Graph
+from rdflib.term import Node
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.executor import run_write
+
+Triple = tuple[Node, Node, Node]
+Pattern = tuple[Node | None, Node | None, Node | None]
+
+
+class ScopedEngine:
+    """
+    Engine of the SQL graph store. rdflib-sqlalchemy opens a transaction per
+    store call, on a thread inside `transaction()` all of them join the single
+    transaction of that thread instead. Everything else is the wrapped engine.
+    """
+
+    def __init__(self, engine: Engine):
+        self._engine = engine
+        self._local = threading.local()
+
+    def __getattr__(self, name: str):
+        return getattr(self._engine, name)
+
+    @contextmanager
+    def begin(self) -> Iterator[Connection]:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            yield connection
+            return
+        with self._engine.begin() as connection:
+            yield connection
+
+    @contextmanager
+    def connect(self) -> Iterator[Connection]:
+        # Reads inside a transaction see its own writes
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            yield connection
+            return
+        with self._engine.connect() as connection:
+            yield connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[Connection]:
+        with self._engine.begin() as connection:
+            self._local.connection = connection
+            try:
+                yield connection
+            finally:
+                self._local.connection = None
+
+
+class UnitOfWork:
+    """
+    Request-scoped buffer of graph writes. Adds and removes are kept in order
+    and written by `commit` in a single transaction on the SQL graph stores,
+    consecutive adds as one bulk insert. Nothing is written if the request
+    fails before it commits.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self._operations: list[tuple[str, list]] = []
+
+    @property
+    def pending(self) -> int:
+        return sum(len(items) for _, items in self._operations)
+
+    def add(self, triples: Iterable[Triple]) -> None:
+        triples = list(triples)
+        if self._operations and self._operations[-1][0] == "add":
+            self._operations[-1][1].extend(triples)
+        elif triples:
+            self._operations.append(("add", triples))
+
+    def remove(self, pattern: Pattern) -> None:
+        self._operations.append(("remove", [pattern]))
+
+    def set(self, triple: Triple) -> None:
+        """Replace all objects of the subject and predicate, like `Graph.set`."""
+        subject, predicate, _ = triple
+        self.remove((subject, predicate, None))
+        self.add([triple])
+
+    def flush(self) -> None:
+        operations, self._operations = self._operations, []
+        if not operations:
+            return
+
+        engine = getattr(self.graph.store, "engine", None)
+        scope = (
+            engine.transaction() if isinstance(engine, ScopedEngine) else nullcontext()
+        )
+        with scope:
+            for operation, items in operations:
+                if operation == "add":
+                    self.graph.addN((s, p, o, self.graph) for s, p, o in items)
+                else:
+                    self.graph.remove(items[0])
+
+    async def commit(self) -> None:
+        await run_write(self.flush)
+
+    def rollback(self) -> None:
+        self._operations.clear()
@@ -1,47 +1,86 @@
-import json
+from collections.abc import Callable
 
 from fastapi import Response, HTTPException, status
-from rdflib import Graph, Namespace, URIRef
+from rdflib import Graph, Literal, Namespace, RDF, URIRef
 
-from app.core.database import PHT
-from app.utils import query_subject_properties, ResponseType
+from app.core.database import PHT, CpuNS, MemoryNS, NetworkNS
+from app.core.metric_store import parse_number
+from app.export import MEDIA_TYPES, render_graph, streaming_response
+from app.projection import PageKey, page_subjects
+from app.utils import (
+    decode_cursor,
+    encode_cursor,
+    MetricNamespace,
+    MetricType,
+    MetricTypeURI,
+    ResponseType,
+)
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def get_resource_page(
+    graph: Graph,
+    response: Response,
+    subject: URIRef,
+    offset: int,
+    limit: int,
+    cursor: str | None = None,
+    pager: Callable[..., list[PageKey]] = page_subjects,
+) -> list[URIRef]:
+    """
+    Select one page of subjects of type `subject` sorted by updatedAt in DESC order.
+    If the page is full, the keyset cursor of the next page is set on the response.
+    `pager` takes the arguments of `page_subjects`, i.e. a read model cache.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    page = pager(graph, subject, offset, limit, after)
+
+    if page and len(page) == limit:
+        _, updated_at, identifier = page[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(updated_at, identifier)
+
+    return [sub for sub, _, _ in page]
+
+
+def subject_graphs(graph: Graph, subjects: list[URIRef]) -> list[Graph]:
+    """Triples of every subject as a graph of its own, in the order of `subjects`."""
+    graphs = {subject: Graph() for subject in subjects}
+    if subjects:
+        for triple in graph.triples_choices((subjects, None, None)):
+            graphs[triple[0]].add(triple)
+    return list(graphs.values())
 
 
 def get_resources(
     graph: Graph,
-    response_type: str,
+    response: Response,
+    response_type: ResponseType,
     subject: URIRef,
     namespace: Namespace,
     prefix: str,
     offset: int,
     limit: int,
+    cursor: str | None = None,
     extra_context: dict = {},
 ):
-    result_graph = Graph()
-    query_result = graph.query(
-        query_subject_properties(),
-        initBindings={"uri": subject},
-    )
-    for row in query_result:
-        result_graph.add(row)
-
-    # Return turtle response
-    if response_type is ResponseType.turtle:
-        result_graph.bind("pht", PHT)
-        result_graph.bind(prefix, namespace)
-
-        response = result_graph.serialize()
-        return Response(response, media_type="text/turtle")
+    # Paginate before serializing, the triples of the page subjects are then
+    # fetched and serialized chunk by chunk while the response is streamed
+    subjects = get_resource_page(graph, response, subject, offset, limit, cursor)
 
+    headers = {}
+    if NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
     context = {"pht": PHT, prefix: namespace, **extra_context}
-    response = json.loads(
-        result_graph.serialize(format="json-ld", indent=4, context=context)
-    )
 
-    if len(response.get("@graph", [])) > 0:
-        response["@graph"] = response["@graph"][offset : offset + limit]
-
-    return response
+    return streaming_response(
+        lambda chunk: subject_graphs(graph, chunk),
+        subjects,
+        response_type,
+        context,
+        headers=headers,
+    )
 
 
 def get_resource_metadata(
@@ -69,12 +108,110 @@ def get_resource_metadata(
 
         return metadata
 
-    # Return json-ld response
+    # Return the requested RDF serialization
     result_graph = Graph()
     for sub, pred, obj in graph.triples(triple):
         result_graph.add((sub, pred, obj))
 
     context = {"pht": PHT, prefix: namespace}
-    jsonld_payload = result_graph.serialize(format="json-ld", indent=4, context=context)
-
-    return Response(jsonld_payload, media_type="application/json+ld")
+    if response_type is ResponseType.jsonld:
+        payload = result_graph.serialize(format="json-ld", indent=4, context=context)
+    else:
+        payload = "".join(render_graph(result_graph, response_type, context))
+
+    return Response(payload, media_type=MEDIA_TYPES[response_type])
+
+
+def serialize_metric(sample) -> dict:
+    metric_type = MetricType(sample["metric_type"])
+
+    return {
+        "id": f"{metric_type.value}:{sample['metric_id']}",
+        "jobId": sample["job_id"],
+        "stationId": sample["station_id"],
+        "timestamp": sample["timestamp"].isoformat(),
+        # Samples stored before the counters were validated may not parse
+        **(
+            {
+                "rxBytes": parse_number(sample["rx_bytes"], int),
+                "txBytes": parse_number(sample["tx_bytes"], int),
+            }
+            if metric_type is MetricType.network
+            else {"value": sample["value"]}
+        ),
+    }
+
+
+def serialize_metric_series(metric: MetricType, samples) -> dict:
+    return {
+        "source": metric,
+        "metrics": [serialize_metric(sample) for sample in samples],
+    }
+
+
+def serialize_rollup(bucket: dict) -> dict:
+    metric_type = MetricType(bucket["metric_type"])
+
+    return {
+        "jobId": bucket["job_id"],
+        "resolution": bucket["resolution"],
+        "bucket": bucket["bucket"].isoformat(),
+        "count": bucket["count"],
+        **(
+            {
+                "rxBytes": bucket["rx_max"],
+                "txBytes": bucket["tx_max"],
+                "rxDelta": bucket["rx_delta"],
+                "txDelta": bucket["tx_delta"],
+            }
+            if metric_type is MetricType.network
+            else {
+                "min": bucket["value_min"],
+                "max": bucket["value_max"],
+                "avg": bucket["value_avg"],
+            }
+        ),
+    }
+
+
+def get_metric_graph(samples) -> Graph:
+    """Expose metric samples of the time series store as RDF events."""
+    result_graph = Graph()
+    result_graph.bind("pht", PHT)
+    result_graph.bind("memory", MemoryNS)
+    result_graph.bind("cpu", CpuNS)
+    result_graph.bind("network", NetworkNS)
+
+    for sample in samples:
+        metric_type = MetricType(sample["metric_type"])
+        uri = MetricNamespace[metric_type].value[sample["metric_id"]]
+
+        result_graph.add((uri, RDF.type, MetricTypeURI[metric_type].value))
+        result_graph.add((uri, PHT.eventTimestamp, Literal(sample["timestamp"])))
+        result_graph.add((uri, PHT.hasJobId, Literal(sample["job_id"])))
+        result_graph.add((uri, PHT.hasStationId, Literal(sample["station_id"])))
+
+        if metric_type is MetricType.network:
+            result_graph.add((uri, PHT.hasRxBytes, Literal(sample["rx_bytes"])))
+            result_graph.add((uri, PHT.hasTxBytes, Literal(sample["tx_bytes"])))
+        else:
+            result_graph.add((uri, PHT.value, Literal(sample["value"])))
+
+    return result_graph
+
+
+def get_metric_resources(samples, response_type: ResponseType):
+    context = {
+        "pht": PHT,
+        "memory": MemoryNS,
+        "cpu": CpuNS,
+        "network": NetworkNS,
+    }
+
+    # One graph per sample keeps the order of the series in the export
+    return streaming_response(
+        lambda chunk: [get_metric_graph([sample]) for sample in chunk],
+        list(samples),
+        response_type,
+        context,
+    )
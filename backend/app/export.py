@@ -0,0 +1,131 @@
+import json
+from collections.abc import AsyncIterator, Callable
+
+from fastapi.responses import StreamingResponse
+from rdflib import Graph, Namespace
+from rdflib.plugins.serializers.jsonld import from_rdf
+
+from app.core.executor import run_read
+from app.utils import ResponseType
+
+# Number of resources fetched and serialized per streamed chunk
+EXPORT_CHUNK_SIZE = 100
+
+MEDIA_TYPES = {
+    ResponseType.turtle: "text/turtle",
+    ResponseType.jsonld: "application/json+ld",
+    ResponseType.ntriples: "application/n-triples",
+    ResponseType.ndjsonld: "application/x-ndjson",
+}
+
+
+def render_graph(
+    graph: Graph, response_type: ResponseType, context: dict[str, Namespace]
+) -> list[str]:
+    """
+    Serialize the graph of one resource. JSON-LD yields one compacted node per
+    entry, Turtle its statements including the prefix lines they use.
+    """
+    if response_type is ResponseType.ntriples:
+        return [graph.serialize(format="nt")]
+
+    if response_type is ResponseType.turtle:
+        for prefix, namespace in context.items():
+            graph.bind(prefix, namespace)
+        return [graph.serialize(format="turtle")]
+
+    # A graph of a single node is compacted to that node. Bare references to
+    # blank nodes, e.g. the head of pht:plannedRoute, carry no data and are left out
+    document = from_rdf(graph, context_data=context)
+    document.pop("@context", None)
+    nodes = [node for node in document.get("@graph", [document]) if len(node) > 1]
+    if response_type is ResponseType.ndjsonld:
+        return [
+            json.dumps({"@context": json_context(context), **node}) + "\n"
+            for node in nodes
+        ]
+    return [json.dumps(node) for node in nodes]
+
+
+def render_chunk(
+    load: Callable[[list], list[Graph]],
+    items: list,
+    response_type: ResponseType,
+    context: dict[str, Namespace],
+) -> list[str]:
+    return [
+        entry
+        for graph in load(items)
+        for entry in render_graph(graph, response_type, context)
+    ]
+
+
+def json_context(context: dict[str, Namespace]) -> dict[str, str]:
+    return {prefix: str(namespace) for prefix, namespace in context.items()}
+
+
+async def stream_graphs(
+    load: Callable[[list], list[Graph]],
+    items: list,
+    response_type: ResponseType,
+    context: dict[str, Namespace],
+) -> AsyncIterator[str]:
+    """
+    Serialize `items` chunk by chunk, `load` turns a chunk of items into one
+    graph per resource. Loading and serializing run on the read executor, so
+    only a single chunk is held in memory at a time.
+    """
+    is_jsonld = response_type is ResponseType.jsonld
+    if is_jsonld:
+        yield f'{{"@context": {json.dumps(json_context(context))}, "@graph": ['
+
+    # Turtle allows a prefix anywhere before its use, each is written once
+    prefixes: set[str] = set()
+    separator = ""
+
+    for index in range(0, len(items), EXPORT_CHUNK_SIZE):
+        entries = await run_read(
+            render_chunk,
+            load,
+            items[index : index + EXPORT_CHUNK_SIZE],
+            response_type,
+            context,
+        )
+
+        if is_jsonld:
+            if entries:
+                yield separator + ", ".join(entries)
+                separator = ", "
+            continue
+
+        if response_type is ResponseType.turtle:
+            entries = [drop_known_prefixes(entry, prefixes) for entry in entries]
+        yield "".join(entries)
+
+    if is_jsonld:
+        yield "]}"
+
+
+def drop_known_prefixes(turtle: str, prefixes: set[str]) -> str:
+    lines = []
+    for line in turtle.splitlines(keepends=True):
+        if line.startswith("@prefix"):
+            if line in prefixes:
+                continue
+            prefixes.add(line)
+        lines.append(line)
+    return "".join(lines)
+
+
+def streaming_response(
+    load: Callable[[list], list[Graph]],
+    items: list,
+    response_type: ResponseType,
+    context: dict[str, Namespace],
+    headers: dict[str, str] | None = None,
+) -> StreamingResponse:
+    return StreamingResponse(
+        stream_graphs(load, items, response_type, context),
+        media_type=MEDIA_TYPES[response_type],
+        headers=headers,
+    )
@@ -1,21 +1,46 @@
+import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from rdflib_sqlalchemy import registerplugins
 from starlette.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
-from app.core.database import graph_singleton
+from app.crud import NEXT_CURSOR_HEADER
+from app.core.database import database, graph_singleton, read_replica
+from app.core.executor import read_executor, write_executor
+from app.core.instrumentation import MetricsMiddleware, registry
+from app.core.metric_store import metric_store
+from app.core.profiling import ProfilingMiddleware
+from app.read_model import read_model, reconcile_job_counts
 from app.api.main import api_router
+from app.api.routes.auth import is_profiling_admin
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Register SQLAlchemy plugins first time application is started
     registerplugins()
+    # Engine and graph store are opened per worker process, after the fork
+    graph_singleton.open()
+    metric_store.create_all()
+    read_model.create_all()
+    read_model.rebuild(graph_singleton.get_graph())
+    reconcile_task = asyncio.create_task(
+        reconcile_job_counts(
+            graph_singleton.get_graph(), settings.JOB_COUNTS_RECONCILE_INTERVAL
+        )
+    )
     yield
+    reconcile_task.cancel()
     # Add cleanup functions here before application shutdown
+    # Let queued writes finish before the graph is closed
+    write_executor.shutdown()
+    read_executor.shutdown()
     graph_singleton.close_graph()
+    if read_replica is not None:
+        read_replica.close()
+    database.dispose()
 
 
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
@@ -26,6 +51,12 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of this worker process."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 if settings.all_cors_origins:
     app.add_middleware(
         CORSMiddleware,
@@ -33,7 +64,11 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
     )
 
+app.add_middleware(ProfilingMiddleware, authorize=is_profiling_admin)
+app.add_middleware(MetricsMiddleware)
+
 # Include all API routes
 app.include_router(api_router)
@@ -0,0 +1,127 @@
+import orjson
+from fastapi import HTTPException, Response, status
+
+from app import crud
+from app.core.metric_store import parse_number, to_aware_utc
+from app.utils import MetricType
+
+# * Columnar encodings for clients that pull whole metric series, i.e. MessagePack
+# * and Apache Arrow IPC. Both libraries are optional, a format whose library is
+# * not installed is answered with 406.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:
+    pa = ipc = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Accepted media types and the format they select
+MEDIA_TYPES = {
+    JSON_MEDIA_TYPE: JSON_MEDIA_TYPE,
+    "application/*": JSON_MEDIA_TYPE,
+    "*/*": JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE: MSGPACK_MEDIA_TYPE,
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    ARROW_MEDIA_TYPE: ARROW_MEDIA_TYPE,
+}
+
+
+def json_response(payload: dict, headers: dict[str, str] | None = None) -> Response:
+    """JSON encoded by orjson, without `jsonable_encoder` walking the payload."""
+    return Response(orjson.dumps(payload), media_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+def negotiate(accept: str | None) -> str:
+    """Media type of the response for an Accept header, JSON unless asked otherwise."""
+    if not accept:
+        return JSON_MEDIA_TYPE
+
+    ranges = []
+    for index, item in enumerate(accept.split(",")):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                quality = parse_number(value) or 0.0
+        if quality > 0 and media_type.lower() in MEDIA_TYPES:
+            ranges.append((-quality, index, MEDIA_TYPES[media_type.lower()]))
+
+    return min(ranges)[2] if ranges else JSON_MEDIA_TYPE
+
+
+def metric_columns(metric: MetricType, samples) -> dict[str, list]:
+    """Samples of one series as columns, numeric values are parsed."""
+    columns: dict[str, list] = {
+        "timestamp": [to_aware_utc(sample["timestamp"]) for sample in samples],
+        "metricId": [sample["metric_id"] for sample in samples],
+        "stationId": [sample["station_id"] for sample in samples],
+    }
+
+    if metric is MetricType.network:
+        columns["rxBytes"] = [parse_number(s["rx_bytes"], int) for s in samples]
+        columns["txBytes"] = [parse_number(s["tx_bytes"], int) for s in samples]
+    else:
+        columns["value"] = [parse_number(sample["value"]) for sample in samples]
+
+    return columns
+
+
+def encode_msgpack(metric: MetricType, job_id: str, columns: dict) -> bytes:
+    payload = {"source": metric.value, "jobId": job_id, "columns": columns}
+    return msgpack.packb(payload, datetime=True)
+
+
+def encode_arrow(metric: MetricType, job_id: str, columns: dict) -> bytes:
+    types = {
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "metricId": pa.string(),
+        "stationId": pa.string(),
+        "value": pa.float64(),
+        "rxBytes": pa.int64(),
+        "txBytes": pa.int64(),
+    }
+    arrays = {
+        name: pa.array(values, type=types[name]) for name, values in columns.items()
+    }
+    # Every point of a series repeats few station ids
+    arrays["stationId"] = arrays["stationId"].dictionary_encode()
+
+    table = pa.table(arrays, metadata={"source": metric.value, "jobId": job_id})
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def metric_series_response(
+    metric: MetricType, job_id: str, samples, media_type: str
+) -> Response:
+    """Response of a metric series in the negotiated format."""
+    headers = {"Vary": "Accept"}
+
+    if media_type == JSON_MEDIA_TYPE:
+        return json_response(crud.serialize_metric_series(metric, samples), headers)
+
+    encoders = {
+        MSGPACK_MEDIA_TYPE: (msgpack, encode_msgpack),
+        ARROW_MEDIA_TYPE: (pa, encode_arrow),
+    }
+    library, encode = encoders[media_type]
+    if library is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"{media_type} is not supported by this server",
+        )
+
+    content = encode(metric, job_id, metric_columns(metric, samples))
+    return Response(content, media_type=media_type, headers=headers)
@@ -1,10 +1,10 @@
 import uuid
 
-from datetime import datetime
-from typing import Annotated, Literal
+from datetime import datetime, timezone
+from typing import Annotated, Any, Literal
 from pydantic import BaseModel, Field
 
-from app.utils import MetricType
+from app.utils import JobState, MetricType
 
 version_regex = "^(0|[1-9]|10)\\.(0|[1-9]|10)\\.(0|[1-9]|10)$"
 
@@ -85,9 +85,24 @@ class JobMetadataBase(BaseModel):
     updatedAt: datetime = datetime.now()
 
 
+class JobMetadataUpdate(BaseModel):
+    description: str | None = Field(min_length=10, max_length=200, default=None)
+    currentStation: str | None = None
+    state: JobState | None = None
+    plannedRoute: list[Annotated[str, Field(min_length=3, max_length=50)]] | None = (
+        Field(min_length=1, default=None)
+    )
+    updatedAt: datetime | None = None
+
+
+# Metric values are kept as strings, they must still parse as numbers
+COUNTER_PATTERN = r"^[0-9]+$"
+VALUE_PATTERN = r"^[0-9]+(\.[0-9]+)?$"
+
+
 class BaseJobMetric(BaseModel):
     station_id: uuid.UUID
-    timestamp: datetime = datetime.now()
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class ResourceMetric(BaseJobMetric):
@@ -95,13 +110,13 @@ class ResourceMetric(BaseJobMetric):
         Literal[MetricType.cpu, MetricType.memory],
         Field(description="CPU or Memory metric type"),
     ]
-    value: str = Field(min_length=1, max_length=50)
+    value: str = Field(min_length=1, max_length=50, pattern=VALUE_PATTERN)
 
 
 class NetworkMetric(BaseJobMetric):
     metric_type: Literal[MetricType.network]
-    rx_bytes: str = Field(min_length=1, max_length=50)
-    tx_bytes: str = Field(min_length=1, max_length=50)
+    rx_bytes: str = Field(min_length=1, max_length=50, pattern=COUNTER_PATTERN)
+    tx_bytes: str = Field(min_length=1, max_length=50, pattern=COUNTER_PATTERN)
 
 
 JobMetricMetadataCreate = Annotated[
@@ -109,6 +124,31 @@ JobMetricMetadataCreate = Annotated[
 ]
 
 
+# Items of the cross-job batch carry their job id
+class JobResourceMetric(ResourceMetric):
+    job_id: uuid.UUID
+
+
+class JobNetworkMetric(NetworkMetric):
+    job_id: uuid.UUID
+
+
+JobMetricBatchItem = Annotated[
+    JobResourceMetric | JobNetworkMetric, Field(discriminator="metric_type")
+]
+
+
+class MetricBatchError(BaseModel):
+    index: int
+    detail: Any
+
+
+class MetricBatchResult(BaseModel):
+    accepted: int
+    rejected: int
+    errors: list[MetricBatchError]
+
+
 class JobMetricMetadataDelete(BaseModel):
     metric_id: uuid.UUID
     metric_type: MetricType
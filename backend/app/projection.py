@@ -0,0 +1,264 @@
+import heapq
+
+from rdflib import RDF, Graph, URIRef
+from rdflib.term import Node
+from rdflib_sqlalchemy.store import SQLAlchemy
+from sqlalchemy import and_, or_, select
+
+from app.core.database import PHT
+from app.utils import JobStateURI
+
+# * Predicates fetched for the default JSON representation of each resource.
+# * Keep these in sync with the serializers below.
+
+JOB_PREDICATES = (
+    PHT.identifier,
+    PHT.state,
+    PHT.creator,
+    PHT.currentStation,
+    PHT.trainId,
+    PHT.description,
+    PHT.createdAt,
+    PHT.updatedAt,
+)
+
+STATION_PREDICATES = (
+    PHT.identifier,
+    PHT.title,
+    PHT.stationOwner,
+    PHT.responsibleForStation,
+    PHT.description,
+    PHT.latitude,
+    PHT.longitude,
+    PHT.createdAt,
+    PHT.updatedAt,
+    PHT.hasGPUSupport,
+    PHT.totalGPUPower,
+    PHT.totalCPUCores,
+    PHT.totalRAM,
+    PHT.totalDiskSpace,
+    PHT.hasInternetConnectivity,
+    PHT.networkBandwidth,
+)
+
+TRAIN_PREDICATES = (
+    PHT.identifier,
+    PHT.title,
+    PHT.creator,
+    PHT.publisher,
+    PHT.description,
+    PHT.analysisPurpose,
+    PHT.model,
+    PHT.createdAt,
+    PHT.updatedAt,
+    PHT.version,
+)
+
+Row = dict[URIRef, Node]
+
+# (subject, updatedAt, identifier) of a subject in a sorted page
+PageKey = tuple[URIRef, str, str]
+
+
+def project_type(
+    graph: Graph, rdf_type: URIRef, predicates: tuple[URIRef, ...]
+) -> dict[URIRef, Row]:
+    """
+    Pivot the given predicates of every subject of type `rdf_type` into rows.
+
+    Instead of one `graph.value()` lookup per property per subject, the triples
+    of the typed subjects are fetched with `triples_choices` (one UNION query
+    per batch of subjects on the SQLAlchemy store) and joined on the subject,
+    so the number of store round trips no longer depends on the number of rows.
+    """
+    return project_subjects(
+        graph, list(graph.subjects(RDF.type, rdf_type, unique=True)), predicates
+    )
+
+
+def project_subject(
+    graph: Graph, subject: URIRef, predicates: tuple[URIRef, ...]
+) -> Row | None:
+    """
+    Fetch the given predicates of a single subject in one store round trip.
+    Returns None if the subject has no triples at all.
+    """
+    row: Row = {}
+    found = False
+    for predicate, obj in graph.predicate_objects(subject):
+        found = True
+        if predicate in predicates and predicate not in row:
+            row[predicate] = obj
+
+    return row if found else None
+
+
+def project_subjects(
+    graph: Graph, subjects: list[URIRef], predicates: tuple[URIRef, ...]
+) -> dict[URIRef, Row]:
+    """
+    Fetch the given predicates of a list of subjects i.e. a page in one store
+    round trip. Rows are returned in the order of `subjects`.
+    """
+    rows: dict[URIRef, Row] = {subject: {} for subject in subjects}
+    if not rows:
+        return rows
+
+    for subject, predicate, obj in graph.triples_choices((subjects, None, None)):
+        row = rows.get(subject)
+        if row is not None and predicate in predicates and predicate not in row:
+            row[predicate] = obj
+
+    return rows
+
+
+def page_subjects(
+    graph: Graph,
+    rdf_type: URIRef,
+    offset: int,
+    limit: int,
+    after: tuple[str, str] | None = None,
+) -> list[PageKey]:
+    """
+    Select one page of subjects of type `rdf_type` ordered by
+    (`pht:updatedAt`, `pht:identifier`) in DESC order.
+
+    `after` is the sort key of the last subject of the previous page (keyset
+    pagination). On the SQLAlchemy store ORDER BY/LIMIT/OFFSET run in the database,
+    other stores fall back to a bounded heap over the two sort key columns.
+    """
+    if limit <= 0:
+        return []
+
+    if isinstance(graph.store, SQLAlchemy):
+        return _page_subjects_sql(graph, rdf_type, offset, limit, after)
+
+    return _page_subjects_heap(graph, rdf_type, offset, limit, after)
+
+
+def _page_subjects_sql(
+    graph: Graph,
+    rdf_type: URIRef,
+    offset: int,
+    limit: int,
+    after: tuple[str, str] | None,
+) -> list[PageKey]:
+    store: SQLAlchemy = graph.store
+    type_table = store.tables["type_statements"]
+    updated = store.tables["literal_statements"].alias("updated")
+    identifier = store.tables["literal_statements"].alias("identifier")
+
+    query = (
+        select(type_table.c.member, updated.c.object, identifier.c.object)
+        .join(updated, updated.c.subject == type_table.c.member)
+        .join(identifier, identifier.c.subject == type_table.c.member)
+        .where(
+            type_table.c.klass == rdf_type,
+            type_table.c.context == graph.identifier,
+            updated.c.predicate == PHT.updatedAt,
+            identifier.c.predicate == PHT.identifier,
+        )
+    )
+
+    if after is not None:
+        updated_at, identifier_value = after
+        query = query.where(
+            or_(
+                updated.c.object < updated_at,
+                and_(
+                    updated.c.object == updated_at,
+                    identifier.c.object < identifier_value,
+                ),
+            )
+        )
+
+    query = (
+        query.order_by(updated.c.object.desc(), identifier.c.object.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+
+    with store.engine.connect() as connection:
+        return [
+            (URIRef(member), updated_at, identifier_value)
+            for member, updated_at, identifier_value in connection.execute(query)
+        ]
+
+
+def _page_subjects_heap(
+    graph: Graph,
+    rdf_type: URIRef,
+    offset: int,
+    limit: int,
+    after: tuple[str, str] | None,
+) -> list[PageKey]:
+    subjects = set(graph.subjects(RDF.type, rdf_type))
+    sort_keys: dict[URIRef, dict[URIRef, str]] = {}
+    for subject, predicate, obj in graph.triples_choices(
+        (None, [PHT.updatedAt, PHT.identifier], None)
+    ):
+        if subject in subjects:
+            sort_keys.setdefault(subject, {}).setdefault(predicate, str(obj))
+
+    keys = [
+        (subject, key[PHT.updatedAt], key[PHT.identifier])
+        for subject, key in sort_keys.items()
+        if len(key) == 2
+    ]
+    if after is not None:
+        keys = [key for key in keys if (key[1], key[2]) < after]
+
+    return heapq.nlargest(offset + limit, keys, key=lambda key: (key[1], key[2]))[
+        offset:
+    ]
+
+
+def serialize_job(row: Row) -> dict:
+    job_state = JobStateURI._value2member_map_[row.get(PHT.state)].name
+
+    return {
+        "identifier": str(row.get(PHT.identifier)),
+        "state": job_state,
+        "creator": str(row.get(PHT.creator)),
+        "currentStation": row.get(PHT.currentStation),
+        "trainId": str(row.get(PHT.trainId)),
+        "description": str(row.get(PHT.description)),
+        "createdAt": str(row.get(PHT.createdAt)),
+        "updatedAt": str(row.get(PHT.updatedAt)),
+    }
+
+
+def serialize_station(row: Row) -> dict:
+    return {
+        "identifier": str(row.get(PHT.identifier)),
+        "title": str(row.get(PHT.title)),
+        "stationOwner": str(row.get(PHT.stationOwner)),
+        "responsibleForStation": str(row.get(PHT.responsibleForStation)),
+        "description": str(row.get(PHT.description)),
+        "latitude": str(row.get(PHT.latitude)),
+        "longitude": str(row.get(PHT.longitude)),
+        "createdAt": str(row.get(PHT.createdAt)),
+        "updatedAt": str(row.get(PHT.updatedAt)),
+        "hasGPUSupport": bool(row.get(PHT.hasGPUSupport)),
+        "totalGPUPower": str(row.get(PHT.totalGPUPower)) or None,
+        "totalCPUCores": str(row.get(PHT.totalCPUCores)),
+        "totalRAM": str(row.get(PHT.totalRAM)),
+        "totalDiskSpace": str(row.get(PHT.totalDiskSpace)),
+        "hasInternetConnectivity": bool(row.get(PHT.hasInternetConnectivity)),
+        "networkBandwidth": str(row.get(PHT.networkBandwidth)) or None,
+    }
+
+
+def serialize_train(row: Row) -> dict:
+    return {
+        "identifier": str(row.get(PHT.identifier)),
+        "title": str(row.get(PHT.title)),
+        "creator": str(row.get(PHT.creator)),
+        "publisher": str(row.get(PHT.publisher)),
+        "description": str(row.get(PHT.description)),
+        "analysisPurpose": str(row.get(PHT.analysisPurpose)),
+        "model": str(row.get(PHT.model)),
+        "createdAt": str(row.get(PHT.createdAt)),
+        "updatedAt": str(row.get(PHT.updatedAt)),
+        "version": str(row.get(PHT.version)),
+    }
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any
+
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.sparql import Query
+
+from app.core.config import settings
+from app.core.database import PHT
+from app.core.instrumentation import CollectedCounter, Gauge, registry
+
+
+class NamedQuery:
+    """SPARQL query compiled once, with the entity types whose writes change its results."""
+
+    def __init__(self, name: str, text: str, types: tuple[URIRef, ...]):
+        self.name = name
+        self.types = types
+
+        started = time.perf_counter()
+        self.query: Query = prepareQuery(text, initNs={"pht": PHT, "rdf": RDF})
+        # Logged by the graph instead of the query text
+        self.query.name = name
+        self.parse_seconds = time.perf_counter() - started
+
+        self.executions = 0
+        self.execution_seconds_total = 0.0
+
+
+class QueryRegistry:
+    """
+    Registry of the named SPARQL queries, each is parsed and algebra-optimized
+    once when it is registered. Results can be cached, keyed by query name,
+    bindings and the generations of the query's entity types. Writes bump the
+    generation of a type, which retires every cached result that depends on
+    it, so nothing needs to be scanned. Entries also expire after a TTL, as a
+    result may be read from a lagging replica right after a bump.
+    """
+
+    def __init__(self, cache_size: int, cache_ttl: float):
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._queries: dict[str, NamedQuery] = {}
+        self._generations: Counter[URIRef] = Counter()
+        self._cache: OrderedDict[tuple, tuple[float, list]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name: str, text: str, types: tuple[URIRef, ...] = ()) -> None:
+        self._queries[name] = NamedQuery(name, text, types)
+
+    def query(
+        self,
+        graph: Graph,
+        name: str,
+        bindings: dict[str, Any] | None = None,
+        cache: bool = False,
+    ) -> list:
+        """Rows of a named query, `bindings` are the initial variable bindings."""
+        named = self._queries[name]
+        bindings = bindings or {}
+
+        key = None
+        if cache and self.cache_size > 0:
+            with self._lock:
+                key = (
+                    name,
+                    tuple(sorted(bindings.items())),
+                    tuple(self._generations[rdf_type] for rdf_type in named.types),
+                )
+                entry = self._cache.get(key)
+                if entry is not None and time.monotonic() - entry[0] < self.cache_ttl:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+
+        started = time.perf_counter()
+        rows = list(graph.query(named.query, initBindings=bindings))
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            named.executions += 1
+            named.execution_seconds_total += elapsed
+            if key is not None:
+                self._cache[key] = (time.monotonic(), rows)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return rows
+
+    def bump(self, *types: URIRef) -> None:
+        """Invalidate the cached results of queries over the given entity types."""
+        # Entries of older generations are never hit again, they age out of the LRU
+        with self._lock:
+            self._generations.update(types)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cacheSize": len(self._cache),
+                "cacheMaxSize": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "queries": {
+                    named.name: {
+                        "parseSeconds": round(named.parse_seconds, 6),
+                        "executions": named.executions,
+                        "executionSecondsTotal": round(
+                            named.execution_seconds_total, 6
+                        ),
+                    }
+                    for named in self._queries.values()
+                },
+            }
+
+
+ENTITY_TYPES = (PHT.TrainExecution, PHT.Station, PHT.Train)
+
+# Singleton instance, the queries are compiled at import, i.e. on startup
+queries = QueryRegistry(settings.SPARQL_CACHE_SIZE, settings.SPARQL_CACHE_TTL)
+
+registry.register(
+    Gauge(
+        "sparql_cache_entries",
+        "Query results in the SPARQL result cache.",
+        (),
+        lambda: {(): queries.stats()["cacheSize"]},
+    )
+)
+registry.register(
+    CollectedCounter(
+        "sparql_cache_lookups_total",
+        "Lookups of the SPARQL result cache, by result.",
+        ("result",),
+        lambda: {
+            ("hit",): queries.stats()["hits"],
+            ("miss",): queries.stats()["misses"],
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "sparql_query_executions_total",
+        "Executions of the named SPARQL queries, cache hits are not counted.",
+        ("query",),
+        lambda: {
+            (name,): stats["executions"]
+            for name, stats in queries.stats()["queries"].items()
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "sparql_query_execution_seconds_total",
+        "Time spent executing the named SPARQL queries.",
+        ("query",),
+        lambda: {
+            (name,): stats["executionSecondsTotal"]
+            for name, stats in queries.stats()["queries"].items()
+        },
+    )
+)
+registry.register(
+    Gauge(
+        "sparql_query_parse_seconds",
+        "Time the named SPARQL queries took to parse and optimize on registration.",
+        ("query",),
+        lambda: {
+            (name,): stats["parseSeconds"]
+            for name, stats in queries.stats()["queries"].items()
+        },
+    )
+)
+
+# Number of subjects of type (?type)
+queries.register(
+    "subject_count",
+    """
+    SELECT (COUNT(DISTINCT ?sub) AS ?count)
+    WHERE {
+        ?sub a ?type .
+    }
+    """,
+    types=ENTITY_TYPES,
+)
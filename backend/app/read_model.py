@@ -0,0 +1,874 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from fastapi import Response
+from rdflib import Graph, Literal, URIRef
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+)
+from sqlalchemy.engine import Engine
+
+from app import crud
+from app.core.config import settings
+from app.core.database import PHT, database
+from app.core.executor import run_read
+from app.core.instrumentation import CollectedCounter, Gauge, registry
+from app.core.logger import logger
+from app.projection import (
+    JOB_PREDICATES,
+    STATION_PREDICATES,
+    TRAIN_PREDICATES,
+    PageKey,
+    Row,
+    page_subjects,
+    project_subject,
+    project_subjects,
+    project_type,
+    serialize_job,
+    serialize_station,
+    serialize_train,
+)
+from app.queries import queries
+from app.utils import JobStateURI
+
+metadata = MetaData()
+
+# * Subjects written by any worker process, in write order. Every process replays
+# * the entries it has not seen yet before serving a read, so a read on one worker
+# * reflects a write that finished on another one.
+read_model_changes = Table(
+    "read_model_changes",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("entity", String(16), nullable=False),
+    Column("subject", String(255), nullable=False),
+)
+
+# Seconds a skipped change id is looked for again. Ids are allocated when a
+# change is inserted but become visible on commit, a lower id can show up
+# after a higher one. Ids of rolled back inserts never show up.
+CHANGE_GAP_TIMEOUT = 60
+
+
+class Record(ABC):
+    """Compact, serialized view of one resource. Subclasses name the fields."""
+
+    __slots__ = ("subject", "sort_key", "etag")
+    fields: tuple[str, ...] = ()
+
+    def __init__(self, subject: URIRef, row: Row):
+        self.subject = subject
+        # Mirrors the sort key of `page_subjects`, None if a key is missing
+        updated_at, identifier = row.get(PHT.updatedAt), row.get(PHT.identifier)
+        self.sort_key = (
+            (str(updated_at), str(identifier), subject)
+            if updated_at is not None and identifier is not None
+            else None
+        )
+
+        for field, value in self.serialize(row).items():
+            setattr(self, field, value)
+
+        # Digest of the serialized record, records are never changed in place
+        content = json.dumps([subject, self.to_dict()], sort_keys=True, default=str)
+        self.etag = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+    @abstractmethod
+    def serialize(self, row: Row) -> dict: ...
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.fields}
+
+
+class StationRecord(Record):
+    fields = (
+        "identifier",
+        "title",
+        "stationOwner",
+        "responsibleForStation",
+        "description",
+        "latitude",
+        "longitude",
+        "createdAt",
+        "updatedAt",
+        "hasGPUSupport",
+        "totalGPUPower",
+        "totalCPUCores",
+        "totalRAM",
+        "totalDiskSpace",
+        "hasInternetConnectivity",
+        "networkBandwidth",
+    )
+    __slots__ = fields
+
+    def serialize(self, row: Row) -> dict:
+        return serialize_station(row)
+
+
+class TrainRecord(Record):
+    fields = (
+        "identifier",
+        "title",
+        "creator",
+        "publisher",
+        "description",
+        "analysisPurpose",
+        "model",
+        "createdAt",
+        "updatedAt",
+        "version",
+    )
+    __slots__ = fields
+
+    def serialize(self, row: Row) -> dict:
+        return serialize_train(row)
+
+
+class JobRecord(Record):
+    # `currentStation` holds the station URI, its name is resolved on read
+    fields = (
+        "identifier",
+        "state",
+        "creator",
+        "currentStation",
+        "trainId",
+        "description",
+        "createdAt",
+        "updatedAt",
+    )
+    __slots__ = fields
+
+    def serialize(self, row: Row) -> dict:
+        return serialize_job(row)
+
+
+class EntityCache:
+    """
+    Write-through cache of the records of one resource type.
+
+    Records are kept in LRU order and evicted past `max_entries`. As long as no
+    record was evicted the cache holds every resource of its type, so pages and
+    missing ids are answered from memory. Afterwards pages are selected in the
+    store and only their records come from memory.
+    """
+
+    def __init__(
+        self,
+        model: "ReadModel",
+        name: str,
+        rdf_type: URIRef,
+        predicates: tuple[URIRef, ...],
+        record_cls: type[Record],
+        max_entries: int,
+    ):
+        self.model = model
+        self.name = name
+        self.rdf_type = rdf_type
+        self.predicates = predicates
+        self.record_cls = record_cls
+        self.max_entries = max_entries
+        self.complete = False
+
+        self._records: OrderedDict[URIRef, Record] = OrderedDict()
+        # Sort keys of the cached records in ASC order
+        self._order: list[tuple[str, str, URIRef]] = []
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, graph: Graph, subject: URIRef) -> Record | None:
+        return self.get_many(graph, [subject]).get(subject)
+
+    def get_many(self, graph: Graph, subjects: list[URIRef]) -> dict[URIRef, Record]:
+        """Records of `subjects` in the given order, unknown subjects are left out."""
+        self.model.sync(graph)
+
+        with self.model.lock:
+            records = {
+                subject: self._records[subject]
+                for subject in subjects
+                if subject in self._records
+            }
+            for subject in records:
+                self._records.move_to_end(subject)
+
+            missing = [subject for subject in subjects if subject not in records]
+            self.hits += len(records)
+            if self.complete:
+                # A complete cache knows every resource, the rest does not exist
+                self.hits += len(missing)
+                missing = []
+            else:
+                self.misses += len(missing)
+
+        if missing:
+            rows = project_subjects(graph, missing, self.predicates)
+            for subject, row in rows.items():
+                if row:
+                    records[subject] = self.put(subject, row)
+
+        return {subject: records[subject] for subject in subjects if subject in records}
+
+    def page(
+        self,
+        graph: Graph,
+        rdf_type: URIRef,
+        offset: int,
+        limit: int,
+        after: tuple[str, str] | None = None,
+    ) -> list[PageKey]:
+        """Same contract as `page_subjects`, served from memory when complete."""
+        self.model.sync(graph)
+
+        with self.model.lock:
+            if self.complete and limit > 0:
+                end = len(self._order)
+                if after is not None:
+                    end = bisect.bisect_left(self._order, after)
+
+                start = max(end - offset - limit, 0)
+                keys = self._order[start : max(end - offset, 0)]
+                return [
+                    (subject, updated_at, identifier)
+                    for updated_at, identifier, subject in reversed(keys)
+                ]
+
+        return page_subjects(graph, rdf_type, offset, limit, after)
+
+    def refresh(self, graph: Graph, subject: URIRef) -> Record | None:
+        """Re-read one resource from the graph, i.e. after it was written."""
+        row = project_subject(graph, subject, self.predicates)
+        if row is None:
+            self.discard(subject)
+            return None
+
+        return self.put(subject, row)
+
+    def put(self, subject: URIRef, row: Row) -> Record:
+        record = self.record_cls(subject, row)
+
+        with self.model.lock:
+            self._remove(subject)
+            self._records[subject] = record
+            if record.sort_key is not None:
+                bisect.insort(self._order, record.sort_key)
+
+            while len(self._records) > self.max_entries:
+                evicted, _ = self._records.popitem(last=False)
+                self._remove(evicted)
+                self.evictions += 1
+                self.complete = False
+
+        return record
+
+    def discard(self, subject: URIRef) -> None:
+        with self.model.lock:
+            self._remove(subject)
+
+    def load(self, graph: Graph) -> None:
+        """
+        Replace the records by the resources in the graph. The new records are
+        indexed aside and swapped in at once, reads meanwhile use the old ones.
+        """
+        rows = project_type(graph, self.rdf_type, self.predicates)
+        index = self._index(rows)
+
+        with self.model.lock:
+            self._swap(index)
+
+    def _index(self, rows: dict[URIRef, Row]) -> dict[str, Any]:
+        records = OrderedDict(
+            (subject, self.record_cls(subject, row)) for subject, row in rows.items()
+        )
+        evicted = max(len(records) - self.max_entries, 0)
+        for _ in range(evicted):
+            records.popitem(last=False)
+
+        return {
+            "records": records,
+            "order": sorted(
+                record.sort_key
+                for record in records.values()
+                if record.sort_key is not None
+            ),
+            "evicted": evicted,
+        }
+
+    def _swap(self, index: dict[str, Any]) -> None:
+        self._records = index["records"]
+        self._order = index["order"]
+        self.complete = not index["evicted"]
+        self.evictions += index["evicted"]
+
+    def _remove(self, subject: URIRef) -> None:
+        record = self._records.pop(subject, None)
+        if record is not None and record.sort_key is not None:
+            index = bisect.bisect_left(self._order, record.sort_key)
+            if index < len(self._order) and self._order[index] == record.sort_key:
+                del self._order[index]
+
+    def stats(self) -> dict:
+        with self.model.lock:
+            return {
+                "entries": len(self._records),
+                "maxEntries": self.max_entries,
+                "complete": self.complete,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# (state, createdAt, updatedAt) of a job, timestamps are naive UTC
+JobEntry = tuple[str | None, datetime | None, datetime | None]
+
+# Position of the indexed timestamps in `JobEntry`
+TIMESTAMP_POSITIONS = {"createdAt": 1, "updatedAt": 2}
+
+HISTOGRAM_CACHE_SIZE = 10000
+
+
+def to_naive_utc(timestamp: datetime) -> datetime:
+    """Naive UTC timestamp, naive input is taken as UTC already."""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def job_entry(row: Row) -> JobEntry:
+    timestamps = []
+    for predicate in (PHT.createdAt, PHT.updatedAt):
+        value = row.get(predicate)
+        value = value.toPython() if isinstance(value, Literal) else None
+        timestamps.append(to_naive_utc(value) if isinstance(value, datetime) else None)
+
+    state = JobStateURI._value2member_map_.get(row.get(PHT.state))
+    return (state.name if state else None, *timestamps)
+
+
+def bucket_start(timestamp: datetime, bucket: timedelta) -> datetime:
+    return datetime.min + (timestamp - datetime.min) // bucket * bucket
+
+
+class JobCache(EntityCache):
+    """
+    Job cache that also counts jobs per state and indexes their creation and last
+    transition timestamps. The entry of every job is kept apart from the records,
+    so evicting a record never skews the counters or the indexes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.state_counts: Counter[str] = Counter()
+        self._entries: dict[URIRef, JobEntry] = {}
+        # Sorted (timestamp, subject) indexes, by timestamp predicate name
+        self._indexes: dict[str, list[tuple[datetime, URIRef]]] = {
+            name: [] for name in TIMESTAMP_POSITIONS
+        }
+        # Per-state counts of histogram buckets, keyed by (index, bucket, start)
+        self._buckets: OrderedDict[tuple[str, timedelta, datetime], Counter[str]] = (
+            OrderedDict()
+        )
+        self._bucket_sizes: set[timedelta] = set()
+        # Bumped on every entry change, see `reconcile`
+        self._entries_version = 0
+
+    def put(self, subject: URIRef, row: Row) -> Record:
+        record = super().put(subject, row)
+        with self.model.lock:
+            self._set_entry(subject, job_entry(row))
+        return record
+
+    def discard(self, subject: URIRef) -> None:
+        super().discard(subject)
+        with self.model.lock:
+            self._set_entry(subject, None)
+
+    def _index(self, rows: dict[URIRef, Row]) -> dict[str, Any]:
+        # Entries are kept for every job, including those of evicted records
+        entries = {subject: job_entry(row) for subject, row in rows.items()}
+        return {
+            **super()._index(rows),
+            "entries": entries,
+            "state_counts": Counter(
+                entry[0] for entry in entries.values() if entry[0] is not None
+            ),
+            "indexes": {
+                by: sorted(
+                    (entry[position], subject)
+                    for subject, entry in entries.items()
+                    if entry[position] is not None
+                )
+                for by, position in TIMESTAMP_POSITIONS.items()
+            },
+        }
+
+    def _swap(self, index: dict[str, Any]) -> None:
+        super()._swap(index)
+        self._entries = index["entries"]
+        self.state_counts = index["state_counts"]
+        self._indexes = index["indexes"]
+        self._buckets.clear()
+        self._entries_version += 1
+
+    def summary(
+        self,
+        graph: Graph,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        by: str = "updatedAt",
+    ) -> Counter[str]:
+        """
+        Job count per state. Jobs can be limited to a time window on their
+        creation (`createdAt`) or last transition (`updatedAt`) timestamp.
+        """
+        self.model.sync(graph)
+        with self.model.lock:
+            if since is None and until is None:
+                return self.state_counts.copy()
+
+            index = self._indexes[by]
+            start = 0 if since is None else bisect.bisect_left(index, (since,))
+            end = (
+                len(index)
+                if until is None
+                else bisect.bisect_right(index, until, key=lambda item: item[0])
+            )
+            return Counter(
+                self._entries[subject][0]
+                for _, subject in index[start:end]
+                if self._entries[subject][0] is not None
+            )
+
+    def histogram(
+        self,
+        graph: Graph,
+        since: datetime,
+        until: datetime,
+        bucket: timedelta,
+        by: str = "updatedAt",
+    ) -> list[tuple[datetime, Counter[str]]]:
+        """
+        Job count per state for each bucket between `since` and `until`.
+        Buckets are aligned to multiples of `bucket`, computed once and cached
+        until a job in the bucket changes.
+        """
+        self.model.sync(graph)
+        with self.model.lock:
+            index = self._indexes[by]
+            self._bucket_sizes.add(bucket)
+            histogram = []
+            start = bucket_start(since, bucket)
+            while start <= until:
+                key = (by, bucket, start)
+                counts = self._buckets.get(key)
+                if counts is None:
+                    window = index[
+                        bisect.bisect_left(index, (start,)) : bisect.bisect_left(
+                            index, (start + bucket,)
+                        )
+                    ]
+                    counts = Counter(
+                        self._entries[subject][0]
+                        for _, subject in window
+                        if self._entries[subject][0] is not None
+                    )
+                    self._buckets[key] = counts
+                    if len(self._buckets) > HISTOGRAM_CACHE_SIZE:
+                        self._buckets.popitem(last=False)
+
+                histogram.append((start, counts))
+                start += bucket
+
+            return histogram
+
+    def reconcile(self, graph: Graph) -> int:
+        """
+        Correct the counters and indexes against the graph. Returns the number
+        of corrected jobs. Skipped if a job changed while the graph was read,
+        the next run picks it up.
+        """
+        with self.model.lock:
+            version = self._entries_version
+
+        entries = {
+            subject: job_entry(row)
+            for subject, row in project_type(
+                graph, self.rdf_type, (PHT.state, PHT.createdAt, PHT.updatedAt)
+            ).items()
+        }
+
+        with self.model.lock:
+            if version != self._entries_version:
+                return 0
+
+            drifted = {
+                subject
+                for subject in entries.keys() | self._entries.keys()
+                if entries.get(subject) != self._entries.get(subject)
+            }
+            for subject in drifted:
+                self._set_entry(subject, entries.get(subject))
+            stale = [subject for subject in drifted if subject in self._records]
+
+        # Cached records of drifted jobs are stale as well
+        for subject in stale:
+            self.refresh(graph, subject)
+
+        return len(drifted)
+
+    def _set_entry(self, subject: URIRef, entry: JobEntry | None) -> None:
+        previous = self._entries.pop(subject, None)
+        if previous == entry:
+            if entry is not None:
+                self._entries[subject] = entry
+            return
+
+        for job, change in ((previous, -1), (entry, 1)):
+            if job is None:
+                continue
+
+            state = job[0]
+            if state is not None:
+                self.state_counts[state] += change
+                if self.state_counts[state] <= 0:
+                    del self.state_counts[state]
+
+            for by, index in self._indexes.items():
+                timestamp = job[TIMESTAMP_POSITIONS[by]]
+                if timestamp is None:
+                    continue
+
+                if change > 0:
+                    bisect.insort(index, (timestamp, subject))
+                else:
+                    position = bisect.bisect_left(index, (timestamp, subject))
+                    if position < len(index) and index[position][1] == subject:
+                        del index[position]
+
+                # The buckets this job was or is now counted in are outdated
+                for bucket in self._bucket_sizes:
+                    self._buckets.pop(
+                        (by, bucket, bucket_start(timestamp, bucket)), None
+                    )
+
+        if entry is not None:
+            self._entries[subject] = entry
+        self._entries_version += 1
+
+
+class SyncScope:
+    """Whether the change log was replayed for the current request."""
+
+    __slots__ = ("synced",)
+
+    def __init__(self):
+        self.synced = False
+
+
+# Scope of the request being handled. It is shared with the executor threads of
+# the request, which run in a copy of its context
+sync_scope: ContextVar[SyncScope | None] = ContextVar(
+    "read_model_sync_scope", default=None
+)
+
+
+class ReadModel:
+    """
+    In-memory read model of jobs, stations and trains for the default JSON
+    representation. Write handlers call `changed` once their graph write is done,
+    which refreshes the local record and appends the subject to the change log
+    that the other worker processes replay on their next read, once per request.
+    """
+
+    def __init__(
+        self, max_entries: int, changelog_size: int, engine: Engine | None = None
+    ):
+        self._engine = engine
+        self.changelog_size = changelog_size
+        self.lock = threading.RLock()
+        self.last_change_id = 0
+        # Changes of this process, already applied when they were written
+        self._own_change_ids: set[int] = set()
+        # Skipped change ids below `last_change_id`, by the time they were missed
+        self._gaps: dict[int, float] = {}
+
+        self.jobs = JobCache(
+            self, "job", PHT.TrainExecution, JOB_PREDICATES, JobRecord, max_entries
+        )
+        self.stations = EntityCache(
+            self, "station", PHT.Station, STATION_PREDICATES, StationRecord, max_entries
+        )
+        self.trains = EntityCache(
+            self, "train", PHT.Train, TRAIN_PREDICATES, TrainRecord, max_entries
+        )
+        self.caches = {
+            cache.name: cache for cache in (self.jobs, self.stations, self.trains)
+        }
+
+    @property
+    def engine(self) -> Engine:
+        """The given engine, else the shared engine of the worker process."""
+        return self._engine or database.engine
+
+    def create_all(self) -> None:
+        metadata.create_all(self.engine)
+
+    def rebuild(self, graph: Graph) -> None:
+        logger.info("Building the read model")
+
+        # Read the change log position first, changes made while loading are
+        # replayed on the next sync. Replaying is idempotent.
+        with self.engine.connect() as connection:
+            last_change_id = (
+                connection.execute(select(func.max(read_model_changes.c.id))).scalar()
+                or 0
+            )
+            # Ids below the position that are not committed yet
+            recent_ids = connection.execute(
+                select(read_model_changes.c.id).where(
+                    read_model_changes.c.id > last_change_id - self.changelog_size
+                )
+            ).scalars()
+            gaps = set(
+                range(max(last_change_id - self.changelog_size, 0) + 1, last_change_id)
+            ).difference(recent_ids)
+
+        for cache in self.caches.values():
+            cache.load(graph)
+        queries.bump(*(cache.rdf_type for cache in self.caches.values()))
+
+        with self.lock:
+            self.last_change_id = last_change_id
+            self._own_change_ids.clear()
+            self._gaps = dict.fromkeys(gaps, time.monotonic())
+
+    def begin_request(self) -> None:
+        """Replay the change log at most once for the current request."""
+        sync_scope.set(SyncScope())
+
+    def changed(self, graph: Graph, cache: EntityCache, subject: URIRef) -> None:
+        with self.engine.begin() as connection:
+            change_id = connection.execute(
+                insert(read_model_changes).values(
+                    entity=cache.name, subject=str(subject)
+                )
+            ).inserted_primary_key[0]
+            connection.execute(
+                delete(read_model_changes).where(
+                    read_model_changes.c.id <= change_id - self.changelog_size
+                )
+            )
+
+        with self.lock:
+            self._own_change_ids.add(change_id)
+
+        cache.refresh(graph, subject)
+        queries.bump(cache.rdf_type)
+
+    def sync(self, graph: Graph) -> None:
+        """
+        Replay the changes of other worker processes since the last sync, and
+        those of skipped ids that were committed since. Within a request
+        started by `begin_request` only the first call replays.
+        """
+        scope = sync_scope.get()
+        if scope is not None and scope.synced:
+            return
+
+        self._sync(graph)
+        if scope is not None:
+            scope.synced = True
+
+    def _sync(self, graph: Graph) -> None:
+        with self.lock:
+            last_change_id = self.last_change_id
+            gaps = list(self._gaps)
+
+        clause = read_model_changes.c.id > last_change_id
+        if gaps:
+            clause = or_(clause, read_model_changes.c.id.in_(gaps))
+
+        with self.engine.connect() as connection:
+            changes = connection.execute(
+                select(
+                    read_model_changes.c.id,
+                    read_model_changes.c.entity,
+                    read_model_changes.c.subject,
+                )
+                .where(clause)
+                .order_by(read_model_changes.c.id)
+            ).all()
+
+        new_ids = [change.id for change in changes if change.id > last_change_id]
+        # The change log was trimmed past our position, changes may be lost
+        if new_ids and new_ids[0] > last_change_id + self.changelog_size:
+            self.rebuild(graph)
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            for change in changes:
+                self._gaps.pop(change.id, None)
+            if new_ids:
+                skipped = set(range(last_change_id + 1, new_ids[-1]))
+                for change_id in skipped.difference(new_ids):
+                    self._gaps.setdefault(change_id, now)
+            self._gaps = {
+                change_id: missed_at
+                for change_id, missed_at in self._gaps.items()
+                if now - missed_at < CHANGE_GAP_TIMEOUT
+            }
+
+            changed = {
+                (change.entity, change.subject)
+                for change in changes
+                if change.id not in self._own_change_ids
+            }
+            self._own_change_ids.difference_update(change.id for change in changes)
+
+        for entity, subject in changed:
+            self.caches[entity].refresh(graph, URIRef(subject))
+        queries.bump(*{self.caches[entity].rdf_type for entity, _ in changed})
+
+        if new_ids:
+            with self.lock:
+                self.last_change_id = max(self.last_change_id, new_ids[-1])
+
+    def job_stations(
+        self, graph: Graph, records: list[JobRecord]
+    ) -> dict[URIRef, StationRecord]:
+        """Records of the current stations of the given jobs."""
+        return self.stations.get_many(
+            graph,
+            list(
+                {
+                    record.currentStation: None
+                    for record in records
+                    if record.currentStation is not None
+                }
+            ),
+        )
+
+    def job_dicts(self, graph: Graph, records: list[JobRecord]) -> list[dict]:
+        """Serialize job records, station names are resolved from the cache."""
+        stations = self.job_stations(graph, records)
+
+        job_dicts = []
+        for record in records:
+            station = stations.get(record.currentStation)
+            job_dicts.append(
+                {
+                    **record.to_dict(),
+                    "currentStation": {
+                        "uri": record.currentStation,
+                        "name": station.title if station else None,
+                    },
+                }
+            )
+
+        return job_dicts
+
+    def page(
+        self,
+        cache: EntityCache,
+        graph: Graph,
+        response: Response,
+        offset: int,
+        limit: int,
+        cursor: str | None = None,
+    ) -> list[Any]:
+        subjects = crud.get_resource_page(
+            graph,
+            response,
+            cache.rdf_type,
+            offset,
+            limit,
+            cursor,
+            pager=cache.page,
+        )
+        return list(cache.get_many(graph, subjects).values())
+
+    def stats(self) -> dict:
+        return {name: cache.stats() for name, cache in self.caches.items()}
+
+
+# Singleton instance
+read_model = ReadModel(
+    max_entries=settings.READ_MODEL_MAX_ENTRIES,
+    changelog_size=settings.READ_MODEL_CHANGELOG_SIZE,
+)
+
+registry.register(
+    Gauge(
+        "read_model_entries",
+        "Records held by the read model caches.",
+        ("cache",),
+        lambda: {
+            (name,): stats["entries"] for name, stats in read_model.stats().items()
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "read_model_lookups_total",
+        "Record lookups of the read model caches, by result.",
+        ("cache", "result"),
+        lambda: {
+            (name, result): stats[key]
+            for name, stats in read_model.stats().items()
+            for result, key in (("hit", "hits"), ("miss", "misses"))
+        },
+    )
+)
+registry.register(
+    CollectedCounter(
+        "read_model_evictions_total",
+        "Records evicted from the read model caches.",
+        ("cache",),
+        lambda: {
+            (name,): stats["evictions"] for name, stats in read_model.stats().items()
+        },
+    )
+)
+
+
+async def read_model_scope() -> None:
+    """Router dependency, the request replays the change log only once."""
+    read_model.begin_request()
+
+
+async def reconcile_job_counts(graph: Graph, interval: float) -> None:
+    """Periodically correct the job state counters against the graph."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            drifted = await run_read(read_model.jobs.reconcile, graph)
+            if drifted:
+                logger.warning(f"Corrected the state counters of {drifted} jobs")
+        except Exception as error:
+            logger.error(f"Reconciling the job state counters failed: {error}")
@@ -0,0 +1,21 @@
+from collections.abc import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.routes.auth import UserInfo, get_introspected_user_info, get_user_info
+from app.main import app
+
+
+async def get_test_user_info() -> UserInfo:
+    return UserInfo(preferred_username="tester")
+
+
+# Session wide, the shutdown of the app also shuts its graph executors down
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    app.dependency_overrides[get_user_info] = get_test_user_info
+    app.dependency_overrides[get_introspected_user_info] = get_test_user_info
+    with TestClient(app) as client:
+        yield client
+    app.dependency_overrides.clear()
@@ -0,0 +1,211 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from app.core.metric_store import metric_store
+from app.crud import NEXT_CURSOR_HEADER
+
+STATION_ID = "5c1d2e3f-4a5b-4c6d-8e7f-9a0b1c2d3e4f"
+
+
+def create_job(client: TestClient, **fields) -> str:
+    job_id = str(uuid.uuid4())
+    response = client.post(
+        "/jobs/",
+        json={
+            "identifier": job_id,
+            "description": "a job of the API tests",
+            "trainId": "train1",
+            "currentStation": STATION_ID,
+            "creator": "tester",
+            "plannedRoute": [STATION_ID],
+            **fields,
+        },
+    )
+    assert response.status_code == 201
+    return job_id
+
+
+def test_cursor_pagination(client: TestClient):
+    # Updated after every other job of the tests, they come first
+    job_ids = [
+        create_job(client, updatedAt=f"2099-01-0{day}T00:00:00") for day in range(1, 6)
+    ]
+
+    pages = []
+    cursor = None
+    while len(pages) < 3:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = client.get("/jobs/", params=params)
+        assert response.status_code == 200
+        pages.append([job["identifier"] for job in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if len(pages) < 3:
+            assert cursor is not None
+
+    # Jobs of other tests may follow on the last page
+    assert [len(page) for page in pages[:2]] == [2, 2]
+    assert [job_id for page in pages for job_id in page][:5] == job_ids[::-1]
+
+
+def test_invalid_cursor(client: TestClient):
+    response = client.get("/jobs/", params={"cursor": "%%%"})
+
+    assert response.status_code == 400
+
+
+def test_conditional_get(client: TestClient):
+    job_id = create_job(client)
+    response = client.get(f"/jobs/{job_id}")
+    etag = response.headers["etag"]
+
+    not_modified = client.get(f"/jobs/{job_id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.content == b""
+
+    since = response.headers["last-modified"]
+    not_modified = client.get(f"/jobs/{job_id}", headers={"If-Modified-Since": since})
+    assert not_modified.status_code == 304
+
+    # If-None-Match takes precedence over If-Modified-Since
+    mismatch = client.get(
+        f"/jobs/{job_id}",
+        headers={"If-None-Match": '"other"', "If-Modified-Since": since},
+    )
+    assert mismatch.status_code == 200
+
+
+def test_conditional_get_after_update(client: TestClient):
+    job_id = create_job(client)
+    etag = client.get(f"/jobs/{job_id}").headers["etag"]
+
+    response = client.put(f"/jobs/{job_id}/status", params={"state": "running"})
+    assert response.status_code == 204
+
+    response = client.get(f"/jobs/{job_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["state"] == "running"
+
+
+def test_metric_batch_item_errors(client: TestClient):
+    job_id = create_job(client)
+    items = [
+        {"station_id": STATION_ID, "metric_type": "cpu", "value": "1"},
+        {
+            "station_id": STATION_ID,
+            "metric_type": "network",
+            "rx_bytes": "1",
+            "tx_bytes": "2",
+        },
+        {"station_id": STATION_ID, "metric_type": "cpu"},
+    ]
+
+    response = client.post(f"/jobs/{job_id}/metrics:batch", json=items)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (2, 1)
+    assert [error["index"] for error in result["errors"]] == [2]
+    metrics = client.get(f"/jobs/{job_id}/metrics", params={"metric": "cpu"}).json()
+    assert len(metrics["metrics"]) == 1
+
+
+def test_metric_batch_rejects_non_numeric_values(client: TestClient):
+    job_id = create_job(client)
+    items = [
+        {"station_id": STATION_ID, "metric_type": "cpu", "value": "1.5"},
+        {
+            "station_id": STATION_ID,
+            "metric_type": "network",
+            "rx_bytes": "n/a",
+            "tx_bytes": "2",
+        },
+        {"station_id": STATION_ID, "metric_type": "memory", "value": "-1"},
+    ]
+
+    response = client.post(f"/jobs/{job_id}/metrics:batch", json=items)
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (1, 2)
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+    response = client.get(f"/jobs/{job_id}/metrics", params={"metric": "network"})
+    assert response.status_code == 200
+    assert response.json()["metrics"] == []
+
+
+def test_stored_non_numeric_counters_are_served(client: TestClient):
+    job_id = create_job(client)
+    # Stored before the counters were validated
+    metric_store.append(
+        job_id,
+        "network",
+        STATION_ID,
+        datetime.now(timezone.utc),
+        rx_bytes="n/a",
+        tx_bytes="2",
+    )
+
+    response = client.get(f"/jobs/{job_id}/metrics", params={"metric": "network"})
+
+    assert response.status_code == 200
+    [metric] = response.json()["metrics"]
+    assert (metric["rxBytes"], metric["txBytes"]) == (None, 2)
+
+
+def test_aggregate_skips_non_numeric_counters(client: TestClient):
+    job_id = create_job(client)
+    now = datetime.now(timezone.utc)
+    for minutes, rx_bytes in ((3, "100"), (2, "n/a"), (1, "700")):
+        metric_store.append(
+            job_id,
+            "network",
+            STATION_ID,
+            now - timedelta(minutes=minutes),
+            rx_bytes=rx_bytes,
+            tx_bytes="0",
+        )
+
+    response = client.get(
+        f"/jobs/{job_id}/metrics/aggregate", params={"metric": "network"}
+    )
+
+    assert response.status_code == 200
+    # One rate between the two numeric samples
+    [bucket] = response.json()["buckets"]
+    assert bucket["rxRate"] == 5.0
+
+
+def test_ndjson_metric_batch_item_errors(client: TestClient):
+    job_id = create_job(client)
+    unknown_job_id = str(uuid.uuid4())
+    item = {"station_id": STATION_ID, "metric_type": "memory", "value": "1"}
+    lines = [
+        json.dumps({**item, "job_id": job_id}),
+        json.dumps({**item, "job_id": unknown_job_id}),
+        "{not json",
+    ]
+
+    response = client.post(
+        "/metrics:batch",
+        content="\n".join(lines),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (1, 2)
+    assert [error["index"] for error in result["errors"]] == [1, 2]
+    assert result["errors"][1]["detail"] == "Invalid JSON"
+
+
+def test_metric_batch_of_unknown_job(client: TestClient):
+    item = {"station_id": STATION_ID, "metric_type": "cpu", "value": "1"}
+
+    response = client.post(f"/jobs/{uuid.uuid4()}/metrics:batch", json=[item])
+
+    assert response.status_code == 404
@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+# Settings are read on import, the tests run on a throwaway SQLite graph store
+os.environ.setdefault("PROJECT_NAME", "PADME Monitoring")
+os.environ.setdefault("DOMAIN", "monitoring.example.org")
+os.environ.setdefault("FRONTEND_HOST", "http://localhost:5173")
+os.environ.setdefault("GRAPH_STORE", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "test.db"))
+os.environ.setdefault("KEYCLOAK_SERVER_URL", "http://localhost:8080/")
+os.environ.setdefault("KEYCLOAK_REALM", "pht")
+os.environ.setdefault("KEYCLOAK_CLIENT_ID", "monitoring")
+os.environ.setdefault("KEYCLOAK_CLIENT_SECRET", "secret")
+
+
+@pytest.fixture
+def engine():
+    """In-memory SQLite engine, one connection shared by every thread."""
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    yield engine
+    engine.dispose()
@@ -0,0 +1,36 @@
+import asyncio
+
+from app.core.broadcast import BroadcastHub
+
+JOB_ID = "0b7f3f4e-1d3c-4c2b-9f0e-5d6a7b8c9d0e"
+
+
+def test_sequence_is_kept_while_topic_has_subscribers():
+    async def scenario():
+        hub = BroadcastHub("metrics")
+        # Nobody listens, nothing is numbered
+        assert hub.next_sequence(JOB_ID) == 0
+
+        async with hub.subscribe(JOB_ID):
+            async with hub.subscribe(JOB_ID):
+                assert [hub.next_sequence(JOB_ID) for _ in range(2)] == [1, 2]
+            assert hub.next_sequence(JOB_ID) == 3
+            assert hub.sequence(JOB_ID) == 3
+
+        # The state of the topic left with its last subscriber
+        assert hub.sequence(JOB_ID) == 0
+        assert not hub._sequences and not hub._topic_subscribers
+
+    asyncio.run(scenario())
+
+
+def test_sequences_are_per_topic():
+    async def scenario():
+        hub = BroadcastHub("metrics")
+        async with hub.subscribe(JOB_ID), hub.subscribe("other"), hub.subscribe():
+            hub.next_sequence(JOB_ID)
+            hub.next_sequence(JOB_ID)
+
+            assert (hub.sequence(JOB_ID), hub.next_sequence("other")) == (2, 1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from rdflib import Literal, URIRef
+
+from app.core.instrumentation import (
+    CollectedCounter,
+    InstrumentedGraph,
+    MetricsMiddleware,
+    graph_call_duration,
+    http_request_duration,
+    registry,
+    worker_index,
+)
+from app.queries import queries
+
+
+def recorded_routes() -> set[str]:
+    return {labels[1] for labels in http_request_duration._counts}
+
+
+def test_route_label_has_router_prefix():
+    router = APIRouter()
+
+    @router.get("/")
+    async def list_items():
+        return []
+
+    @router.get("/{item_id}/status")
+    async def item_status(item_id: str):
+        return item_id
+
+    app = FastAPI()
+    app.include_router(router, prefix="/items")
+    app.include_router(router, prefix="/things")
+    app.add_middleware(MetricsMiddleware)
+
+    with TestClient(app) as client:
+        client.get("/items/")
+        client.get("/things/42/status")
+        client.get("/nowhere/42")
+
+    assert {"/items/", "/things/{item_id}/status", "unmatched"} <= recorded_routes()
+    assert "/42/status" not in recorded_routes()
+
+
+def test_worker_index_is_stable():
+    assert worker_index() == worker_index()
+
+
+def test_query_evaluates_select_rows():
+    graph = InstrumentedGraph()
+    triple = (URIRef("urn:a"), URIRef("urn:p"), Literal(1))
+    graph.add(triple)
+    queries_before = sum(graph_call_duration._counts.get(("query",), []))
+
+    result = graph.query("SELECT ?s WHERE { ?s ?p ?o }")
+    # Rows evaluated by the timed call, not on the iteration of the caller
+    graph.remove(triple)
+
+    assert [row.s for row in result] == [URIRef("urn:a")]
+    assert sum(graph_call_duration._counts[("query",)]) == queries_before + 1
+
+
+def test_collected_counter_is_read_at_scrape_time():
+    completed = {"read": 1}
+    counter = CollectedCounter(
+        "calls_total",
+        "Calls.",
+        ("executor",),
+        lambda: {(name,): value for name, value in completed.items()},
+    )
+    completed["read"] = 2
+
+    lines = list(counter.expose())
+
+    assert lines[1] == "# TYPE calls_total counter"
+    assert lines[2] == f'calls_total{{executor="read",worker="{worker_index()}"}} 2'
+
+
+def test_query_parse_seconds_are_exported():
+    metrics = registry.render()
+
+    for name in queries.stats()["queries"]:
+        assert f'sparql_query_parse_seconds{{query="{name}"' in metrics
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+from app.core.metric_store import MetricStore, job_metrics
+
+JOB_ID = "0b7f3f4e-1d3c-4c2b-9f0e-5d6a7b8c9d0e"
+STATION_ID = "5c1d2e3f-4a5b-4c6d-8e7f-9a0b1c2d3e4f"
+
+
+def make_store(engine, **kwargs) -> MetricStore:
+    store = MetricStore(engine=engine, **kwargs)
+    store.create_all()
+    return store
+
+
+def stored_rows(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(job_metrics)
+        ).scalar()
+
+
+def append(store: MetricStore, timestamp: datetime, value: str = "1") -> dict:
+    return store.append(JOB_ID, "cpu", STATION_ID, timestamp, value=value)
+
+
+def test_buffer_keeps_newest_samples(engine):
+    store = make_store(engine, buffer_size=5, trim_interval=1)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(20):
+        append(store, start + timedelta(seconds=index), value=str(index))
+
+    assert stored_rows(engine) == 5
+    values = [sample["value"] for sample in store.series(JOB_ID, "cpu")]
+    assert values == ["19", "18", "17", "16", "15"]
+
+
+def test_buffer_evicts_samples_with_the_same_timestamp(engine):
+    store = make_store(engine, buffer_size=5, trim_interval=1)
+    timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(20):
+        append(store, timestamp, value=str(index))
+
+    assert stored_rows(engine) == 5
+    values = {sample["value"] for sample in store.series(JOB_ID, "cpu")}
+    assert values == {"15", "16", "17", "18", "19"}
+
+
+def test_series_is_bounded_between_trims(engine):
+    store = make_store(engine, buffer_size=5, trim_interval=8)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(12):
+        append(store, start + timedelta(seconds=index), value=str(index))
+
+    # Trimmed after the 8th sample, the last 4 are not trimmed yet
+    assert stored_rows(engine) == 9
+    samples = store.series(JOB_ID, "cpu", descending=False)
+    assert [sample["value"] for sample in samples] == ["7", "8", "9", "10", "11"]
+
+
+def test_append_many_trims_every_due_series(engine):
+    store = make_store(engine, buffer_size=2, trim_interval=3)
+    timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    samples = [
+        {
+            "job_id": JOB_ID,
+            "metric_type": metric_type,
+            "station_id": STATION_ID,
+            "timestamp": timestamp,
+            "value": "1",
+        }
+        for metric_type in ("cpu", "memory")
+        for _ in range(3)
+    ]
+    store.append_many(samples)
+
+    assert stored_rows(engine) == 4
+
+
+def test_raw_retention_is_relative_to_the_newest_sample(engine):
+    store = make_store(
+        engine, buffer_size=100, trim_interval=1, raw_retention=timedelta(minutes=5)
+    )
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    append(store, start, value="old")
+    append(store, start + timedelta(minutes=10), value="new")
+
+    assert [sample["value"] for sample in store.series(JOB_ID, "cpu")] == ["new"]
+
+
+def test_series_bounds_naive_or_aware(engine):
+    store = make_store(engine)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(3):
+        append(store, start + timedelta(hours=index), value=str(index))
+
+    # Naive bounds are UTC, aware ones may be in any zone
+    naive = store.series(
+        JOB_ID, "cpu", datetime(2024, 1, 1, 1), datetime(2024, 1, 1, 2)
+    )
+    aware = store.series(
+        JOB_ID,
+        "cpu",
+        start.astimezone(timezone(timedelta(hours=2))) + timedelta(hours=1),
+        start + timedelta(hours=2),
+    )
+
+    assert [sample["value"] for sample in naive] == ["2", "1"]
+    assert [sample["value"] for sample in aware] == ["2", "1"]
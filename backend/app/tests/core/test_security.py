@@ -0,0 +1,127 @@
+import asyncio
+import json
+import time
+
+import pytest
+from jwcrypto import jwk, jwt
+
+from app.core.security import InvalidTokenError, JWKSCache, TokenValidator, TTLCache
+
+ISSUER = "http://localhost:8080/realms/pht"
+
+
+class Realm:
+    """Signing keys of a fake realm, counts the JWKS fetches."""
+
+    def __init__(self):
+        self.keys = [jwk.JWK.generate(kty="RSA", size=2048, kid="key-1")]
+        self.fetches = 0
+
+    async def certs(self) -> dict:
+        self.fetches += 1
+        await asyncio.sleep(0)
+        return {"keys": [json.loads(key.export_public()) for key in self.keys]}
+
+    def rotate(self) -> None:
+        self.keys.append(jwk.JWK.generate(kty="RSA", size=2048, kid="key-2"))
+
+
+def sign(key: jwk.JWK, **claims) -> str:
+    now = int(time.time())
+    token = jwt.JWT(
+        header={"alg": "RS256", "kid": key.get("kid")},
+        claims={
+            "iss": ISSUER,
+            "iat": now,
+            "exp": now + 300,
+            "preferred_username": "alice",
+            **claims,
+        },
+    )
+    token.make_signed_token(key)
+    return token.serialize()
+
+
+@pytest.fixture
+def realm() -> Realm:
+    return Realm()
+
+
+def make_validator(realm: Realm, **kwargs) -> TokenValidator:
+    return TokenValidator(
+        jwks=JWKSCache(realm.certs, **kwargs),
+        issuer=ISSUER,
+        cache=TTLCache(maxsize=16, ttl=60),
+        leeway=0,
+    )
+
+
+def test_valid_token_is_validated_once(realm):
+    validator = make_validator(realm)
+    token = sign(realm.keys[0])
+
+    claims = asyncio.run(validator.validate(token))
+    assert claims["preferred_username"] == "alice"
+    assert asyncio.run(validator.validate(token)) == claims
+    assert realm.fetches == 1
+    assert len(validator.cache) == 1
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"exp": int(time.time()) - 60},
+        {"iss": "http://localhost:8080/realms/other"},
+    ],
+)
+def test_expired_or_foreign_token_is_rejected(realm, claims):
+    validator = make_validator(realm)
+
+    with pytest.raises(InvalidTokenError):
+        asyncio.run(validator.validate(sign(realm.keys[0], **claims)))
+    assert len(validator.cache) == 0
+
+
+def test_malformed_token_is_rejected(realm):
+    with pytest.raises(InvalidTokenError):
+        asyncio.run(make_validator(realm).validate("not-a-token"))
+
+
+def test_forged_signature_is_rejected(realm):
+    forged = jwk.JWK.generate(kty="RSA", size=2048, kid="key-1")
+
+    with pytest.raises(InvalidTokenError):
+        asyncio.run(make_validator(realm).validate(sign(forged)))
+
+
+def test_rotated_key_is_fetched(realm):
+    validator = make_validator(realm, min_refresh_interval=0)
+    asyncio.run(validator.validate(sign(realm.keys[0])))
+
+    realm.rotate()
+    claims = asyncio.run(validator.validate(sign(realm.keys[1])))
+    assert claims["preferred_username"] == "alice"
+    assert realm.fetches == 2
+
+
+def test_unknown_key_refreshes_are_rate_limited(realm):
+    validator = make_validator(realm, min_refresh_interval=30)
+    asyncio.run(validator.validate(sign(realm.keys[0])))
+
+    unknown = jwk.JWK.generate(kty="RSA", size=2048, kid="unknown")
+    for _ in range(3):
+        with pytest.raises(InvalidTokenError):
+            asyncio.run(validator.validate(sign(unknown)))
+    assert realm.fetches == 1
+
+
+def test_stale_keys_are_refreshed_once(realm):
+    jwks = JWKSCache(realm.certs, ttl=60)
+
+    async def expire_and_get():
+        await jwks.get()
+        jwks._fetched_at -= 120
+        await asyncio.gather(*(jwks.get("key-1") for _ in range(10)))
+
+    asyncio.run(expire_and_get())
+    assert realm.fetches == 2
@@ -0,0 +1,92 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from rdflib import RDF, Graph
+
+from app.core.database import PHT, CpuNS, JobNS, MemoryNS, NetworkNS
+from app.core.metric_store import MetricStore
+from scripts.backfill_metric_events import backfill_job, remove_orphaned_events
+
+JOB_ID = "0b7f3f4e-1d3c-4c2b-9f0e-5d6a7b8c9d0e"
+STATION_ID = "5c1d2e3f-4a5b-4c6d-8e7f-9a0b1c2d3e4f"
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+CONTEXT = {
+    "pht": str(PHT),
+    "memory": str(MemoryNS),
+    "cpu": str(CpuNS),
+    "network": str(NetworkNS),
+}
+
+
+def event(namespace, rdf_type, minutes: int, **values) -> dict:
+    """Metric event as the API wrote them before the metric store."""
+    return {
+        "@id": namespace[str(uuid.uuid4())],
+        "@type": rdf_type,
+        "pht:eventTimestamp": START + timedelta(minutes=minutes),
+        "pht:hasJobId": JOB_ID,
+        "pht:hasStationId": STATION_ID,
+        **{f"pht:{name}": value for name, value in values.items()},
+    }
+
+
+def make_graph() -> tuple[Graph, list[dict]]:
+    events = [
+        event(MemoryNS, PHT.MemoryUsageReportEvent, 0, value="0"),
+        event(CpuNS, PHT.CPUUsageReportEvent, 1, value="12.5"),
+        event(
+            NetworkNS, PHT.NetworkUsageReportEvent, 2, hasRxBytes="5", hasTxBytes="6"
+        ),
+    ]
+    job = {
+        "@id": JobNS[JOB_ID],
+        "@type": PHT.TrainExecution,
+        "pht:identifier": JOB_ID,
+        "pht:event": {"@list": [{"@id": item["@id"]} for item in events]},
+    }
+    # Cleared from the collection of a job once its buffer was full
+    orphan = event(CpuNS, PHT.CPUUsageReportEvent, -60, value="1")
+
+    graph = Graph()
+    graph.parse(
+        data={"@context": CONTEXT, "@graph": [*events, job, orphan]}, format="json-ld"
+    )
+    return graph, events
+
+
+def make_store(engine) -> MetricStore:
+    store = MetricStore(engine=engine)
+    store.create_all()
+    return store
+
+
+def test_backfill_moves_events(engine):
+    graph, events = make_graph()
+    store = make_store(engine)
+
+    assert backfill_job(graph, store, JobNS[JOB_ID]) == 3
+    assert remove_orphaned_events(graph) == 1
+
+    [cpu] = store.series(JOB_ID, "cpu")
+    assert cpu["value"] == "12.5"
+    assert cpu["metric_id"] == str(events[1]["@id"]).rsplit("/", 1)[-1]
+    [network] = store.series(JOB_ID, "network")
+    assert (network["rx_bytes"], network["tx_bytes"]) == ("5", "6")
+    assert len(store.series(JOB_ID, "memory")) == 1
+
+    # Only the job itself is left, without its event collection
+    assert set(graph.subjects()) == {JobNS[JOB_ID]}
+    assert (JobNS[JOB_ID], PHT.event, None) not in graph
+    assert (None, RDF.first, None) not in graph
+
+
+def test_backfill_after_interrupted_run(engine):
+    graph, _ = make_graph()
+    store = make_store(engine)
+    # Samples appended, the events were not removed yet
+    backfill_job(Graph() + graph, store, JobNS[JOB_ID])
+
+    assert backfill_job(graph, store, JobNS[JOB_ID]) == 0
+    assert len(store.series(JOB_ID, "cpu")) == 1
+    assert backfill_job(graph, store, JobNS[JOB_ID]) == 0
@@ -0,0 +1,88 @@
+import pytest
+from rdflib import RDF, Graph, Literal
+from sqlalchemy import insert
+
+from app.core.database import PHT, JobNS, StationNS
+from app.read_model import ReadModel, metadata, read_model_changes
+from app.utils import JobStateURI
+
+
+@pytest.fixture(autouse=True)
+def tables(engine):
+    # The change log is written before a read model is made
+    metadata.create_all(engine)
+
+
+def add_station(graph: Graph, identifier: str, title: str) -> None:
+    subject = StationNS[identifier]
+    graph.add((subject, RDF.type, PHT.Station))
+    graph.add((subject, PHT.identifier, Literal(identifier)))
+    graph.add((subject, PHT.title, Literal(title)))
+    graph.add((subject, PHT.updatedAt, Literal("2024-01-01T00:00:00")))
+
+
+def add_job(graph: Graph, identifier: str, state: JobStateURI) -> None:
+    subject = JobNS[identifier]
+    graph.add((subject, RDF.type, PHT.TrainExecution))
+    graph.add((subject, PHT.identifier, Literal(identifier)))
+    graph.add((subject, PHT.state, state.value))
+    graph.add((subject, PHT.updatedAt, Literal("2024-01-01T00:00:00")))
+
+
+def log_change(engine, change_id: int, entity: str, subject) -> None:
+    with engine.begin() as connection:
+        connection.execute(
+            insert(read_model_changes).values(
+                id=change_id, entity=entity, subject=str(subject)
+            )
+        )
+
+
+def make_model(engine, graph: Graph) -> ReadModel:
+    model = ReadModel(max_entries=100, changelog_size=100, engine=engine)
+    model.rebuild(graph)
+    return model
+
+
+def test_sync_replays_change_committed_after_a_higher_id(engine):
+    graph = Graph()
+    add_station(graph, "a", "Station A")
+    add_station(graph, "b", "Station B")
+    model = make_model(engine, graph)
+
+    # Change 2 commits before change 1 of a slower worker
+    graph.set((StationNS["b"], PHT.title, Literal("Renamed B")))
+    log_change(engine, 2, "station", StationNS["b"])
+    assert model.stations.get(graph, StationNS["b"]).title == "Renamed B"
+
+    graph.set((StationNS["a"], PHT.title, Literal("Renamed A")))
+    log_change(engine, 1, "station", StationNS["a"])
+    assert model.stations.get(graph, StationNS["a"]).title == "Renamed A"
+
+
+def test_rebuild_tracks_uncommitted_change_ids(engine):
+    graph = Graph()
+    add_station(graph, "a", "Station A")
+    log_change(engine, 2, "station", StationNS["a"])
+    model = make_model(engine, graph)
+
+    graph.set((StationNS["a"], PHT.title, Literal("Renamed A")))
+    log_change(engine, 1, "station", StationNS["a"])
+    assert model.stations.get(graph, StationNS["a"]).title == "Renamed A"
+
+
+def test_load_replaces_records_and_counters(engine):
+    graph = Graph()
+    add_job(graph, "1", JobStateURI.running)
+    add_job(graph, "2", JobStateURI.waiting)
+    model = make_model(engine, graph)
+    assert model.jobs.state_counts == {"running": 1, "waiting": 1}
+
+    graph.remove((JobNS["2"], None, None))
+    add_job(graph, "3", JobStateURI.running)
+    model.jobs.load(graph)
+
+    assert model.jobs.complete
+    assert model.jobs.state_counts == {"running": 2}
+    assert model.jobs.get(graph, JobNS["2"]) is None
+    assert model.jobs.get(graph, JobNS["3"]).state == "running"
@@ -0,0 +1,240 @@
+import uuid
+from collections.abc import Callable, Iterable
+from datetime import datetime
+from typing import Any
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import RDF
+from rdflib.term import Node
+
+from app.core.database import PHT, JobNS, StationNS, TrainNS
+from app.core.unit_of_work import Pattern, UnitOfWork
+from app.models import (
+    JobMetadataBase,
+    JobMetadataUpdate,
+    StationMetadataBase,
+    StationMetadataUpdate,
+    TrainMetadataBase,
+    TrainMetadataUpdate,
+)
+from app.utils import JobStateURI
+
+Triple = tuple[Node, Node, Node]
+
+# * Model fields that are stored as plain literals under pht:<field>.
+# * Literals are typed like the JSON-LD parser did it before, i.e. str is a plain
+# * literal, bool, int, float and datetime get their XSD datatype.
+STATION_FIELDS = (
+    "identifier",
+    "title",
+    "stationOwner",
+    "responsibleForStation",
+    "description",
+    "latitude",
+    "longitude",
+    "hasGPUSupport",
+    "totalGPUPower",
+    "totalCPUCores",
+    "totalRAM",
+    "totalDiskSpace",
+    "hasInternetConnectivity",
+    "networkBandwidth",
+    "createdAt",
+    "updatedAt",
+)
+TRAIN_FIELDS = (
+    "identifier",
+    "title",
+    "creator",
+    "publisher",
+    "description",
+    "analysisPurpose",
+    "model",
+    "version",
+    "createdAt",
+    "updatedAt",
+)
+JOB_FIELDS = (
+    "identifier",
+    "creator",
+    "description",
+    "createdAt",
+    "updatedAt",
+)
+
+
+def to_node(value: Any) -> Node:
+    if isinstance(value, Node):
+        return value
+    if isinstance(value, uuid.UUID):
+        return Literal(str(value))
+    return Literal(value)
+
+
+def resource_triples(
+    subject: URIRef, rdf_type: URIRef, properties: dict[URIRef, Any]
+) -> list[Triple]:
+    """Triples of one resource, properties without a value are left out."""
+    triples: list[Triple] = [(subject, RDF.type, rdf_type)]
+    for predicate, value in properties.items():
+        if value is not None:
+            triples.append((subject, predicate, to_node(value)))
+    return triples
+
+
+def list_triples(items: list[Node]) -> tuple[Node, list[Triple]]:
+    """RDF collection of `items`, returns the head node and its triples."""
+    if not items:
+        return RDF.nil, []
+
+    nodes = [BNode() for _ in items]
+    triples: list[Triple] = []
+    for index, (node, item) in enumerate(zip(nodes, items, strict=True)):
+        rest = nodes[index + 1] if index + 1 < len(nodes) else RDF.nil
+        triples.append((node, RDF.first, item))
+        triples.append((node, RDF.rest, rest))
+    return nodes[0], triples
+
+
+def field_properties(metadata: Any, fields: Iterable[str]) -> dict[URIRef, Any]:
+    return {PHT[field]: getattr(metadata, field) for field in fields}
+
+
+def station_triples(metadata: StationMetadataBase) -> list[Triple]:
+    return resource_triples(
+        StationNS[str(metadata.identifier)],
+        PHT.Station,
+        field_properties(metadata, STATION_FIELDS),
+    )
+
+
+def train_triples(metadata: TrainMetadataBase) -> list[Triple]:
+    properties = field_properties(metadata, TRAIN_FIELDS)
+    properties[PHT.model] = metadata.model or "N/A"
+
+    return resource_triples(TrainNS[metadata.identifier], PHT.Train, properties)
+
+
+def job_triples(metadata: JobMetadataBase) -> list[Triple]:
+    subject = JobNS[str(metadata.identifier)]
+    route, route_triples = list_triples(
+        [StationNS[station_id] for station_id in metadata.plannedRoute]
+    )
+
+    properties = field_properties(metadata, JOB_FIELDS)
+    properties.update(
+        {
+            PHT.currentStation: StationNS[metadata.currentStation],
+            PHT.trainId: TrainNS[metadata.trainId],
+            PHT.state: JobStateURI.waiting.value,
+            PHT.plannedRoute: route,
+        }
+    )
+
+    return resource_triples(subject, PHT.TrainExecution, properties) + route_triples
+
+
+def add_triples(graph: Graph, triples: Iterable[Triple]) -> None:
+    """Write all triples with a single `addN`, i.e. one bulk insert."""
+    graph.addN((s, p, o, graph) for s, p, o in triples)
+
+
+# * Updates map the fields of a patch to predicates through these tables. A
+# * converter turns a field value into its object, i.e. a node, or the items
+# * of an RDF collection. Fields without a converter are literals.
+Converter = Callable[[Any], Node | list[Node]]
+
+STATION_PATCH_FIELDS = {
+    field: PHT[field] for field in StationMetadataUpdate.model_fields
+}
+TRAIN_PATCH_FIELDS = {field: PHT[field] for field in TrainMetadataUpdate.model_fields}
+JOB_PATCH_FIELDS = {field: PHT[field] for field in JobMetadataUpdate.model_fields}
+JOB_PATCH_CONVERTERS: dict[str, Converter] = {
+    "currentStation": lambda station_id: StationNS[station_id],
+    "state": lambda state: JobStateURI[state].value,
+    "plannedRoute": lambda route: [StationNS[station_id] for station_id in route],
+}
+
+
+def patch_objects(
+    patch: dict[str, Any],
+    predicates: dict[str, URIRef],
+    converters: dict[str, Converter] | None = None,
+) -> dict[URIRef, Node | list[Node]]:
+    """New objects by predicate of the fields set in `patch`."""
+    converters = converters or {}
+    return {
+        predicates[field]: converters.get(field, to_node)(value)
+        for field, value in patch.items()
+    }
+
+
+def collection_nodes(graph: Graph, head: Node) -> list[Node]:
+    nodes = []
+    while isinstance(head, BNode):
+        nodes.append(head)
+        head = graph.value(head, RDF.rest)
+    return nodes
+
+
+def diff_triples(
+    graph: Graph,
+    subject: URIRef,
+    objects: dict[URIRef, Node | list[Node]],
+    timestamp: URIRef | None = PHT.updatedAt,
+) -> tuple[list[Pattern], list[Triple]] | None:
+    """
+    Minimal removes and adds that give `subject` the new objects, predicates
+    that already hold them are left alone. If anything changes, `timestamp`
+    is set to now unless the patch sets it. None if the subject doesn't exist.
+    """
+    current: dict[Node, set[Node]] = {}
+    for predicate, obj in graph.predicate_objects(subject):
+        current.setdefault(predicate, set()).add(obj)
+    if not current:
+        return None
+
+    removes: list[Pattern] = []
+    adds: list[Triple] = []
+    for predicate, value in objects.items():
+        existing = current.get(predicate, set())
+
+        if isinstance(value, list):
+            # Collections are replaced as a whole, including their nodes
+            nodes = [
+                node for head in existing for node in collection_nodes(graph, head)
+            ]
+            if [graph.value(node, RDF.first) for node in nodes] == value:
+                continue
+            removes.extend((node, None, None) for node in nodes)
+            value, item_triples = list_triples(value)
+            adds.extend(item_triples)
+        elif existing == {value}:
+            continue
+
+        removes.append((subject, predicate, None))
+        adds.append((subject, predicate, value))
+
+    if adds and timestamp is not None and timestamp not in objects:
+        removes.append((subject, timestamp, None))
+        adds.append((subject, timestamp, Literal(datetime.now())))
+
+    return removes, adds
+
+
+def stage_patch(
+    unit_of_work: UnitOfWork, subject: URIRef, objects: dict[URIRef, Node | list[Node]]
+) -> bool | None:
+    """
+    Stage the diff of a patch in the unit of work. Returns whether anything
+    changes, None if the subject doesn't exist.
+    """
+    diff = diff_triples(unit_of_work.graph, subject, objects)
+    if diff is None:
+        return None
+
+    removes, adds = diff
+    for pattern in removes:
+        unit_of_work.remove(pattern)
+    unit_of_work.add(adds)
+    return bool(adds)
@@ -1,16 +1,24 @@
+import base64
+import binascii
+from datetime import timedelta
 from enum import Enum
 
-from rdflib.namespace import RDF, Namespace
-from rdflib.plugins.sparql import prepareQuery
+from fastapi import HTTPException, status
+
+from rdflib.namespace import Namespace
 
 from app.api.deps import GraphDep
 from app.core.database import PHT, MemoryNS, CpuNS, NetworkNS
+from app.core.executor import run_read
+from app.queries import queries
 
 
 class ResponseType(str, Enum):
     default = "default"
     jsonld = "json-ld"
     turtle = "turtle"
+    ntriples = "n-triples"
+    ndjsonld = "ndjson-ld"
 
 
 class JobState(str, Enum):
@@ -39,6 +47,61 @@ class MetricType(str, Enum):
     network = "network"
 
 
+class TimeWindow(str, Enum):
+    last_day = "24h"
+    last_week = "7d"
+    last_month = "30d"
+    last_quarter = "90d"
+
+    @property
+    def delta(self) -> timedelta:
+        amount, unit = int(self.value[:-1]), self.value[-1]
+        return timedelta(hours=amount) if unit == "h" else timedelta(days=amount)
+
+
+class JobTimestamp(str, Enum):
+    createdAt = "createdAt"
+    updatedAt = "updatedAt"
+
+
+class HistogramBucket(str, Enum):
+    hour = "hour"
+    day = "day"
+
+    @property
+    def delta(self) -> timedelta:
+        return timedelta(hours=1) if self is HistogramBucket.hour else timedelta(days=1)
+
+
+class AggregateWindow(str, Enum):
+    minute = "1m"
+    five_minutes = "5m"
+    fifteen_minutes = "15m"
+    hour = "1h"
+    six_hours = "6h"
+    day = "1d"
+
+    @property
+    def delta(self) -> timedelta:
+        amount, unit = int(self.value[:-1]), self.value[-1]
+        units = {"m": "minutes", "h": "hours", "d": "days"}
+        return timedelta(**{units[unit]: amount})
+
+
+class MetricAggregate(str, Enum):
+    avg = "avg"
+    min = "min"
+    max = "max"
+    p50 = "p50"
+    p95 = "p95"
+
+
+class MetricResolution(str, Enum):
+    raw = "raw"
+    minute = "1m"
+    hour = "1h"
+
+
 class MetricNamespace(Enum):
     memory = MemoryNS
     cpu = CpuNS
@@ -51,23 +114,32 @@ class MetricTypeURI(Enum):
     network = PHT.NetworkUsageReportEvent
 
 
-# Select all triples of subject (?sub) where subject is of type (?uri)
-def query_subject_properties():
-    return prepareQuery(
-        """
-        SELECT ?sub ?pred ?obj
-        WHERE {
-            ?sub a ?uri .
-            ?sub ?pred ?obj .
-        }
-        """
-    )
-
-
 async def get_triple_count(graph: GraphDep, rdf_type) -> dict:
-    triple_count = len(set(graph.subjects(RDF.type, rdf_type)))
-    return {"count": triple_count}
+    rows = await run_read(
+        queries.query, graph, "subject_count", {"type": rdf_type}, cache=True
+    )
+    return {"count": int(rows[0][0])}
 
 
 def convert_list_to_jsonld(items: list, namespace: Namespace):
     return list(map(lambda item: {"@id": namespace[item]}, items))
+
+
+# Keyset pagination cursor, an opaque token of the last (updatedAt, identifier) pair
+def encode_cursor(updated_at: str, identifier: str) -> str:
+    token = f"{updated_at}|{identifier}".encode()
+    return base64.urlsafe_b64encode(token).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        updated_at, identifier = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        )
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid pagination cursor ({cursor})",
+        )
+
+    return updated_at, identifier
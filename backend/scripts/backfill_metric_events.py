@@ -0,0 +1,136 @@
+"""
+Move the job metrics of the `pht:event` collections into the metric store.
+Graphs written before the metric store keep the metric samples of a job as
+events in the graph, which the API no longer reads. Their samples are appended
+to the metric store and the event triples are removed. A rerun, e.g. after an
+interruption, does not duplicate samples.
+
+Run from ./backend with the same environment as the API, before the API
+workers are started:
+
+    python -m scripts.backfill_metric_events
+"""
+
+import argparse
+from datetime import datetime
+
+from rdflib import RDF, Graph, URIRef
+from rdflib.collection import Collection
+from rdflib.term import Node
+from sqlalchemy import select
+
+from app.core.database import PHT, graph_singleton
+from app.core.logger import logger
+from app.core.metric_store import MetricStore, job_metrics, metric_store
+from app.utils import MetricType, MetricTypeURI
+
+# Event type of each metric type, as written to the graph
+EVENT_TYPES = {
+    event_type.value: MetricType[event_type.name] for event_type in MetricTypeURI
+}
+
+
+def event_sample(graph: Graph, job_id: str, event: Node) -> dict | None:
+    """Arguments of `MetricStore.append` for an event, None if it is incomplete."""
+    event_type = next(
+        (
+            EVENT_TYPES[rdf_type]
+            for rdf_type in graph.objects(event, RDF.type)
+            if rdf_type in EVENT_TYPES
+        ),
+        None,
+    )
+    timestamp = graph.value(event, PHT.eventTimestamp)
+    station_id = graph.value(event, PHT.hasStationId)
+    if event_type is None or timestamp is None or station_id is None:
+        return None
+
+    timestamp = timestamp.toPython()
+    if not isinstance(timestamp, datetime):
+        return None
+
+    def text(predicate: URIRef) -> str | None:
+        value = graph.value(event, predicate)
+        return None if value is None else str(value)
+
+    return {
+        # The event id is a UUID like the ids of the metric store
+        "metric_id": str(event).rsplit("/", 1)[-1],
+        "job_id": job_id,
+        "metric_type": event_type.value,
+        "station_id": str(station_id),
+        "timestamp": timestamp,
+        **(
+            {"rx_bytes": text(PHT.hasRxBytes), "tx_bytes": text(PHT.hasTxBytes)}
+            if event_type is MetricType.network
+            else {"value": text(PHT.value)}
+        ),
+    }
+
+
+def backfill_job(graph: Graph, store: MetricStore, subject: URIRef) -> int:
+    """Move the events of one job, returns the number of samples appended."""
+    job_id = str(subject).rsplit("/", 1)[-1]
+    heads = list(graph.objects(subject, PHT.event))
+    events = [event for head in heads for event in Collection(graph, head)]
+
+    samples = [
+        sample
+        for sample in (event_sample(graph, job_id, event) for event in events)
+        if sample is not None
+    ]
+    # Samples of an interrupted earlier run are in the store already
+    with store.engine.connect() as connection:
+        stored = set(
+            connection.execute(
+                select(job_metrics.c.metric_id).where(job_metrics.c.job_id == job_id)
+            ).scalars()
+        )
+    samples = [sample for sample in samples if sample["metric_id"] not in stored]
+    samples.sort(key=lambda sample: sample["timestamp"])
+    store.append_many(samples)
+
+    # The samples are committed, the events can go
+    for event in events:
+        graph.remove((event, None, None))
+    for head in heads:
+        Collection(graph, head).clear()
+    graph.remove((subject, PHT.event, None))
+    return len(samples)
+
+
+def remove_orphaned_events(graph: Graph) -> int:
+    """Remove events no job refers to, cleared from a full collection before."""
+    events = {
+        event
+        for event_type in EVENT_TYPES
+        for event in graph.subjects(RDF.type, event_type)
+    }
+    for event in events:
+        graph.remove((event, None, None))
+    return len(events)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.parse_args()
+
+    graph = graph_singleton.open()
+    metric_store.create_all()
+    try:
+        subjects = set(graph.subjects(PHT.event, None))
+        appended = sum(
+            backfill_job(graph, metric_store, subject) for subject in subjects
+        )
+        orphaned = remove_orphaned_events(graph)
+    finally:
+        graph_singleton.close_graph()
+
+    logger.info(
+        f"Moved {appended} metric samples of {len(subjects)} jobs to the metric store, "
+        f"removed {orphaned} orphaned events"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Compare the ingest latency of the JSON-LD write path against direct triple
+construction (`app.triples`). Every entity is written once per path, into a
+scratch graph that is removed afterwards.
+
+Run from ./backend with the same environment as the API:
+
+    python -m scripts.benchmark_ingest --entities 200 --store sql
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime
+
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from app.core.database import PHT, JobNS, StationNS, TrainNS, graph_singleton
+from app.models import JobMetadataBase, StationMetadataBase, TrainMetadataBase
+from app.triples import add_triples, job_triples, station_triples, train_triples
+from app.utils import JobStateURI, convert_list_to_jsonld
+
+
+def make_station() -> StationMetadataBase:
+    return StationMetadataBase(
+        identifier=uuid.uuid4(),
+        title="Benchmark station",
+        stationOwner="benchmark",
+        responsibleForStation="benchmark",
+        description="Station created by the ingest benchmark",
+        latitude="50.7",
+        longitude="6.1",
+        hasGPUSupport=True,
+        totalGPUPower="10",
+        totalCPUCores=16,
+        totalRAM="64",
+        totalDiskSpace="1000",
+        hasInternetConnectivity=True,
+        networkBandwidth="1000",
+    )
+
+
+def make_train() -> TrainMetadataBase:
+    return TrainMetadataBase(
+        identifier=f"train-{uuid.uuid4()}",
+        creator="benchmark",
+        publisher="benchmark",
+        title="Benchmark train",
+        description="Train created by the ingest benchmark",
+        analysisPurpose="Measure the ingest latency",
+    )
+
+
+def make_job() -> JobMetadataBase:
+    route = [str(uuid.uuid4()) for _ in range(3)]
+    return JobMetadataBase(
+        identifier=uuid.uuid4(),
+        description="Job created by the ingest benchmark",
+        trainId="train-benchmark",
+        currentStation=route[0],
+        creator="benchmark",
+        plannedRoute=route,
+        createdAt=datetime.now(),
+        updatedAt=datetime.now(),
+    )
+
+
+# JSON-LD payloads as the create handlers built them before app.triples
+def station_payload(metadata: StationMetadataBase) -> dict:
+    return {
+        "@context": {"pht": str(PHT), "station": str(StationNS)},
+        "@id": f"station:{metadata.identifier}",
+        "@type": "pht:Station",
+        **{
+            f"pht:{field}": getattr(metadata, field)
+            for field in type(metadata).model_fields
+        },
+    }
+
+
+def train_payload(metadata: TrainMetadataBase) -> dict:
+    return {
+        "@context": {"pht": str(PHT), "train": str(TrainNS)},
+        "@id": f"train:{metadata.identifier}",
+        "@type": "pht:Train",
+        **{
+            f"pht:{field}": getattr(metadata, field)
+            for field in type(metadata).model_fields
+        },
+        "pht:model": metadata.model or "N/A",
+    }
+
+
+def job_payload(metadata: JobMetadataBase) -> dict:
+    job_id = str(metadata.identifier)
+    return {
+        "@context": {"pht": str(PHT)},
+        "@id": JobNS[job_id],
+        "@type": PHT.TrainExecution,
+        "pht:identifier": job_id,
+        "pht:creator": metadata.creator,
+        "pht:description": metadata.description,
+        "pht:currentStation": {"@id": StationNS[metadata.currentStation]},
+        "pht:trainId": {"@id": TrainNS[metadata.trainId]},
+        "pht:state": {"@id": JobStateURI.waiting.value},
+        "pht:plannedRoute": {
+            "@list": convert_list_to_jsonld(
+                items=metadata.plannedRoute, namespace=StationNS
+            )
+        },
+        "pht:createdAt": metadata.createdAt,
+        "pht:updatedAt": metadata.updatedAt,
+    }
+
+
+CASES = {
+    "station": (make_station, station_payload, station_triples),
+    "train": (make_train, train_payload, train_triples),
+    "job": (make_job, job_payload, job_triples),
+}
+
+
+def scratch_graph(store: str) -> Graph:
+    if store == "memory":
+        return Graph()
+    return Graph(
+        graph_singleton.get_graph().store, identifier=f"benchmark-{uuid.uuid4()}"
+    )
+
+
+def measure(write: Callable[..., object], *args: object, **kwargs: object) -> float:
+    started = time.perf_counter()
+    write(*args, **kwargs)
+    return (time.perf_counter() - started) * 1000
+
+
+def report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"  {name:<8} mean {statistics.mean(samples):8.3f} ms"
+        f"  p50 {statistics.median(samples):8.3f} ms  p95 {p95:8.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entities", type=int, default=200)
+    parser.add_argument("--store", choices=("memory", "sql"), default="memory")
+    args = parser.parse_args()
+
+    for name, (make, to_payload, to_triples) in CASES.items():
+        # Both paths must write the same graph
+        metadata = make()
+        expected = Graph().parse(data=to_payload(metadata), format="json-ld")
+        actual = Graph()
+        add_triples(actual, to_triples(metadata))
+        assert isomorphic(expected, actual), f"{name} triples differ from JSON-LD"
+
+        jsonld_graph = scratch_graph(args.store)
+        direct_graph = scratch_graph(args.store)
+        jsonld_ms, direct_ms = [], []
+
+        try:
+            for _ in range(args.entities):
+                metadata = make()
+                jsonld_ms.append(
+                    measure(
+                        jsonld_graph.parse, data=to_payload(metadata), format="json-ld"
+                    )
+                )
+                direct_ms.append(
+                    measure(add_triples, direct_graph, to_triples(metadata))
+                )
+        finally:
+            jsonld_graph.remove((None, None, None))
+            direct_graph.remove((None, None, None))
+
+        print(f"{name} ({args.entities} entities, {args.store} store)")
+        report("json-ld", jsonld_ms)
+        report("direct", direct_ms)
+        print(
+            f"  speedup  {statistics.mean(jsonld_ms) / statistics.mean(direct_ms):.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@ import { useQueryClient } from '@tanstack/react-query';
 import { useEffect } from 'react';
 import config from '../config';
 
+// Keep in sync with METRICS_BUFFER_SIZE of the backend metric store
+const METRICS_BUFFER_SIZE = 1000;
+
 export const useMetricSSE = (jobId) => {
   const queryClient = useQueryClient();
 
@@ -10,11 +13,42 @@ export const useMetricSSE = (jobId) => {
       `${config.apiUrl}/jobs/${jobId}/metrics/sse`
     );
 
-    eventSource.addEventListener('metric_update', (event) => {
-      const updatedMetrics = JSON.parse(event.data);
+    let lastSeq = null;
+
+    eventSource.addEventListener('metric_snapshot', (event) => {
+      const snapshot = JSON.parse(event.data);
+      lastSeq = snapshot.seq;
+      queryClient.setQueryData(
+        ['jobs', { id: jobId, metric: snapshot.source }],
+        { source: snapshot.source, metrics: snapshot.metrics }
+      );
+    });
+
+    eventSource.addEventListener('metric_delta', (event) => {
+      const delta = JSON.parse(event.data);
+
+      // A gap in the sequence means we missed deltas, refetch the full series
+      if (lastSeq !== null && delta.seq !== lastSeq + 1) {
+        queryClient.invalidateQueries({ queryKey: ['jobs', { id: jobId }] });
+      }
+      lastSeq = delta.seq;
+
       queryClient.setQueryData(
-        ['jobs', { id: jobId, metric: updatedMetrics.source }],
-        updatedMetrics
+        ['jobs', { id: jobId, metric: delta.source }],
+        (prevMetrics) => {
+          const metrics = prevMetrics?.metrics || [];
+          if (metrics.some((metric) => metric.id === delta.metric.id)) {
+            return prevMetrics;
+          }
+
+          // Network metrics are sorted in ASC order, CPU and memory in DESC order
+          const updatedMetrics =
+            delta.source === 'network'
+              ? [...metrics, delta.metric].slice(-METRICS_BUFFER_SIZE)
+              : [delta.metric, ...metrics].slice(0, METRICS_BUFFER_SIZE);
+
+          return { source: delta.source, metrics: updatedMetrics };
+        }
       );
     });
 